@@ -24,6 +24,7 @@ from textual.widgets import (
     ProgressBar,
     LoadingIndicator,
     Button,
+    Checkbox,
     ContentSwitcher,
     Input,
     TabbedContent,
@@ -31,7 +32,7 @@ from textual.widgets import (
 )
 from rich.text import Text
 
-from client import MydyClient
+from client import RAIT_URL, MydyClient
 
 # ---------------------------------------------------------------------------
 # Colors
@@ -235,7 +236,7 @@ class DashboardView(VerticalScroll):
             row = table.get_row(event.row_key)
             cname = row[1]  # Course Name column
             self.post_message(self.CourseClicked(
-                {"id": cid, "name": cname, "url": f"https://mydy.dypatil.edu/rait/course/view.php?id={cid}"}
+                {"id": cid, "name": cname, "url": f"{RAIT_URL}/course/view.php?id={cid}"}
             ))
 
 
@@ -290,7 +291,7 @@ class AllCoursesView(VerticalScroll):
         row = table.get_row(event.row_key)
         cname = row[1]
         self.post_message(self.CourseClicked(
-            {"id": cid, "name": cname, "url": f"https://mydy.dypatil.edu/rait/course/view.php?id={cid}"}
+            {"id": cid, "name": cname, "url": f"{RAIT_URL}/course/view.php?id={cid}"}
         ))
 
 
@@ -433,12 +434,32 @@ class CourseDetailView(Vertical):
 # Bulk Download View
 # ---------------------------------------------------------------------------
 
+def _duration(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02}:{s:02}" if h else f"{m}:{s:02}"
+
+
+def _throughput(data: dict) -> str:
+    """Speed and ETA from a "bytes" progress report, e.g. '4.2 MB/s \u00b7 ETA 1:05'."""
+    line = f"{data['rate'] / (1024 * 1024):.1f} MB/s"
+    if data.get("eta") is not None:
+        line += f" \u00b7 ETA {_duration(data['eta'])}"
+    return line
+
+
+def _in_flight(files: dict) -> float:
+    """How many files' worth of bytes the transfers still running have written."""
+    return sum(d["bytes"] / d["total"] for d in files.values() if d["total"])
+
+
 class BulkDownloadView(VerticalScroll):
     """Multi-select courses for bulk download with progress tracking."""
 
     class DownloadRequested(Message):
-        def __init__(self, courses: list[dict]) -> None:
+        def __init__(self, courses: list[dict], full: bool = False) -> None:
             self.courses = courses
+            self.full = full
             super().__init__()
 
     def __init__(self, **kwargs):
@@ -454,11 +475,14 @@ class BulkDownloadView(VerticalScroll):
         dt.add_column("", key="sel")
         dt.add_column("Course Name", key="name")
         dt.add_column("ID", key="cid")
+        dt.add_column("Progress", key="progress")
         yield dt
         with Horizontal(id="bdl-actions"):
             yield Button("Select All", id="btn-sel-all", variant="default")
             yield Button("Clear Selection", id="btn-sel-none", variant="default")
             yield Button("\u2b07 Download Selected", id="btn-bulk-dl", variant="warning")
+            yield Checkbox("Full resync", id="chk-full-sync",
+                           tooltip="Revisit every activity instead of skipping ones already synced")
         yield Static("", classes="spacer-sm")
         yield Static("", id="dl-status")
         yield ProgressBar(id="dl-progress", total=100, show_eta=False)
@@ -472,7 +496,7 @@ class BulkDownloadView(VerticalScroll):
         for c in courses:
             table.add_row(
                 Text.from_markup(f"[{MUTED}]\u2610[/{MUTED}]"),
-                c["name"], c["id"], key=c["id"],
+                c["name"], c["id"], "", key=c["id"],
             )
         self._update_count()
 
@@ -510,7 +534,7 @@ class BulkDownloadView(VerticalScroll):
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "btn-bulk-dl" and self._selected:
             selected = [c for c in self._courses if c["id"] in self._selected]
-            self.post_message(self.DownloadRequested(courses=selected))
+            self.post_message(self.DownloadRequested(courses=selected, full=self.full_resync))
         elif event.button.id == "btn-sel-all":
             table = self.query_one("#dl-table", DataTable)
             self._selected.clear()
@@ -526,18 +550,30 @@ class BulkDownloadView(VerticalScroll):
                 self._set_row_check(table, rk, False)
             self._update_count()
 
+    @property
+    def full_resync(self) -> bool:
+        return self.query_one("#chk-full-sync", Checkbox).value
+
     def set_status(self, msg: str) -> None:
         self.query_one("#dl-status", Static).update(msg)
 
     def set_progress(self, value: float) -> None:
         self.query_one("#dl-progress", ProgressBar).update(total=100, progress=value)
 
+    def set_course_progress(self, course_id: str, msg: str) -> None:
+        table = self.query_one("#dl-table", DataTable)
+        if course_id in table.rows:
+            table.update_cell(course_id, "progress", Text.from_markup(msg))
+
     def log(self, msg: str) -> None:
         self.query_one("#dl-log", RichLog).write(msg)
 
     def reset_log(self) -> None:
         self.query_one("#dl-log", RichLog).clear()
         self.query_one("#dl-status", Static).update("")
+        table = self.query_one("#dl-table", DataTable)
+        for rk in table.rows:
+            table.update_cell(rk, "progress", "")
         self.query_one("#dl-progress", ProgressBar).update(total=100, progress=0)
 
 
@@ -790,6 +826,9 @@ class MydyApp(App):
         background: {PRIMARY};
         color: {BG};
     }}
+    #chk-full-sync {{
+        margin: 0 0 0 2;
+    }}
     ProgressBar {{
         padding: 1 0;
     }}
@@ -810,6 +849,7 @@ class MydyApp(App):
 
     BINDINGS = [
         Binding("q", "quit", "Quit"),
+        Binding("r", "refresh", "Refresh"),
     ]
 
     def __init__(self):
@@ -904,14 +944,24 @@ class MydyApp(App):
         content = self.client.get_course_content(course_id)
         self.call_from_thread(self._populate_tab, "content", content)
 
-        assignments = self.client.get_assignments(course_id)
-        self.call_from_thread(self._populate_tab, "assignments", assignments)
+        self._stream_tab("assignments", self.client.iter_assignments(course_id))
 
         grades = self.client.get_grades(course_id)
         self.call_from_thread(self._populate_tab, "grades", grades)
 
-        announcements = self.client.get_announcements(course_id)
-        self.call_from_thread(self._populate_tab, "announcements", announcements)
+        self._stream_tab("announcements", self.client.iter_announcements(course_id))
+
+    def _stream_tab(self, tab: str, results) -> None:
+        """Redraw a tab each time an (index, item) result arrives, keeping course order."""
+        if isinstance(results, str):
+            self.call_from_thread(self._populate_tab, tab, results)
+            return
+        arrived: dict[int, dict] = {}
+        for i, item in results:
+            arrived[i] = item
+            self.call_from_thread(self._populate_tab, tab, [arrived[k] for k in sorted(arrived)])
+        if not arrived:
+            self.call_from_thread(self._populate_tab, tab, [])
 
     def _populate_tab(self, tab: str, data) -> None:
         view = self.query_one("#view-course", CourseDetailView)
@@ -924,6 +974,19 @@ class MydyApp(App):
         elif tab == "announcements":
             view.populate_announcements(data)
 
+    def action_refresh(self) -> None:
+        """Drop cached pages and reload the current course, or the dashboard."""
+        if not self.client.logged_in:
+            return
+        cs = self.query_one("#content", ContentSwitcher)
+        if cs.current == "view-course" and self._current_course:
+            self.client.invalidate(self._current_course["id"])
+            self.query_one("#view-course", CourseDetailView).show_loading()
+            self._load_course_data(self._current_course["id"])
+        else:
+            self.client.invalidate()
+            self._load_dashboard()
+
     # -- navigation --------------------------------------------------------
 
     def on_list_view_selected(self, event: ListView.Selected) -> None:
@@ -967,15 +1030,16 @@ class MydyApp(App):
             cs.current = self._previous_view
 
         elif event.button.id == "btn-dl-course" and self._current_course:
-            self._do_single_download(self._current_course)
+            self._do_single_download(self._current_course,
+                                     self.query_one("#view-bulk-dl", BulkDownloadView).full_resync)
 
     # -- downloads ---------------------------------------------------------
 
     def on_bulk_download_view_download_requested(self, event: BulkDownloadView.DownloadRequested) -> None:
-        self._do_bulk_download(event.courses)
+        self._do_bulk_download(event.courses, event.full)
 
     @work(thread=True, exclusive=True, group="download")
-    def _do_single_download(self, course: dict) -> None:
+    def _do_single_download(self, course: dict, full: bool = False) -> None:
         self.call_from_thread(self._switch_to_bulk_dl_view)
         dl_view = "view-bulk-dl"
 
@@ -986,16 +1050,35 @@ class MydyApp(App):
             self.call_from_thread(self._dl_log, msg)
 
         _status(f"[bold]Downloading: {course['name']}...[/bold]")
+        waited_before = self.client.rate_limit_stats()["wait_seconds"]
+        # Activities finished and total, plus the transfers still running, so
+        # the bar also moves during a long file
+        counts = {"done": 0, "total": 0}
+        files: dict[str, dict] = {}
+
+        def _progress():
+            if counts["total"]:
+                pct = (counts["done"] + _in_flight(files)) / counts["total"] * 100
+                self.call_from_thread(self._dl_set_progress, pct)
 
         def progress_cb(event_type, data):
             if event_type == "activity":
-                pct = (data["index"] / data["total"]) * 100 if data["total"] else 0
-                self.call_from_thread(self._dl_set_progress, pct)
+                counts["done"], counts["total"] = data["index"], data["total"]
+                _progress()
+            elif event_type == "bytes":
+                if data["scope"] == "file":
+                    files[data["filename"]] = data
+                    _progress()
+                else:
+                    _status(f"[bold]Downloading: {course['name']}...[/bold] [{MUTED}]{_throughput(data)}[/{MUTED}]")
             elif event_type == "file_done":
+                files.pop(data.get("filename"), None)
                 fn = data.get("filename", "?")
                 st = data.get("status", "")
                 if st == "skipped":
                     _log(f"  [{MUTED}]Skipped: {fn}[/{MUTED}]")
+                elif st == "linked":
+                    _log(f"  [{MUTED}]Linked:[/{MUTED}] {fn} [{MUTED}](same file as another course)[/{MUTED}]")
                 elif st == "error":
                     _log(f"  [red]Error: {fn} \u2014 {data.get('error', '')}[/red]")
                 else:
@@ -1003,56 +1086,104 @@ class MydyApp(App):
                     mb = sz / (1024 * 1024)
                     _log(f"  [green]Downloaded:[/green] {fn} ({mb:.1f} MB)")
 
-        result = self.client.download_course_materials(course, progress_callback=progress_cb)
+        result = self.client.download_course_materials(course, progress_callback=progress_cb, full=full)
+        waited = self.client.rate_limit_stats()["wait_seconds"] - waited_before
         self.call_from_thread(self._dl_set_progress, 100)
         _status(
             f"[bold green]Done![/bold green] {result.get('downloaded', 0)} files downloaded, "
-            f"{result.get('failed', 0)} failed."
+            f"{result.get('failed', 0)} failed. [{MUTED}]({waited:.1f}s throttled)[/{MUTED}]"
         )
 
     @work(thread=True, exclusive=True, group="download")
-    def _do_bulk_download(self, courses: list[dict]) -> None:
+    def _do_bulk_download(self, courses: list[dict], full: bool = False) -> None:
         self.call_from_thread(self._dl_reset)
 
-        total_files = 0
-        total_failed = 0
-
-        for idx, course in enumerate(courses):
+        names = {c["id"]: c["name"] for c in courses}
+        # Activities are only known once each course page is in, so overall
+        # progress is the share of courses resolved times the share of their
+        # activities finished.
+        counts = {"resolved": 0, "found": 0, "done": 0}
+        per_course: dict[str, str] = {}  # course id -> "done/total" activities
+        files: dict[tuple[str, str], dict] = {}  # running transfers
+        speed = {"line": ""}
+        waited_before = self.client.rate_limit_stats()["wait_seconds"]
+        self.call_from_thread(self._dl_set_status, f"[bold]Downloading {len(courses)} courses...[/bold]")
+
+        def _progress():
+            if counts["found"]:
+                done = counts["done"] + _in_flight(files)
+                pct = done / counts["found"] * counts["resolved"] / len(courses) * 100
+                self.call_from_thread(self._dl_set_progress, pct)
             self.call_from_thread(
                 self._dl_set_status,
-                f"[bold]Downloading {idx + 1}/{len(courses)}: {course['name']}...[/bold]",
-            )
-
-            def progress_cb(event_type, data):
-                if event_type == "activity":
-                    pct = (data["index"] / data["total"]) * 100 if data["total"] else 0
-                    self.call_from_thread(self._dl_set_progress, pct)
-                elif event_type == "file_done":
-                    fn = data.get("filename", "?")
-                    st = data.get("status", "")
-                    if st == "skipped":
-                        self.call_from_thread(self._dl_log, f"  [{MUTED}]Skipped: {fn}[/{MUTED}]")
-                    elif st == "error":
-                        self.call_from_thread(self._dl_log, f"  [red]Error: {fn}[/red]")
-                    else:
-                        sz = data.get("size_bytes", 0)
-                        mb = sz / (1024 * 1024)
-                        self.call_from_thread(self._dl_log, f"  [green]Downloaded:[/green] {fn} ({mb:.1f} MB)")
-
-            result = self.client.download_course_materials(course, progress_callback=progress_cb)
-            total_files += result.get("downloaded", 0)
-            total_failed += result.get("failed", 0)
-            self.call_from_thread(
-                self._dl_log,
-                f"[bold {PRIMARY}]{course['name']}: {result.get('downloaded', 0)} files, "
-                f"{result.get('failed', 0)} failed[/bold {PRIMARY}]",
+                f"[bold]Downloading:[/bold] {counts['done']}/{counts['found']} activities, "
+                f"{counts['resolved']}/{len(courses)} courses scanned [{MUTED}]{speed['line']}[/{MUTED}]",
             )
 
+        def progress_cb(event_type, data):
+            cid = data.get("course_id")
+            if event_type == "course":
+                counts["resolved"] += 1
+                counts["found"] += data["activities"]
+                per_course[cid] = f"0/{data['activities']}"
+                self.call_from_thread(self._dl_set_course_progress, cid, per_course[cid])
+            elif event_type == "activity":
+                counts["done"] += 1
+                per_course[cid] = f"{data['index']}/{data['total']}"
+                self.call_from_thread(self._dl_set_course_progress, cid, per_course[cid])
+                _progress()
+            elif event_type == "bytes":
+                if data["scope"] == "batch":
+                    speed["line"] = _throughput(data)
+                    _progress()
+                    return
+                files[(cid, data["filename"])] = data
+                pct = f" {data['bytes'] * 100 // data['total']}%" if data["total"] else ""
+                self.call_from_thread(
+                    self._dl_set_course_progress, cid,
+                    f"{per_course[cid]} [{MUTED}]\u00b7 {data['filename']}{pct} \u00b7 {_throughput(data)}[/{MUTED}]",
+                )
+            elif event_type == "file_done":
+                files.pop((cid, data.get("filename")), None)
+                fn = data.get("filename", "?")
+                st = data.get("status", "")
+                if st == "skipped":
+                    self.call_from_thread(self._dl_log, f"  [{MUTED}]Skipped: {fn}[/{MUTED}]")
+                elif st == "linked":
+                    self.call_from_thread(
+                        self._dl_log, f"  [{MUTED}]Linked:[/{MUTED}] {fn} [{MUTED}](same file as another course)[/{MUTED}]")
+                elif st == "error":
+                    self.call_from_thread(self._dl_log, f"  [red]Error: {fn}[/red]")
+                else:
+                    sz = data.get("size_bytes", 0)
+                    mb = sz / (1024 * 1024)
+                    self.call_from_thread(self._dl_log, f"  [green]Downloaded:[/green] {fn} ({mb:.1f} MB)")
+            elif event_type == "course_done":
+                if "error" in data:
+                    self.call_from_thread(self._dl_set_course_progress, cid, "[red]error[/red]")
+                    self.call_from_thread(self._dl_log, f"[red]{names[cid]}: {data['error']}[/red]")
+                    return
+                self.call_from_thread(
+                    self._dl_set_course_progress, cid,
+                    f"[green]\u2713[/green] {data['downloaded']}"
+                    + (f" [red]({data['failed']} failed)[/red]" if data["failed"] else ""),
+                )
+                self.call_from_thread(
+                    self._dl_log,
+                    f"[bold {PRIMARY}]{names[cid]}: {data['downloaded']} files, "
+                    f"{data['failed']} failed[/bold {PRIMARY}]",
+                )
+
+        results = self.client.download_courses(courses, progress_callback=progress_cb, full=full)
+        total_files = sum(r.get("downloaded", 0) for r in results)
+        total_failed = sum(r.get("failed", 0) for r in results)
+
+        waited = self.client.rate_limit_stats()["wait_seconds"] - waited_before
         self.call_from_thread(self._dl_set_progress, 100)
         self.call_from_thread(
             self._dl_set_status,
             f"[bold green]Done![/bold green] {total_files} files, {total_failed} failed "
-            f"across {len(courses)} courses.",
+            f"across {len(courses)} courses. [{MUTED}]({waited:.1f}s throttled)[/{MUTED}]",
         )
 
     def _switch_to_bulk_dl_view(self) -> None:
@@ -1067,6 +1198,9 @@ class MydyApp(App):
     def _dl_set_progress(self, value: float) -> None:
         self.query_one("#view-bulk-dl", BulkDownloadView).set_progress(value)
 
+    def _dl_set_course_progress(self, course_id: str, msg: str) -> None:
+        self.query_one("#view-bulk-dl", BulkDownloadView).set_course_progress(course_id, msg)
+
     def _dl_log(self, msg: str) -> None:
         self.query_one("#view-bulk-dl", BulkDownloadView).log(msg)
 
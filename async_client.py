@@ -0,0 +1,458 @@
+"""
+MyDy LMS Async HTTP Client
+
+asyncio counterpart of client.MydyClient built on httpx.AsyncClient. It has the
+same public surface but every method is a coroutine, and a single pooled
+connection set lets many page fetches be in flight from one thread.
+Parsing is shared with the synchronous client via client.parse_*.
+"""
+
+import asyncio
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+import httpx
+
+from client import (
+    BASE_URL,
+    MAX_WORKERS,
+    RAIT_URL,
+    _soup,
+    assignment_error,
+    discussion_error,
+    download_filename,
+    extract_course_name,
+    in_order,
+    login_succeeded,
+    module_type,
+    parse_activity_fingerprints,
+    parse_activity_links,
+    parse_assignment,
+    parse_assignment_links,
+    parse_attendance,
+    parse_course_content,
+    parse_courses,
+    parse_discussion,
+    parse_discussions,
+    parse_download_candidates,
+    parse_forum_url,
+    parse_grades,
+    parse_login_form,
+    prefer_source,
+    sanitize_folder_name,
+    unchanged_result,
+)
+from cache import TTLCache
+from downloads import IncompleteDownload, PartFile, Transfer, path_lock
+from manifest import manifest_for
+from ratelimit import RateLimiter, shared_limiter
+
+# Response bytes gathered before each .part write, which runs off the event loop
+WRITE_BATCH = 1 << 20
+# downloads.RETRYABLE in httpx's terms
+RETRYABLE = (httpx.TimeoutException, httpx.NetworkError, httpx.ProxyError, httpx.RemoteProtocolError,
+             httpx.DecodingError, IncompleteDownload)
+
+
+def _write_and_close(part: PartFile, data: bytes) -> None:
+    if data:
+        part.write(data)
+    part.close()
+
+
+@asynccontextmanager
+async def _path_lock(filepath: str):
+    """downloads.path_lock, waited for off the event loop."""
+    lock = path_lock(filepath)
+    acquire = asyncio.ensure_future(asyncio.to_thread(lock.__enter__))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # The thread still takes the lock; hand it straight back
+        acquire.add_done_callback(lambda _: lock.__exit__(None, None, None))
+        raise
+    try:
+        yield
+    finally:
+        lock.__exit__(None, None, None)
+
+
+class AsyncMydyClient:
+    """Asynchronous HTTP client for the MyDy LMS."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, limiter: RateLimiter | None = None):
+        self.max_workers = max(1, max_workers)
+        self.limiter = limiter or shared_limiter()
+        self.http = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=self.max_workers * 2,
+                                max_keepalive_connections=self.max_workers * 2),
+        )
+        self.logged_in = False
+        self.page_cache = TTLCache()
+        # activity module type -> the download source that last worked for it
+        self._strategies: dict[str, str] = {}
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def __aenter__(self) -> "AsyncMydyClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    # -- helpers -----------------------------------------------------------
+
+    async def _rate_limit(self, operation_type: str = "general") -> None:
+        await self.limiter.acquire_async(operation_type)
+
+    def rate_limit_stats(self) -> dict:
+        return self.limiter.stats()
+
+    async def _fan_out(self, func: Callable[..., Awaitable], items: list) -> AsyncIterator[tuple[int, object]]:
+        """Run func over items with at most max_workers in flight, yielding (index, result) as each completes."""
+        sem = asyncio.Semaphore(self.max_workers)
+
+        async def _run(i, item):
+            async with sem:
+                return i, await func(item)
+
+        for fut in asyncio.as_completed([_run(i, item) for i, item in enumerate(items)]):
+            yield await fut
+
+    async def _fetch_course_page(self, course_id: str):
+        url = f"{RAIT_URL}/course/view.php?id={course_id}"
+        cached = self.page_cache.get(url)
+        if cached:
+            return cached
+        await self._rate_limit("course")
+        try:
+            resp = await self.http.get(url)
+            if resp.status_code != 200:
+                return f"Error: Course page returned status {resp.status_code}"
+            if "login" in str(resp.url) and "course" not in str(resp.url):
+                return "Error: Session expired. Please login again."
+            soup = _soup(resp.text, "course")
+            result = (soup, extract_course_name(soup))
+            self.page_cache.set(url, result)
+            return result
+        except httpx.HTTPError as e:
+            return f"Network error: {e}"
+
+    # -- login -------------------------------------------------------------
+
+    async def login(self, username: str = "", password: str = "") -> dict:
+        username = username or os.getenv("MYDY_USERNAME", "")
+        password = password or os.getenv("MYDY_PASSWORD", "")
+        if not username or not password:
+            return {"success": False, "message": "No credentials provided."}
+
+        try:
+            initial_resp = await self.http.get(f"{RAIT_URL}/login/index.php")
+
+            if str(initial_resp.url) == f"{BASE_URL}/":
+                payload = {"username": username, "wantsurl": "", "next": "Next"}
+                step1 = await self.http.post(f"{BASE_URL}/index.php", data=payload)
+                step1_url = str(step1.url)
+                if "rait/login/index.php" in step1_url and "uname=" in step1_url:
+                    login_html = (await self.http.get(step1_url)).text
+                else:
+                    direct = f"{RAIT_URL}/login/index.php?uname={username}&wantsurl="
+                    login_html = (await self.http.get(direct)).text
+            else:
+                login_html = initial_resp.text
+
+            form = parse_login_form(login_html)
+            if form is None:
+                self.logged_in = False
+                return {"success": False, "message": "Could not find login form. LMS may be down."}
+            login_payload, action = form
+            login_payload["password"] = password
+
+            resp = await self.http.post(action, data=login_payload)
+            ok = login_succeeded(resp.text, str(resp.url))
+
+            if ok is False:
+                self.logged_in = False
+                return {"success": False, "message": "Login failed. Check credentials."}
+
+            if ok:
+                self.logged_in = True
+                # another account's course pages must not be served from memory
+                self.page_cache.clear()
+                masked = username[:2] + "****" + username[-2:] if len(username) > 4 else "****"
+                return {"success": True, "message": f"Logged in as {masked}", "masked_user": masked}
+
+            self.logged_in = False
+            return {"success": False, "message": "Login result unclear. Try again."}
+
+        except httpx.HTTPError as e:
+            self.logged_in = False
+            return {"success": False, "message": f"Network error: {e}"}
+
+    # -- courses -----------------------------------------------------------
+
+    async def list_courses(self) -> list[dict] | str:
+        if not self.logged_in:
+            return "Not logged in."
+        try:
+            await self._rate_limit("dashboard")
+            resp = await self.http.get(f"{RAIT_URL}/my/")
+            if resp.status_code != 200:
+                return f"Dashboard returned status {resp.status_code}"
+            courses = parse_courses(resp.text)
+            return courses if courses else "No courses found."
+        except httpx.HTTPError as e:
+            return f"Network error: {e}"
+
+    # -- attendance --------------------------------------------------------
+
+    async def get_attendance(self) -> dict | str:
+        if not self.logged_in:
+            return "Not logged in."
+        await self._rate_limit("dashboard")
+        try:
+            resp = await self.http.get(f"{RAIT_URL}/blocks/academic_status/ajax.php?action=attendance")
+            if resp.status_code != 200:
+                return f"Attendance returned status {resp.status_code}"
+        except httpx.HTTPError as e:
+            return f"Network error: {e}"
+        return parse_attendance(resp.text)
+
+    # -- course content ----------------------------------------------------
+
+    async def get_course_content(self, course_id: str) -> list[dict] | str:
+        if not self.logged_in:
+            return "Not logged in."
+        result = await self._fetch_course_page(course_id)
+        if isinstance(result, str):
+            return result
+        soup, _ = result
+        return parse_course_content(soup)
+
+    # -- assignments -------------------------------------------------------
+
+    async def _fetch_assignment(self, asgn: dict) -> dict:
+        await self._rate_limit("activity")
+        try:
+            resp = await self.http.get(asgn["url"])
+            return parse_assignment(resp.text, asgn)
+        except httpx.HTTPError as e:
+            return assignment_error(asgn, e)
+
+    async def iter_assignments(self, course_id: str) -> AsyncIterator[tuple[int, dict]] | str:
+        """Fetch assignment pages concurrently; the returned iterator yields (index, assignment) as each arrives.
+
+        Returns an error string instead if the course page cannot be loaded.
+        """
+        if not self.logged_in:
+            return "Not logged in."
+        result = await self._fetch_course_page(course_id)
+        if isinstance(result, str):
+            return result
+        soup, _ = result
+        return self._fan_out(self._fetch_assignment, parse_assignment_links(soup))
+
+    async def get_assignments(self, course_id: str) -> list[dict] | str:
+        results = await self.iter_assignments(course_id)
+        if isinstance(results, str):
+            return results
+        return in_order([r async for r in results])
+
+    # -- grades ------------------------------------------------------------
+
+    async def get_grades(self, course_id: str) -> dict | str:
+        if not self.logged_in:
+            return "Not logged in."
+        await self._rate_limit("course")
+        try:
+            resp = await self.http.get(f"{RAIT_URL}/grade/report/user/index.php?id={course_id}")
+            if resp.status_code != 200:
+                return f"Grade page returned status {resp.status_code}"
+        except httpx.HTTPError as e:
+            return f"Network error: {e}"
+        return parse_grades(resp.text)
+
+    # -- announcements -----------------------------------------------------
+
+    async def _fetch_discussion(self, disc: dict) -> dict:
+        await self._rate_limit("activity")
+        try:
+            dr = await self.http.get(disc["url"])
+            return parse_discussion(dr.text, disc)
+        except httpx.HTTPError:
+            return discussion_error(disc)
+
+    async def iter_announcements(self, course_id: str, limit: int = 10,
+                                 offset: int = 0) -> AsyncIterator[tuple[int, dict]] | str:
+        """Fetch up to limit discussions (0 = all) after the newest offset ones concurrently;
+        the returned iterator yields (index, announcement) as each arrives.
+
+        Returns an error string instead if the course page or forum cannot be loaded.
+        """
+        if not self.logged_in:
+            return "Not logged in."
+        result = await self._fetch_course_page(course_id)
+        if isinstance(result, str):
+            return result
+        soup, _ = result
+
+        forum_url = parse_forum_url(soup)
+        if not forum_url:
+            return "No announcements forum found."
+
+        await self._rate_limit("activity")
+        try:
+            freq = await self.http.get(forum_url)
+        except httpx.HTTPError as e:
+            return f"Error loading forum: {e}"
+
+        count = offset + limit if limit > 0 else 0
+        return self._fan_out(self._fetch_discussion, parse_discussions(freq.text, count)[offset:])
+
+    async def get_announcements(self, course_id: str, limit: int = 10, offset: int = 0) -> list[dict] | str:
+        results = await self.iter_announcements(course_id, limit, offset)
+        if isinstance(results, str):
+            return results
+        return in_order([r async for r in results])
+
+    # -- download ----------------------------------------------------------
+
+    async def download_course_materials(self, course: dict, base_dir: str = ".",
+                                        progress_callback=None, full: bool = False) -> dict:
+        if not self.logged_in:
+            return {"error": "Not logged in."}
+        result = await self._fetch_course_page(course["id"])
+        if isinstance(result, str):
+            return {"course_name": course["name"], "downloaded": 0, "failed": 0, "error": result}
+        soup, course_name = result
+
+        folder = os.path.join(base_dir, sanitize_folder_name(course_name))
+        os.makedirs(folder, exist_ok=True)
+
+        activity_links = parse_activity_links(soup)
+        fingerprints = parse_activity_fingerprints(soup)
+        manifest = manifest_for(folder)
+        synced = {} if full else {i: rec for i, aurl in enumerate(activity_links)
+                                  if (rec := manifest.synced_activity(aurl, fingerprints.get(aurl)))}
+        pending = [i for i in range(len(activity_links)) if i not in synced]
+
+        results: list[dict | None] = [None] * len(activity_links)
+        done = 0
+        for i, rec in synced.items():
+            results[i] = unchanged_result(rec, folder)
+            done += 1
+            if progress_callback:
+                progress_callback("activity", {"index": done, "total": len(activity_links),
+                                               "url": activity_links[i]})
+                progress_callback("file_done", results[i])
+        async for j, result in self._fan_out(
+                lambda i: self._try_download_methods(activity_links[i], folder, progress_callback,
+                                                     fingerprints.get(activity_links[i])), pending):
+            i = pending[j]
+            results[i] = result
+            done += 1
+            if progress_callback:
+                progress_callback("activity", {"index": done, "total": len(activity_links),
+                                               "url": activity_links[i]})
+                if results[i]:
+                    progress_callback("file_done", results[i])
+
+        downloaded = [r for r in results if r]
+        failed = [aurl for aurl, r in zip(activity_links, results) if not r]
+
+        return {
+            "course_name": course_name,
+            "folder": folder,
+            "activities_found": len(activity_links),
+            "activities_unchanged": len(synced),
+            "downloaded": len(downloaded),
+            "failed": len(failed),
+            "files": downloaded,
+        }
+
+    async def _try_download_methods(self, activity_url: str, folder: str,
+                                    progress_callback=None, fingerprint: str | None = None) -> dict | None:
+        await self._rate_limit("activity")
+        try:
+            resp = await self.http.get(activity_url)
+        except httpx.HTTPError:
+            return None
+
+        kind = module_type(activity_url)
+        manifest = manifest_for(folder)
+        for furl, source in prefer_source(parse_download_candidates(resp.text), self._strategies.get(kind)):
+            filename = manifest.claim_name(activity_url, download_filename(furl))
+            r = await self._download_file(furl, folder, source, progress_callback, filename)
+            if r:
+                if r["status"] != "error":
+                    self._strategies[kind] = source
+                    manifest.record_activity(activity_url, furl, source, os.path.join(folder, r["filename"]),
+                                             fingerprint)
+                return r
+        return None
+
+    async def _download_file(self, url: str, folder: str, source_type: str,
+                             progress_callback=None, filename: str | None = None) -> dict | None:
+        filename = filename or download_filename(url)
+        filepath = os.path.join(folder, filename)
+
+        def report(data):
+            progress_callback("bytes", {**data, "filename": filename, "scope": "file"})
+
+        try:
+            async with _path_lock(filepath):
+                r = await self._transfer(Transfer(url, filepath, report if progress_callback else None))
+        except Exception as e:
+            return {"filename": filename, "status": "error", "error": str(e)}
+        if r is None:
+            return None
+        if r["status"] in ("skipped", "linked"):
+            return {"filename": filename, "size_bytes": r["size_bytes"], "status": r["status"], "source": source_type}
+        result = {
+            "filename": filename, "size_bytes": r["size_bytes"],
+            "download_time": r["download_time"],
+            "status": "downloaded", "source": source_type,
+        }
+        if r["resumed_from"]:
+            result["resumed_from"] = r["resumed_from"]
+        return result
+
+    async def _transfer(self, transfer: Transfer) -> dict | None:
+        """downloads.fetch_file over httpx: the same Transfer, with its file work off the event loop."""
+        if done := await asyncio.to_thread(transfer.preflight):
+            return done
+        if transfer.wants_head:
+            await self._rate_limit("metadata")
+            try:
+                head = await self.http.head(transfer.url, headers={"Accept-Encoding": "identity"})
+                if done := await asyncio.to_thread(transfer.head, head.status_code, head.headers):
+                    return done
+            except httpx.HTTPError:
+                pass  # fall through to the GET, which does its own size check
+
+        while True:
+            await self._rate_limit("download")
+            try:
+                async with self.http.stream("GET", transfer.url, headers=transfer.request_headers()) as freq:
+                    if not await asyncio.to_thread(transfer.response, freq.status_code, freq.headers):
+                        return transfer.result
+                    # httpx sizes chunks by what the socket delivers; they are
+                    # batched so each write to disk is one hop to a thread
+                    part = await asyncio.to_thread(transfer.open_part)
+                    batch = bytearray()
+                    try:
+                        async for chunk in freq.aiter_bytes():
+                            batch += chunk
+                            if len(batch) >= WRITE_BATCH:
+                                await asyncio.to_thread(part.write, bytes(batch))
+                                batch.clear()
+                    finally:
+                        # whatever arrived before a dropped connection is kept for the resume
+                        await asyncio.to_thread(_write_and_close, part, bytes(batch))
+                return await asyncio.to_thread(transfer.complete, part)
+            except RETRYABLE as e:
+                await asyncio.sleep(transfer.backoff(e))
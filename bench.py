@@ -0,0 +1,416 @@
+"""
+MyDy LMS Helper - offline checks and benchmarks
+
+Runs the page parsers and MydyClient methods over the saved LMS pages in
+fixtures/, so parsing and client performance can be measured without
+touching mydy.dypatil.edu.
+
+Usage:
+  python bench.py parity      # every parser gives the same output on every backend
+  python bench.py parse       # parse time and peak memory, whole tree vs partial
+  python bench.py methods     # MydyClient method latency, parse time and memory
+  python bench.py methods --save base.json        # record a baseline
+  python bench.py methods --baseline base.json    # exit 1 if a method got slower
+  MYDY_BASE_URL=http://127.0.0.1:8765 python bench.py load   # against mock_server.py
+  python bench.py download    # file read strategies, against its own mock_server.py
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+import client
+import store
+from client import (
+    MydyClient,
+    _soup,
+    available_parsers,
+    extract_course_name,
+    login_succeeded,
+    parse_activity_fingerprints,
+    parse_activity_links,
+    parse_assignment,
+    parse_assignment_links,
+    parse_attendance,
+    parse_course_content,
+    parse_courses,
+    parse_discussion,
+    parse_discussions,
+    parse_download_candidates,
+    parse_forum_url,
+    parse_grades,
+    parse_login_form,
+    use_parser,
+)
+from downloads import fetch_file
+from mock_server import ACTIVITY_PAGES, ROUTES, activity_page, load_fixture, route
+from ratelimit import DEFAULT_LIMITS, RateLimiter
+
+_ASSIGN_LINK = {"name": "Assignment 2", "url": f"{client.RAIT_URL}/mod/assign/view.php?id=50002"}
+_DISCUSSION = {"title": "Notice 1", "url": f"{client.RAIT_URL}/mod/forum/discuss.php?d=3001",
+               "author": None, "date": None}
+
+# name -> (fixture, parser taking the page HTML)
+CASES = {
+    "courses": ("dashboard.html", parse_courses),
+    "attendance": ("attendance.html", parse_attendance),
+    "course_name": ("course.html", lambda html: extract_course_name(_soup(html, "course_name"))),
+    "course_content": ("course.html", lambda html: parse_course_content(_soup(html, "course"))),
+    "assignment_links": ("course.html", lambda html: parse_assignment_links(_soup(html, "course"))),
+    "forum_url": ("course.html", lambda html: parse_forum_url(_soup(html, "course"))),
+    "activity_links": ("course.html", lambda html: parse_activity_links(_soup(html, "course"))),
+    "activity_fingerprints": ("course.html", lambda html: parse_activity_fingerprints(_soup(html, "course"))),
+    "assignment": ("assign.html", lambda html: parse_assignment(html, _ASSIGN_LINK)),
+    "grades": ("grades.html", parse_grades),
+    "discussions": ("forum.html", lambda html: parse_discussions(html, 10)),
+    "discussion": ("discuss.html", lambda html: parse_discussion(html, _DISCUSSION)),
+    "download_resource": ("resource.html", parse_download_candidates),
+    "download_flexpaper": ("flexpaper.html", parse_download_candidates),
+    "download_presentation": ("presentation.html", parse_download_candidates),
+    "login_form": ("login.html", parse_login_form),
+    "login_check": ("login.html", lambda html: login_succeeded(html, f"{client.RAIT_URL}/login/index.php")),
+}
+
+
+COURSE = {"id": "2405", "name": "Operating Systems"}
+FILE_SIZE = 256 * 1024
+
+
+class FixtureSession(requests.Session):
+    """requests.Session that answers every request from fixtures/ instead of the network."""
+
+    def __init__(self):
+        super().__init__()
+        self._pages = {name: load_fixture(name).encode("utf-8") for _, name in ROUTES}
+        self._file = bytes(range(256)) * (FILE_SIZE // 256)
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        resp = requests.Response()
+        resp.url = url
+        resp.encoding = "utf-8"
+        if "pluginfile.php" in url:
+            # distinct bytes per URL, or the content store would dedup every file into one
+            resp.status_code, body = 200, url.encode() + self._file[len(url):]
+            resp.headers["Content-Type"] = "application/octet-stream"
+        else:
+            name = route(url)
+            resp.status_code, body = (200, self._pages[name]) if name else (404, b"")
+            if name in ACTIVITY_PAGES:
+                aid = parse_qs(urlsplit(url).query).get("id", ["0"])[0]
+                body = activity_page(body.decode("utf-8"), aid).encode("utf-8")
+            resp.headers["Content-Type"] = "text/html; charset=utf-8"
+        resp.headers["Content-Length"] = str(len(body))
+        resp._content = b"" if method.upper() == "HEAD" else body
+        resp._content_consumed = True
+        resp.raw = io.BytesIO(resp._content)
+        return resp
+
+
+# name -> call on a logged-in client; download writes into a scratch folder
+METHODS = {
+    "list_courses": lambda c, tmp: c.list_courses(),
+    "get_attendance": lambda c, tmp: c.get_attendance(),
+    "get_course_content": lambda c, tmp: c.get_course_content(COURSE["id"]),
+    "get_assignments": lambda c, tmp: c.get_assignments(COURSE["id"]),
+    "get_grades": lambda c, tmp: c.get_grades(COURSE["id"]),
+    "get_announcements": lambda c, tmp: c.get_announcements(COURSE["id"]),
+    "download_course_materials": lambda c, tmp: c.download_course_materials(COURSE, base_dir=tmp),
+}
+
+
+def _configure(backend: str, partial: bool) -> str:
+    client.PARTIAL_PARSE = partial
+    use_parser(backend)
+    return f"{backend}{'' if partial else ' (whole tree)'}"
+
+
+def _restore() -> None:
+    client.PARTIAL_PARSE = os.getenv("MYDY_PARTIAL_PARSE", "1") != "0"
+    use_parser(os.getenv("MYDY_HTML_PARSER", "auto"))
+
+
+def run_parity(args) -> int:
+    """Compare every parser's output, per backend and with/without partial parsing,
+    against html.parser building the whole tree."""
+    backends = available_parsers()
+    failures = 0
+    for name, (fixture, parse) in CASES.items():
+        html = load_fixture(fixture)
+        outputs = {}
+        for backend in backends:
+            for partial in (False, True):
+                label = _configure(backend, partial)
+                outputs[label] = json.dumps(parse(html), sort_keys=True, ensure_ascii=False)
+        reference = outputs["html.parser (whole tree)"]
+        bad = [b for b, out in outputs.items() if out != reference]
+        print(f"{name:24} {'MISMATCH ' + ', '.join(bad) if bad else 'ok'}")
+        for b in bad:
+            failures += 1
+            if args.verbose:
+                print(f"  html.parser (whole tree): {reference[:400]}\n  {b}: {outputs[b][:400]}")
+    _restore()
+    print(f"\nbackends: {', '.join(backends)} - {failures} mismatch(es)")
+    return 1 if failures else 0
+
+
+def _measure(parse, html: str, repeat: int) -> tuple[float, int]:
+    """Best-of-repeat wall time in ms, and peak traced allocation in bytes of one call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak
+
+
+def run_parse(args) -> int:
+    """Time each parser on its fixture, building the whole tree and then only the strained parts."""
+    backends = [args.backend] if args.backend else available_parsers()
+    cases = {k: v for k, v in CASES.items() if not args.only or k in args.only}
+    for backend in backends:
+        print(f"\n{backend}\n{'parser':24} {'whole ms':>9} {'partial ms':>10} {'speedup':>8} "
+              f"{'whole KiB':>10} {'partial KiB':>11}")
+        for name, (fixture, parse) in cases.items():
+            html = load_fixture(fixture)
+            _configure(backend, False)
+            full_ms, full_peak = _measure(parse, html, args.repeat)
+            _configure(backend, True)
+            part_ms, part_peak = _measure(parse, html, args.repeat)
+            print(f"{name:24} {full_ms:9.2f} {part_ms:10.2f} {full_ms / part_ms:7.1f}x "
+                  f"{full_peak / 1024:10.0f} {part_peak / 1024:11.0f}")
+    _restore()
+    return 0
+
+
+class _ParseTimer:
+    """Wraps client._soup to add up the time spent building trees.
+
+    Time is summed over worker threads, so it can exceed the wall-clock latency.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._original = client._soup
+
+    def __enter__(self):
+        def timed(html, only=None):
+            start = time.perf_counter()
+            try:
+                return self._original(html, only)
+            finally:
+                with self._lock:
+                    self.seconds += time.perf_counter() - start
+        client._soup = timed
+        return self
+
+    def __exit__(self, *exc):
+        client._soup = self._original
+
+
+def _client(workers: int) -> MydyClient:
+    unlimited = RateLimiter({op: (0, 1) for op in DEFAULT_LIMITS}, global_rate=0)
+    c = MydyClient(max_workers=workers, limiter=unlimited, http_cache=False)
+    c.session = FixtureSession()
+    c.logged_in = True
+    return c
+
+
+def _bench_method(call, args) -> dict:
+    times, parse = [], []
+    requests_made = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        c = _client(args.workers)
+        for _ in range(args.repeat):
+            if not args.warm:
+                c = _client(args.workers)
+            with _ParseTimer() as timer:
+                start = time.perf_counter()
+                result = call(c, tmp if args.warm else tempfile.mkdtemp(dir=tmp))
+                times.append(time.perf_counter() - start)
+            parse.append(timer.seconds)
+            if isinstance(result, str):
+                raise SystemExit(f"method returned an error: {result}")
+            requests_made = c.session.requests
+            c.session.requests = 0
+        if not args.warm:
+            c = _client(args.workers)
+        tracemalloc.start()
+        call(c, tmp if args.warm else tempfile.mkdtemp(dir=tmp))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "best_ms": round(min(times) * 1000, 2),
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "parse_ms": round(statistics.median(parse) * 1000, 2),
+        "requests": requests_made,
+        "peak_kib": round(peak / 1024),
+    }
+
+
+def run_methods(args) -> int:
+    """Time MydyClient methods end to end against FixtureSession, with no rate limiting."""
+    names = args.only or list(METHODS)
+    unknown = [n for n in names if n not in METHODS]
+    if unknown:
+        raise SystemExit(f"unknown method(s): {', '.join(unknown)}; choose from {', '.join(METHODS)}")
+    print(f"parser: {client.HTML_PARSER}, partial parse: {'on' if client.PARTIAL_PARSE else 'off'}, "
+          f"workers: {args.workers}, {'warm' if args.warm else 'cold'} caches\n")
+    print(f"{'method':27} {'best ms':>8} {'median ms':>9} {'parse ms':>8} {'requests':>8} {'peak KiB':>9}")
+    results = {}
+    for name in names:
+        r = results[name] = _bench_method(METHODS[name], args)
+        print(f"{name:27} {r['best_ms']:8.2f} {r['median_ms']:9.2f} {r['parse_ms']:8.2f} "
+              f"{r['requests']:8} {r['peak_kib']:9}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base and r["median_ms"] > base["median_ms"] * args.tolerance:
+            regressions.append(f"{name}: {base['median_ms']:.2f} -> {r['median_ms']:.2f} ms")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"\n{len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance}x)")
+    return 1 if regressions else 0
+
+
+def run_load(args) -> int:
+    """Log in and download several courses from mock_server.py over real HTTP."""
+    if "dypatil.edu" in client.BASE_URL:
+        raise SystemExit("refusing to load-test the real LMS: start mock_server.py and set MYDY_BASE_URL")
+    limiter = RateLimiter({op: (0, 1) for op in DEFAULT_LIMITS}, global_rate=0) if args.no_limit else RateLimiter()
+    c = MydyClient(max_workers=args.workers, limiter=limiter, http_cache=False,
+                   course_workers=args.course_workers, download_workers=args.download_workers)
+    login = c.login("loadtest@example.edu", os.getenv("MYDY_PASSWORD", "loadtest"))
+    if not login["success"]:
+        raise SystemExit(f"login failed: {login['message']}")
+    courses = c.list_courses()
+    if isinstance(courses, str):
+        raise SystemExit(courses)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.serial:
+            results = [c.download_course_materials(course, base_dir=tmp) for course in courses[:args.courses]]
+        else:
+            results = c.download_courses(courses[:args.courses], base_dir=tmp)
+    elapsed = time.perf_counter() - start
+    for r in results:
+        if "error" in r:
+            raise SystemExit(r["error"])
+    files = sum(r["downloaded"] for r in results)
+    size = sum(f.get("size_bytes", 0) for r in results for f in r["files"])
+    stats = c.rate_limit_stats()
+    print(f"{client.BASE_URL}: {min(args.courses, len(courses))} course(s), {files} files, "
+          f"{size / (1 << 20):.1f} MiB in {elapsed:.2f}s ({size / (1 << 20) / elapsed:.1f} MiB/s)")
+    print(f"{stats['requests']} requests, {stats['throttled']} throttled, "
+          f"{stats['wait_seconds']:.2f}s waiting on the rate limiter")
+    return 0
+
+
+# fetch_file read strategies compared by `bench.py download`: label -> (chunk_size, preallocate)
+READ_STRATEGIES = {
+    "8K chunks": (8192, False),
+    "64K chunks": (65536, False),
+    "adaptive": (None, False),
+    "adaptive + prealloc": (None, True),
+}
+
+
+def run_download(args) -> int:
+    """Stream one large file from a mock_server.py subprocess with each read strategy."""
+    # Every repeat must stream the bytes, not hardlink the previous repeat's copy
+    store.STORE_ENABLED = False
+    server = subprocess.Popen(
+        [sys.executable, "-u", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+         "--port", "0", "--file-size", args.size, "--bandwidth", args.bandwidth],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = server.stdout.readline().split()[3]
+        url = f"{base_url}/pluginfile.php/1/mod_resource/content/0/bench.pdf"
+        session = requests.Session()
+        print(f"{args.size} file from {base_url}, best of {args.repeat}\n"
+              f"{'strategy':22} {'wall s':>8} {'MiB/s':>8} {'CPU s':>8}")
+        for label, (chunk_size, preallocate) in READ_STRATEGIES.items():
+            best_wall, best_cpu, size = float("inf"), float("inf"), 0
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as tmp:
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    r = fetch_file(session, url, os.path.join(tmp, "bench.pdf"),
+                                   chunk_size=chunk_size, preallocate=preallocate)
+                    best_wall = min(best_wall, time.perf_counter() - wall)
+                    best_cpu = min(best_cpu, time.process_time() - cpu)
+                    size = r["size_bytes"]
+            print(f"{label:22} {best_wall:8.2f} {size / (1 << 20) / best_wall:8.1f} {best_cpu:8.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("parity", help="check parser output is identical across backends")
+    p.add_argument("-v", "--verbose", action="store_true", help="print mismatching output")
+    p.set_defaults(func=run_parity)
+    p = sub.add_parser("parse", help="time parsers on the fixtures, whole tree vs partial")
+    p.add_argument("-n", "--repeat", type=int, default=20, help="runs per parser (best is reported)")
+    p.add_argument("--backend", choices=available_parsers(), help="only this parser backend")
+    p.add_argument("only", nargs="*", help=f"parsers to run (default all): {', '.join(CASES)}")
+    p.set_defaults(func=run_parse)
+    p = sub.add_parser("methods", help="time MydyClient methods against the fixtures")
+    p.add_argument("-n", "--repeat", type=int, default=10, help="runs per method")
+    p.add_argument("-w", "--workers", type=int, default=client.MAX_WORKERS, help="client max_workers")
+    p.add_argument("--warm", action="store_true",
+                   help="reuse one client and download folder, so caches and the sync manifest are hit")
+    p.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    p.add_argument("--baseline", metavar="FILE", help="compare against results saved with --save")
+    p.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown against --baseline")
+    p.add_argument("only", nargs="*", help=f"methods to run (default all): {', '.join(METHODS)}")
+    p.set_defaults(func=run_methods)
+    p = sub.add_parser("load", help="download courses end to end from mock_server.py (MYDY_BASE_URL)")
+    p.add_argument("-c", "--courses", type=int, default=3, help="courses to download")
+    p.add_argument("-w", "--workers", type=int, default=client.MAX_WORKERS, help="client max_workers")
+    p.add_argument("--course-workers", type=int, default=client.COURSE_WORKERS, help="course pages fetched at once")
+    p.add_argument("--download-workers", type=int, default=client.DOWNLOAD_WORKERS, help="files streamed at once")
+    p.add_argument("--serial", action="store_true",
+                   help="download courses one after another instead of as one pipeline")
+    p.add_argument("--no-limit", action="store_true", help="disable the rate limiter")
+    p.set_defaults(func=run_load)
+    p = sub.add_parser("download", help="compare file read strategies against a mock_server.py subprocess")
+    p.add_argument("-s", "--size", default="200M", help="file size (K/M/G)")
+    p.add_argument("--bandwidth", default="0", help="server bytes/second, 0 = unlimited (K/M/G)")
+    p.add_argument("-n", "--repeat", type=int, default=3, help="downloads per strategy (best is reported)")
+    p.set_defaults(func=run_download)
+    args = ap.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+MyDy LMS caches
+
+- TTLCache: in-memory TTL/LRU cache used by the clients to share
+  fetched-and-parsed pages between calls, so opening a course downloads and
+  parses its page once.
+- CachingSession: requests.Session that keeps read-only LMS pages on disk with
+  their validators, revalidates them with conditional requests and serves
+  recent copies of the dashboard and course pages immediately
+  (stale-while-revalidate), so cold starts render without waiting on the
+  network.
+- ResultCache: the structured output of the page parsers, keyed by a hash of
+  the source HTML with its per-session sesskey removed, so an unchanged page
+  is never parsed twice, even after logging in again.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+PAGE_CACHE_SIZE = int(os.getenv("MYDY_PAGE_CACHE_SIZE", "16"))
+PAGE_CACHE_TTL = float(os.getenv("MYDY_PAGE_CACHE_TTL", "120"))
+
+HTTP_CACHE_ENABLED = os.getenv("MYDY_HTTP_CACHE", "1") != "0"
+HTTP_CACHE_DIR = os.getenv("MYDY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mydy-lms"))
+HTTP_CACHE_FRESH = float(os.getenv("MYDY_HTTP_CACHE_FRESH", "30"))
+HTTP_CACHE_STALE = float(os.getenv("MYDY_HTTP_CACHE_STALE", "600"))
+
+# Read-only views that are safe to serve from disk
+CACHEABLE_PATHS = (
+    "/my/", "/blocks/academic_status/ajax.php", "/course/view.php",
+    "/grade/report/user/index.php", "/mod/assign/view.php",
+    "/mod/forum/view.php", "/mod/forum/discuss.php",
+)
+# Navigation pages that may be served stale while they revalidate; deadlines,
+# grades and attendance are always revalidated once they are not fresh
+STALE_PATHS = ("/my/", "/course/view.php")
+_STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+RESULT_CACHE_SIZE = int(os.getenv("MYDY_RESULT_CACHE_SIZE", "128"))
+# Parsed results on disk not used for this long are pruned when the cache opens
+RESULT_CACHE_MAX_AGE = float(os.getenv("MYDY_RESULT_CACHE_MAX_AGE", str(30 * 86400)))
+
+# Moodle embeds the session key in every form and logout link
+_SESSKEY = re.compile(r'(sesskey(?:" value="|=|"\s*:\s*"))[^"&\'\s<>]+')
+
+_MISSING = object()
+
+
+def content_digest(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def page_digest(html: str) -> str:
+    """content_digest of a page with its sesskey blanked, stable across logins."""
+    return content_digest(_SESSKEY.sub(r"\1", html))
+
+
+class TTLCache:
+    """Thread-safe mapping with per-entry expiry and least-recently-used eviction."""
+
+    def __init__(self, maxsize: int = PAGE_CACHE_SIZE, ttl: float = PAGE_CACHE_TTL):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate. Returns how many were dropped."""
+        with self._lock:
+            doomed = [k for k in self._data if predicate(k)]
+            for k in doomed:
+                del self._data[k]
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CachingSession(requests.Session):
+    """requests.Session with a per-user on-disk cache for read-only LMS pages.
+
+    Entries younger than `fresh` seconds are served without touching the
+    network; dashboard and course page entries younger than `stale` are
+    served immediately and revalidated in a background thread; anything else
+    is revalidated inline with If-None-Match / If-Modified-Since. Nothing is cached until
+    set_namespace() is called after login, so pages never leak between
+    accounts and the login flow always hits the server.
+    """
+
+    def __init__(self, cache_dir: str = HTTP_CACHE_DIR,
+                 fresh: float = HTTP_CACHE_FRESH, stale: float = HTTP_CACHE_STALE):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.fresh = fresh
+        self.stale = stale
+        self.namespace: str | None = None
+        self._revalidating: set[str] = set()
+        self._revalidating_lock = threading.Lock()
+
+    def set_namespace(self, username: str | None) -> None:
+        self.namespace = hashlib.sha256(username.lower().encode()).hexdigest()[:16] if username else None
+
+    def clear_cache(self) -> None:
+        folder = self._folder()
+        if folder and os.path.isdir(folder):
+            for name in os.listdir(folder):
+                os.remove(os.path.join(folder, name))
+
+    def forget(self, urls) -> None:
+        """Drop the cached copies of specific URLs so the next GET goes to the server."""
+        if self.namespace is None:
+            return
+        for url in urls:
+            for path in self._paths(url):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # -- storage -----------------------------------------------------------
+
+    def _folder(self) -> str | None:
+        return os.path.join(self.cache_dir, "http", self.namespace) if self.namespace else None
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self._folder(), key)
+        return base + ".json", base + ".body"
+
+    def _load(self, url: str) -> tuple[dict, bytes] | None:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, url: str, resp: requests.Response) -> None:
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), mode=0o700, exist_ok=True)
+        meta = {
+            "url": resp.url,
+            "encoding": resp.encoding,
+            "headers": {h: resp.headers[h] for h in _STORED_HEADERS if h in resp.headers},
+            "stored_at": time.time(),
+        }
+        # Body first, then metadata: a readable .json always has its body
+        for path, data, mode in ((body_path, resp.content, "wb"),
+                                 (meta_path, json.dumps(meta), "w")):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, mode) as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+    def _touch(self, url: str, meta: dict) -> None:
+        meta_path, _ = self._paths(url)
+        meta["stored_at"] = time.time()
+        tmp = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    @staticmethod
+    def _cached_response(meta: dict, body: bytes, state: str) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = body
+        resp.url = meta["url"]
+        resp.encoding = meta.get("encoding")
+        resp.headers = CaseInsensitiveDict(meta.get("headers", {}))
+        resp.headers["X-Mydy-Cache"] = state
+        return resp
+
+    # -- request path ------------------------------------------------------
+
+    def request(self, method, url, **kwargs):
+        if (self.namespace is None or method.upper() != "GET" or kwargs.get("stream")
+                or kwargs.get("params") or not any(p in url for p in CACHEABLE_PATHS)):
+            return super().request(method, url, **kwargs)
+
+        entry = self._load(url)
+        if entry:
+            meta, body = entry
+            age = time.time() - meta["stored_at"]
+            if age < self.fresh:
+                return self._cached_response(meta, body, "fresh")
+            if age < self.stale and any(p in url for p in STALE_PATHS):
+                self._revalidate_in_background(url, entry)
+                return self._cached_response(meta, body, "stale")
+        return self._conditional_get(url, entry, kwargs)
+
+    def _conditional_get(self, url: str, entry: tuple[dict, bytes] | None, kwargs: dict) -> requests.Response:
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            validators = entry[0].get("headers", {})
+            if "ETag" in validators:
+                headers["If-None-Match"] = validators["ETag"]
+            if "Last-Modified" in validators:
+                headers["If-Modified-Since"] = validators["Last-Modified"]
+        resp = super().request("GET", url, headers=headers, **kwargs)
+
+        try:
+            if resp.status_code == 304 and entry:
+                meta, body = entry
+                self._touch(url, meta)
+                return self._cached_response(meta, body, "revalidated")
+            # A redirect to the login page means the session expired; never cache that
+            if resp.status_code == 200 and not ("login" in resp.url and "login" not in url):
+                self._store(url, resp)
+        except OSError:
+            pass  # the cache is best-effort; a write failure must not fail the request
+        return resp
+
+    def _revalidate_in_background(self, url: str, entry: tuple[dict, bytes]) -> None:
+        with self._revalidating_lock:
+            if url in self._revalidating:
+                return
+            self._revalidating.add(url)
+
+        def _run():
+            try:
+                self._conditional_get(url, entry, {})
+            except (requests.RequestException, OSError):
+                pass
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(url)
+
+        threading.Thread(target=_run, daemon=True).start()
+
+
+class ResultCache:
+    """Parser output keyed by (kind, hash of the source HTML).
+
+    Entries live in memory and, when cache_dir is set, as JSON on disk under a
+    folder named after the parser version: bumping the version orphans every
+    old entry. Because keys are content hashes an entry can never be stale;
+    tags (course ids) only exist so invalidate() can free memory. Disk entries
+    not read for max_age seconds are deleted when the cache is opened.
+    """
+
+    def __init__(self, version: int, cache_dir: str | None = HTTP_CACHE_DIR,
+                 maxsize: int = RESULT_CACHE_SIZE, max_age: float = RESULT_CACHE_MAX_AGE):
+        self.folder = os.path.join(cache_dir, "parsed", f"v{version}") if cache_dir else None
+        self.max_age = max_age
+        self._memory = TTLCache(maxsize, ttl=float("inf"))
+        self.prune()
+
+    def get(self, kind: str, digest: str, parse: Callable[[], object], tag: Hashable = None):
+        """Return the cached result for this page, calling parse() on a miss.
+
+        Results are deep-copied on the way out so callers may mutate them.
+        """
+        key = (tag, kind, digest)
+        result = self._memory.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._load(kind, digest)
+            if result is _MISSING:
+                result = parse()
+                self._store(kind, digest, result)
+            self._memory.set(key, result)
+        return copy.deepcopy(result)
+
+    def invalidate(self, tag: Hashable = None) -> None:
+        if tag is None:
+            self._memory.clear()
+        else:
+            self._memory.discard(lambda k: k[0] == tag)
+
+    def prune(self) -> None:
+        """Delete disk entries that haven't been read or written for max_age seconds."""
+        if not self.folder:
+            return
+        cutoff = time.time() - self.max_age
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.folder, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _path(self, kind: str, digest: str) -> str:
+        return os.path.join(self.folder, f"{kind}-{digest}.json")
+
+    def _load(self, kind: str, digest: str):
+        if not self.folder:
+            return _MISSING
+        path = self._path(kind, digest)
+        try:
+            with open(path, encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        try:
+            os.utime(path)  # keep entries that are still in use out of prune()
+        except OSError:
+            pass
+        return result
+
+    def _store(self, kind: str, digest: str, result) -> None:
+        if not self.folder:
+            return
+        path = self._path(kind, digest)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.folder, mode=0o700, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError):
+            pass
@@ -3,89 +3,697 @@ MyDy LMS HTTP Client
 
 Synchronous HTTP client for the MyDy (Moodle-based) LMS.
 No UI dependency — used by both the TUI app and MCP server.
+
+Page parsing lives in the module-level parse_* functions so the async client
+(async_client.py) can share it; the client classes only do the fetching.
 """
 
+import copy
 import os
 import re
-import time
-import random
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from urllib.parse import unquote
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, ElementFilter, SoupStrainer
+from requests.adapters import HTTPAdapter
+
+from cache import (HTTP_CACHE_DIR, HTTP_CACHE_ENABLED, CachingSession, ResultCache, TTLCache, content_digest,
+                   page_digest)
+from downloads import PROGRESS_INTERVAL, BatchProgress, fetch_file
+from manifest import manifest_for
+from ratelimit import RateLimiter, shared_limiter
 
-BASE_URL = "https://mydy.dypatil.edu"
+# Point MYDY_BASE_URL at mock_server.py to exercise the client without the real LMS
+BASE_URL = os.getenv("MYDY_BASE_URL", "https://mydy.dypatil.edu").rstrip("/")
 RAIT_URL = f"{BASE_URL}/rait"
 
-MIN_DELAY = 0.5
-MAX_DELAY = 0.5
-DOWNLOAD_DELAY = 0.1
+# Number of activities resolved/downloaded in parallel. Politeness is handled
+# by the shared token-bucket limiter (see ratelimit.py), not per-call sleeps.
+MAX_WORKERS = int(os.getenv("MYDY_MAX_WORKERS", "4"))
+# Bulk downloads pipeline course pages -> activity pages -> file transfers;
+# activity pages use MAX_WORKERS, the other two stages are sized here.
+COURSE_WORKERS = int(os.getenv("MYDY_COURSE_WORKERS", "2"))
+DOWNLOAD_WORKERS = int(os.getenv("MYDY_DOWNLOAD_WORKERS", str(MAX_WORKERS)))
+
+ACTIVITY_TYPES = [
+    "/mod/resource/view.php", "/mod/flexpaper/view.php",
+    "/mod/presentation/view.php", "/mod/casestudy/view.php",
+    "/mod/dyquestion/view.php",
+]
+ASSIGNMENT_FIELDS = ("due_date", "submission_status", "grading_status", "grade", "time_remaining")
+
+# Bump whenever the output of any parse_* function changes, so results cached
+# on disk by an older parser are ignored.
+PARSER_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# Parsing helpers (shared by MydyClient and AsyncMydyClient)
+# ---------------------------------------------------------------------------
+
+def available_parsers() -> list[str]:
+    """HTML parser backends usable in this install, fastest first."""
+    backends = []
+    try:
+        import lxml  # noqa: F401
+        backends.append("lxml")
+    except ImportError:
+        pass
+    backends.append("html.parser")
+    return backends
+
+
+def resolve_parser(name: str) -> str:
+    """Map a MYDY_HTML_PARSER value to an installed backend, falling back to html.parser."""
+    backends = available_parsers()
+    if name in backends:
+        return name
+    return backends[0] if name == "auto" else "html.parser"
+
+
+HTML_PARSER = resolve_parser(os.getenv("MYDY_HTML_PARSER", "auto"))
+
+
+def use_parser(name: str) -> str:
+    """Switch the backend used by every parse_* function. Returns the backend actually selected."""
+    global HTML_PARSER
+    HTML_PARSER = resolve_parser(name)
+    return HTML_PARSER
+
+
+class AnyOf(ElementFilter):
+    """parse_only filter that keeps a tag, with everything inside it, if any strainer matches it."""
+
+    def __init__(self, *strainers: SoupStrainer):
+        super().__init__()
+        self.strainers = strainers
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return any(s.allow_tag_creation(nsprefix, name, attrs) for s in self.strainers)
+
+    def allow_string_creation(self, string: str) -> bool:
+        return False
+
+
+# What each parser looks at. Every element a parser can find is matched here
+# (or sits inside something that is), so partial trees give identical output.
+STRAINERS = {
+    "login": SoupStrainer(["form", "input"]),
+    "courses": AnyOf(
+        SoupStrainer("div", id=re.compile(r"stu_previousclasses")),
+        SoupStrainer("div", class_=re.compile(r"block.*navigation|block.*tree|block.*university")),
+        SoupStrainer("a", href=re.compile(r"/course/view\.php\?id=\d+")),
+    ),
+    "attendance": AnyOf(
+        SoupStrainer("div", style=re.compile(r"float")),
+        SoupStrainer("table", class_="generaltable"),
+    ),
+    # A course page is almost all sections, which the content, activity and
+    # assignment parsers walk whole, so it is built as a whole tree ("course"
+    # has no strainer); only the name can be read from a partial one.
+    "course_name": SoupStrainer("title"),
+    "assignment": SoupStrainer(["h2", "table"]),
+    "grades": AnyOf(
+        SoupStrainer("title"),
+        SoupStrainer("table"),
+        SoupStrainer("div", class_=re.compile(r"errorbox|alert-danger")),
+    ),
+    "forum": AnyOf(
+        SoupStrainer("table", class_=re.compile(r"forumheaderlist|discussion-list")),
+        SoupStrainer("a", href=re.compile(r"/mod/forum/discuss\.php\?d=\d+")),
+    ),
+    "discussion": SoupStrainer("div", class_=re.compile(r"forumpost|forum-post")),
+    "activity": SoupStrainer(["a", "iframe", "object"]),
+}
+
+# Build only the parts of a page listed in STRAINERS; set MYDY_PARTIAL_PARSE=0 to build whole trees
+PARTIAL_PARSE = os.getenv("MYDY_PARTIAL_PARSE", "1") != "0"
+
+
+def _soup(html: str, only: str | None = None) -> BeautifulSoup:
+    strainer = STRAINERS.get(only) if PARTIAL_PARSE else None
+    if strainer:
+        return BeautifulSoup(html, HTML_PARSER, parse_only=strainer)
+    return BeautifulSoup(html, HTML_PARSER)
+
+
+def _absolute(href: str) -> str:
+    return href if href.startswith("http") else BASE_URL + href
+
+
+def sanitize_folder_name(name: str) -> str:
+    return re.sub(r'[<>:"/\\|?*]', "_", name).strip()
+
+
+def extract_course_name(soup: BeautifulSoup) -> str:
+    title_tag = soup.find("title")
+    if title_tag:
+        title_text = title_tag.get_text()
+        if "Course:" in title_text:
+            return title_text.split("Course:", 1)[1].strip()
+        return title_text.strip()
+    return "Unknown Course"
+
+
+def get_activity_name(element) -> str:
+    name_span = element.find("span", class_="instancename")
+    if name_span:
+        # Clone to avoid mutating the tree
+        clone = copy.copy(name_span)
+        for hidden in clone.find_all("span", class_="accesshide"):
+            hidden.decompose()
+        return clone.get_text(strip=True)
+    # Fallback: get just the first <a> direct text, not nested notification text
+    a_tag = element.find("a", href=True)
+    if a_tag:
+        # Try to get only the direct text of the link, not child elements
+        direct_text = a_tag.find(string=True, recursive=False)
+        if direct_text and direct_text.strip():
+            return direct_text.strip()
+        return a_tag.get_text(strip=True)
+    return ""
+
+
+def parse_login_form(html: str) -> tuple[dict[str, str], str] | None:
+    """Return (hidden form fields, form action) or None if there is no password field."""
+    login_soup = _soup(html, "login")
+    if not login_soup.find("input", {"name": "password"}):
+        return None
+    payload: dict[str, str] = {}
+    for inp in login_soup.find_all("input", {"type": "hidden"}):
+        name = inp.get("name")
+        if name:
+            payload[name] = inp.get("value", "")
+    form = login_soup.find("form")
+    action = form["action"] if form and form.get("action") else f"{RAIT_URL}/login/index.php"
+    if not action.startswith("http"):
+        action = f"{RAIT_URL}/login/" + action.lstrip("/")
+    return payload, action
+
+
+def login_succeeded(html: str, url: str) -> bool | None:
+    """True/False for a clear login outcome, None if the response is ambiguous."""
+    text_lower = html.lower()
+    has_login = _soup(html, "login").find("input", {"name": "password"}) is not None
+    has_error = any(x in text_lower for x in ["invalid login", "login failed", "incorrect"])
+    has_success = any(x in text_lower for x in ["dashboard", "logout", "profile"])
+    if has_login or has_error:
+        return False
+    if has_success or ("rait" in url and "login" not in url):
+        return True
+    return None
+
+
+def parse_courses(html: str) -> list[dict]:
+    soup = _soup(html, "courses")
+    courses: list[dict] = []
+    seen: set[str] = set()
+
+    def _add_links(container):
+        for link in container.find_all("a", href=re.compile(r"/course/view\.php\?id=\d+")):
+            href = link.get("href", "")
+            m = re.search(r"id=(\d+)", href)
+            if m:
+                cid = m.group(1)
+                if cid not in seen:
+                    name = link.get_text(strip=True)
+                    if name and len(name) > 2:
+                        seen.add(cid)
+                        courses.append({"id": cid, "name": name, "url": _absolute(href)})
+
+    block = soup.find("div", {"id": re.compile(r".*stu_previousclasses.*")})
+    if block:
+        _add_links(block)
+    for nav in soup.find_all("div", class_=re.compile(r"block.*navigation|block.*tree|block.*university")):
+        _add_links(nav)
+    if not courses:
+        _add_links(soup)
+
+    courses.sort(key=lambda c: int(c["id"]), reverse=True)
+    return courses
+
+
+def parse_attendance(html: str) -> dict:
+    soup = _soup(html, "attendance")
+    batch, semester = None, None
+    for div in soup.find_all("div", style=re.compile(r"float")):
+        text = div.get_text(strip=True)
+        if re.match(r"^[A-Z]+-\d+-", text):
+            batch = text
+        elif "Semester" in text:
+            semester = text
+
+    table = soup.find("table", class_="generaltable")
+    subjects: list[dict] = []
+    if table:
+        for row in table.find_all("tr"):
+            cells = row.find_all("td")
+            if len(cells) < 5:
+                continue
+            t = [c.get_text(strip=True) for c in cells]
+            subjects.append({
+                "subject": t[0],
+                "total_classes": int(t[1]) if t[1].isdigit() else t[1],
+                "present": int(t[2]) if t[2].isdigit() else t[2],
+                "absent": int(t[3]) if t[3].isdigit() else t[3],
+                "percentage": float(t[4]) if t[4].replace(".", "", 1).isdigit() else t[4],
+            })
+    return {"batch": batch, "semester": semester, "subjects": subjects}
+
+
+def _parse_activity(act) -> dict | None:
+    cls = " ".join(act.get("class", []))
+    tm = re.search(r"modtype_(\w+)", cls)
+    atype = tm.group(1) if tm else "unknown"
+    aname = get_activity_name(act)
+    a_tag = act.find("a", href=True)
+    if not a_tag:
+        return None
+    return {"name": aname, "type": atype, "url": _absolute(a_tag["href"])}
+
+
+def parse_course_content(soup: BeautifulSoup) -> list[dict]:
+    sections: list[dict] = []
+    section_els = soup.find_all("li", class_=re.compile(r"\bsection\b"))
+    if not section_els:
+        section_els = soup.find_all("div", class_=re.compile(r"\bsection\b"))
+
+    for sec in section_els:
+        sid = sec.get("id", "")
+        m = re.search(r"section-(\d+)", sid)
+        num = int(m.group(1)) if m else None
+        name_el = sec.find(class_="sectionname") or sec.find(["h3", "h4"])
+        name = name_el.get_text(strip=True) if name_el else f"Section {num}"
+        activities = [a for a in map(_parse_activity, sec.find_all("li", class_=re.compile(r"\bactivity\b"))) if a]
+        sections.append({"section_number": num, "section_name": name, "activities": activities})
+
+    if not sections:
+        all_acts = [a for a in map(_parse_activity, soup.find_all("li", class_=re.compile(r"\bactivity\b"))) if a]
+        if all_acts:
+            sections = [{"section_number": 0, "section_name": "All Activities", "activities": all_acts}]
+    return sections
+
+
+def parse_assignment_links(soup: BeautifulSoup) -> list[dict]:
+    # Only search within the course content area to avoid nav sidebar links
+    content_area = soup.find("div", class_="course-content") or soup.find("div", id="region-main") or soup
+
+    links: list[dict] = []
+    for li in content_area.find_all("li", class_=re.compile(r"modtype_assign")):
+        a = li.find("a", href=True)
+        if a and "/mod/assign/view.php" in a["href"]:
+            links.append({"name": get_activity_name(li), "url": _absolute(a["href"])})
+
+    if not links:
+        seen: set[str] = set()
+        for a in content_area.find_all("a", href=re.compile(r"/mod/assign/view\.php\?id=\d+")):
+            href = a["href"]
+            if href not in seen:
+                seen.add(href)
+                links.append({"name": a.get_text(strip=True), "url": _absolute(href)})
+    return links
+
+
+def parse_assignment(html: str, link: dict) -> dict:
+    asoup = _soup(html, "assignment")
+    # Get clean name from the page heading
+    h2 = asoup.find("h2")
+    clean_name = h2.get_text(strip=True) if h2 else link["name"]
+    info: dict = {"name": clean_name, "url": link["url"]}
+    table = asoup.find("table", class_="submissionstatustable") or asoup.find("table", class_="generaltable")
+    if table:
+        for row in table.find_all("tr"):
+            cells = row.find_all(["td", "th"])
+            if len(cells) >= 2:
+                label = cells[0].get_text(strip=True).lower()
+                value = cells[1].get_text(strip=True)
+                if "due date" in label:
+                    info["due_date"] = value
+                elif "submission status" in label:
+                    info["submission_status"] = value
+                elif "grading status" in label:
+                    info["grading_status"] = value
+                elif "grade" in label and "grading" not in label:
+                    info["grade"] = value
+                elif "time remaining" in label:
+                    info["time_remaining"] = value
+    for f in ASSIGNMENT_FIELDS:
+        info.setdefault(f, None)
+    return info
+
+
+def assignment_error(link: dict, error: Exception) -> dict:
+    return {"name": link["name"], "url": link["url"], "error": str(error),
+            **{f: None for f in ASSIGNMENT_FIELDS}}
+
+
+def parse_grades(html: str) -> dict | str:
+    soup = _soup(html, "grades")
+    course_name = extract_course_name(soup)
+
+    err = soup.find("div", class_="errorbox") or soup.find("div", class_=re.compile(r"alert-danger"))
+    if err:
+        return f"Error: {err.get_text(strip=True)}"
+
+    table = (
+        soup.find("table", class_=re.compile(r"user-grade"))
+        or soup.find("table", id="user-grade")
+        or soup.find("table", class_="generaltable")
+    )
+    if not table:
+        return {"course_name": course_name, "grade_items": [], "course_total": None}
+
+    headers: list[str] = []
+    header_row = table.find("tr")
+    if header_row:
+        headers = [th.get_text(strip=True).lower() for th in header_row.find_all(["th", "td"])]
+
+    col: dict[str, int] = {}
+    for i, h in enumerate(headers):
+        if "grade item" in h or ("item" in h and "name" not in col):
+            col["name"] = i
+        elif h == "grade" or ("grade" in h and "item" not in h and "grade" not in col):
+            col["grade"] = i
+        elif "range" in h:
+            col["range"] = i
+        elif "percentage" in h:
+            col["percentage"] = i
+        elif "feedback" in h:
+            col["feedback"] = i
+
+    def _cell(cells, key):
+        idx = col.get(key)
+        return cells[idx].get_text(strip=True) if idx is not None and idx < len(cells) else None
+
+    items: list[dict] = []
+    course_total = None
+    for row in table.find_all("tr")[1:]:
+        cells = row.find_all(["td", "th"])
+        if not cells:
+            continue
+        item = {
+            "name": _cell(cells, "name") or cells[0].get_text(strip=True),
+            "grade": _cell(cells, "grade"),
+            "range": _cell(cells, "range"),
+            "percentage": _cell(cells, "percentage"),
+            "feedback": _cell(cells, "feedback"),
+        }
+        if "course total" in (item["name"] or "").lower():
+            course_total = {k: v for k, v in item.items() if k != "name"}
+        else:
+            rc = " ".join(row.get("class", []))
+            if "category" in rc and not item.get("grade"):
+                continue
+            items.append(item)
+
+    return {"course_name": course_name, "grade_items": items, "course_total": course_total}
+
+
+def parse_forum_url(soup: BeautifulSoup) -> str | None:
+    for li in soup.find_all("li", class_=re.compile(r"modtype_forum")):
+        a = li.find("a", href=True)
+        if a and "announcement" in a.get_text(strip=True).lower():
+            return _absolute(a["href"])
+    for a in soup.find_all("a", href=re.compile(r"/mod/forum/view\.php\?id=\d+")):
+        return _absolute(a["href"])
+    return None
+
+
+def parse_discussions(html: str, limit: int) -> list[dict]:
+    """The forum's newest limit discussions (all of them if limit is 0)."""
+    fsoup = _soup(html, "forum")
+    discussions: list[dict] = []
+    ftable = fsoup.find("table", class_=re.compile(r"forumheaderlist|discussion-list"))
+    if ftable:
+        rows = ftable.find_all("tr")[1:]
+        for row in rows[:limit] if limit > 0 else rows:
+            a = row.find("a", href=re.compile(r"/mod/forum/discuss\.php\?d=\d+"))
+            if a:
+                cells = row.find_all(["td", "th"])
+                discussions.append({
+                    "title": a.get_text(strip=True),
+                    "url": _absolute(a["href"]),
+                    "author": cells[1].get_text(strip=True) if len(cells) > 1 else None,
+                    "date": cells[-1].get_text(strip=True) if len(cells) > 2 else None,
+                })
+    if not discussions:
+        seen: set[str] = set()
+        for a in fsoup.find_all("a", href=re.compile(r"/mod/forum/discuss\.php\?d=\d+")):
+            href = a["href"]
+            if href not in seen:
+                seen.add(href)
+                discussions.append({"title": a.get_text(strip=True), "url": _absolute(href),
+                                    "author": None, "date": None})
+                if 0 < limit <= len(discussions):
+                    break
+    return discussions
+
+
+def parse_discussion(html: str, disc: dict) -> dict:
+    ds = _soup(html, "discussion")
+    author, date = disc["author"], disc["date"]
+    post = ds.find("div", class_=re.compile(r"forumpost|forum-post"))
+    content = None
+    if post:
+        cd = post.find(class_=re.compile(r"posting|post-content"))
+        content = cd.get_text(strip=True) if cd else None
+        if not author:
+            ae = post.find(class_="author") or post.find("a", href=re.compile(r"/user/"))
+            author = ae.get_text(strip=True) if ae else None
+        if not date:
+            de = post.find("time") or post.find(class_=re.compile(r"modified|date"))
+            date = de.get_text(strip=True) if de else None
+    return {"title": disc["title"], "author": author, "date": date, "url": disc["url"], "content": content}
+
+
+def discussion_error(disc: dict) -> dict:
+    return {"title": disc["title"], "author": disc.get("author"), "date": disc.get("date"),
+            "url": disc["url"], "content": "Error loading discussion."}
+
+
+def parse_activity_links(soup: BeautifulSoup) -> list[str]:
+    activity_links: list[str] = []
+    for li in soup.find_all("li", class_=re.compile(r"\bactivity\b")):
+        a = li.find("a", href=True)
+        if a:
+            href = a["href"]
+            if any(x in href for x in ACTIVITY_TYPES):
+                activity_links.append(_absolute(href))
+    return activity_links
+
+
+# Classes of the parts of an activity that change with the student's own
+# actions (completion toggles) rather than with the activity itself
+_VOLATILE_CLASSES = re.compile(r"actions|completion|accesshide")
+
+
+def activity_fingerprint(li) -> str:
+    """Digest of what the course page says about an activity: its links, name,
+    description and file details. It changes when the activity's file does."""
+    def stable(node) -> bool:
+        return not any(_VOLATILE_CLASSES.search(" ".join(p.get("class", [])))
+                       for p in [node, *node.parents] if p is not li and getattr(p, "attrs", None))
+
+    parts = [a["href"] for a in li.find_all("a", href=True) if stable(a)]
+    parts += [t.strip() for t in li.find_all(string=True) if t.strip() and stable(t)]
+    return content_digest("\n".join(parts))
+
+
+def parse_activity_fingerprints(soup: BeautifulSoup) -> dict[str, str]:
+    """activity URL -> activity_fingerprint, for the activities parse_activity_links finds."""
+    fingerprints: dict[str, str] = {}
+    for li in soup.find_all("li", class_=re.compile(r"\bactivity\b")):
+        a = li.find("a", href=True)
+        if a and any(x in a["href"] for x in ACTIVITY_TYPES):
+            fingerprints[_absolute(a["href"])] = activity_fingerprint(li)
+    return fingerprints
+
+
+# Where an activity page's file can come from, tried in this order
+SOURCE_ORDER = ("direct", "flexpaper", "iframe", "object")
+_FILE_EXTENSIONS = (".pdf", ".ppt", ".pptx", ".docx")
+_FLEXPAPER_PDF = re.compile(r"PDFFile\s*:\s*'([^']+)'")
+
+
+def _classify_download(tag) -> tuple[str, str] | None:
+    if tag.name == "a":
+        href = tag.get("href")
+        if href and ("pluginfile.php" in href or href.endswith(_FILE_EXTENSIONS)):
+            return _absolute(href), "direct"
+    elif tag.get("id") == "presentationobject":
+        url = tag.get("src" if tag.name == "iframe" else "data")
+        if url:
+            return url, tag.name
+    return None
+
+
+def parse_download_candidates(html: str) -> list[tuple[str, str]]:
+    """Candidate (file URL, source type) pairs from an activity page, in the order to try them.
+
+    Each link on the page is classified once; a URL offered several ways is
+    listed once, under its best source.
+    """
+    soup = _soup(html, "activity")
+    found = [c for tag in soup.find_all(["a", "iframe", "object"]) if (c := _classify_download(tag))]
+    if "PDFFile" in html:
+        found += [(url, "flexpaper") for url in _FLEXPAPER_PDF.findall(html)]
+    found.sort(key=lambda c: SOURCE_ORDER.index(c[1]))
+    seen: set[str] = set()
+    return [c for c in found if not (c[0] in seen or seen.add(c[0]))]
+
+
+def module_type(activity_url: str) -> str:
+    """'mod/resource' for .../mod/resource/view.php?id=1."""
+    m = re.search(r"/(mod/[^/]+)/", activity_url)
+    return m.group(1) if m else ""
 
 
+def prefer_source(candidates: list[tuple[str, str]], source: str | None) -> list[tuple[str, str]]:
+    """candidates with those of the given source type moved to the front."""
+    return sorted(candidates, key=lambda c: c[1] != source) if source else candidates
+
+
+def in_order(results) -> list:
+    """Collect (index, item) pairs from a fan-out back into their original order."""
+    return [item for _, item in sorted(results, key=lambda r: r[0])]
+
+
+def download_filename(url: str) -> str:
+    filename = unquote(url.split("/")[-1])
+    if "?" in filename:
+        filename = filename.split("?")[0]
+    return filename
+
+
+def unchanged_result(rec: dict, folder: str) -> dict:
+    """The per-file result for an activity skipped because the manifest shows it synced."""
+    return {"filename": rec["name"], "size_bytes": os.path.getsize(os.path.join(folder, rec["name"])),
+            "status": "skipped", "source": rec["source"]}
+
+
+class CoursePage:
+    """A fetched course page. The soup is only built when a parser needs it."""
+
+    def __init__(self, html: str):
+        self.html = html
+        self.digest = page_digest(html)
+        self._soup: BeautifulSoup | None = None
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        if self._soup is None:
+            self._soup = _soup(self.html, "course")
+        return self._soup
+
+    def name(self) -> str:
+        """The course name, from the soup if it is built, else from the title alone."""
+        return extract_course_name(self._soup or _soup(self.html, "course_name"))
+
+
+# ---------------------------------------------------------------------------
+# Synchronous client
+# ---------------------------------------------------------------------------
+
 class MydyClient:
     """Synchronous HTTP client for the MyDy LMS."""
 
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, max_workers: int = MAX_WORKERS, limiter: RateLimiter | None = None,
+                 http_cache: bool = HTTP_CACHE_ENABLED, course_workers: int = COURSE_WORKERS,
+                 download_workers: int = DOWNLOAD_WORKERS):
+        self.session = CachingSession() if http_cache else requests.Session()
         self.logged_in = False
+        self.max_workers = max(1, max_workers)
+        self.course_workers = max(1, course_workers)
+        self.download_workers = max(1, download_workers)
+        self.limiter = limiter or shared_limiter()
+        # Fetched course pages, shared by content/assignments/announcements/download
+        self.page_cache = TTLCache()
+        # Parser output keyed by page content, so unchanged pages are never re-parsed
+        self.results = ResultCache(PARSER_VERSION, HTTP_CACHE_DIR if http_cache else None)
+        # course id -> assignment/forum/discussion URLs seen, for invalidate()
+        self._course_urls: dict[str, set[str]] = {}
+        # activity module type -> the download source that last worked for it
+        self._strategies: dict[str, str] = {}
+        # Keep one pooled connection per worker so parallel fetches don't
+        # fall back to opening (and discarding) fresh connections.
+        in_flight = self.course_workers + self.max_workers + self.download_workers
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, in_flight))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     # -- helpers -----------------------------------------------------------
 
     def _rate_limit(self, operation_type: str = "general") -> None:
-        if operation_type == "download":
-            delay = random.uniform(MIN_DELAY + DOWNLOAD_DELAY, MAX_DELAY + DOWNLOAD_DELAY)
-        else:
-            delay = random.uniform(MIN_DELAY, MAX_DELAY)
-        time.sleep(delay)
-
-    @staticmethod
-    def _sanitize_folder_name(name: str) -> str:
-        return re.sub(r'[<>:"/\\|?*]', "_", name).strip()
-
-    @staticmethod
-    def _extract_course_name(soup: BeautifulSoup) -> str:
-        title_tag = soup.find("title")
-        if title_tag:
-            title_text = title_tag.get_text()
-            if "Course:" in title_text:
-                return title_text.split("Course:", 1)[1].strip()
-            return title_text.strip()
-        return "Unknown Course"
-
-    def _fetch_course_page(self, course_id: str) -> tuple[BeautifulSoup, str] | str:
-        self._rate_limit("course")
+        self.limiter.acquire(operation_type)
+
+    def rate_limit_stats(self) -> dict:
+        return self.limiter.stats()
+
+    def _fan_out(self, func: Callable, items: list) -> Iterator[tuple[int, object]]:
+        """Run func over items on a bounded pool, yielding (index, result) as each completes."""
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            futures = {pool.submit(func, item): i for i, item in enumerate(items)}
+            for fut in as_completed(futures):
+                yield futures[fut], fut.result()
+
+    def _parsed(self, kind: str, source: "str | CoursePage", parse: Callable[[], object],
+                course_id: str | None = None):
+        digest = source.digest if isinstance(source, CoursePage) else page_digest(source)
+        return self.results.get(kind, digest, parse, course_id)
+
+    def _remember_urls(self, course_id: str, urls) -> None:
+        self._course_urls.setdefault(course_id, set()).update(urls)
+
+    def invalidate(self, course_id: str | None = None) -> None:
+        """Forget cached pages and parsed results so the next call refetches them.
+
+        With course_id only that course's pages (course, grades, assignments,
+        forum, discussions) are dropped; without it everything is.
+        """
+        caching = isinstance(self.session, CachingSession)
+        if course_id is None:
+            self._forget_pages()
+            if caching:
+                self.session.clear_cache()
+            return
+        urls = self._course_urls.pop(course_id, set()) | {
+            f"{RAIT_URL}/course/view.php?id={course_id}",
+            f"{RAIT_URL}/grade/report/user/index.php?id={course_id}",
+        }
+        self.page_cache.discard(lambda url: url in urls)
+        self.results.invalidate(course_id)
+        if caching:
+            self.session.forget(urls)
+
+    def _forget_pages(self) -> None:
+        """Drop the in-memory pages and results; the disk cache is per user already."""
+        self.page_cache.clear()
+        self.results.invalidate()
+        self._course_urls.clear()
+
+    def _fetch_course_page(self, course_id: str) -> CoursePage | str:
         url = f"{RAIT_URL}/course/view.php?id={course_id}"
+        cached = self.page_cache.get(url)
+        if cached:
+            return cached
+        self._rate_limit("course")
         try:
             resp = self.session.get(url)
             if resp.status_code != 200:
                 return f"Error: Course page returned status {resp.status_code}"
             if "login" in resp.url and "course" not in resp.url:
                 return "Error: Session expired. Please login again."
-            soup = BeautifulSoup(resp.text, "html.parser")
-            return (soup, self._extract_course_name(soup))
+            page = CoursePage(resp.text)
+            self.page_cache.set(url, page)
+            return page
         except requests.RequestException as e:
             return f"Network error: {e}"
 
-    @staticmethod
-    def _get_activity_name(element) -> str:
-        name_span = element.find("span", class_="instancename")
-        if name_span:
-            # Clone to avoid mutating the tree
-            import copy
-            clone = copy.copy(name_span)
-            for hidden in clone.find_all("span", class_="accesshide"):
-                hidden.decompose()
-            return clone.get_text(strip=True)
-        # Fallback: get just the first <a> direct text, not nested notification text
-        a_tag = element.find("a", href=True)
-        if a_tag:
-            # Try to get only the direct text of the link, not child elements
-            direct_text = a_tag.find(string=True, recursive=False)
-            if direct_text and direct_text.strip():
-                return direct_text.strip()
-            return a_tag.get_text(strip=True)
-        return ""
-
     # -- login -------------------------------------------------------------
 
     def login(self, username: str = "", password: str = "") -> dict:
@@ -101,44 +709,33 @@ class MydyClient:
                 payload = {"username": username, "wantsurl": "", "next": "Next"}
                 step1 = self.session.post(f"{BASE_URL}/index.php", data=payload)
                 if "rait/login/index.php" in step1.url and "uname=" in step1.url:
-                    moodle_resp = self.session.get(step1.url)
-                    login_soup = BeautifulSoup(moodle_resp.text, "html.parser")
+                    login_html = self.session.get(step1.url).text
                 else:
                     direct = f"{RAIT_URL}/login/index.php?uname={username}&wantsurl="
-                    moodle_resp = self.session.get(direct)
-                    login_soup = BeautifulSoup(moodle_resp.text, "html.parser")
+                    login_html = self.session.get(direct).text
             else:
-                login_soup = BeautifulSoup(initial_resp.text, "html.parser")
+                login_html = initial_resp.text
 
-            if not login_soup.find("input", {"name": "password"}):
+            form = parse_login_form(login_html)
+            if form is None:
                 self.logged_in = False
                 return {"success": False, "message": "Could not find login form. LMS may be down."}
-
-            login_payload: dict[str, str] = {}
-            for inp in login_soup.find_all("input", {"type": "hidden"}):
-                name = inp.get("name")
-                if name:
-                    login_payload[name] = inp.get("value", "")
+            login_payload, action = form
             login_payload["password"] = password
 
-            form = login_soup.find("form")
-            action = form["action"] if form and form.get("action") else f"{RAIT_URL}/login/index.php"
-            if not action.startswith("http"):
-                action = f"{RAIT_URL}/login/" + action.lstrip("/")
-
             resp = self.session.post(action, data=login_payload)
-            text_lower = resp.text.lower()
+            ok = login_succeeded(resp.text, resp.url)
 
-            has_login = BeautifulSoup(resp.text, "html.parser").find("input", {"name": "password"}) is not None
-            has_error = any(x in text_lower for x in ["invalid login", "login failed", "incorrect"])
-            has_success = any(x in text_lower for x in ["dashboard", "logout", "profile"])
-
-            if has_login or has_error:
+            if ok is False:
                 self.logged_in = False
                 return {"success": False, "message": "Login failed. Check credentials."}
 
-            if has_success or ("rait" in resp.url and "login" not in resp.url):
+            if ok:
                 self.logged_in = True
+                # another account's course pages must not be served from memory
+                self._forget_pages()
+                if isinstance(self.session, CachingSession):
+                    self.session.set_namespace(username)
                 masked = username[:2] + "****" + username[-2:] if len(username) > 4 else "****"
                 return {"success": True, "message": f"Logged in as {masked}", "masked_user": masked}
 
@@ -159,33 +756,7 @@ class MydyClient:
             resp = self.session.get(f"{RAIT_URL}/my/")
             if resp.status_code != 200:
                 return f"Dashboard returned status {resp.status_code}"
-
-            soup = BeautifulSoup(resp.text, "html.parser")
-            courses: list[dict] = []
-            seen: set[str] = set()
-
-            def _add_links(container):
-                for link in container.find_all("a", href=re.compile(r"/course/view\.php\?id=\d+")):
-                    href = link.get("href", "")
-                    m = re.search(r"id=(\d+)", href)
-                    if m:
-                        cid = m.group(1)
-                        if cid not in seen:
-                            name = link.get_text(strip=True)
-                            if name and len(name) > 2:
-                                seen.add(cid)
-                                full = href if href.startswith("http") else BASE_URL + href
-                                courses.append({"id": cid, "name": name, "url": full})
-
-            block = soup.find("div", {"id": re.compile(r".*stu_previousclasses.*")})
-            if block:
-                _add_links(block)
-            for nav in soup.find_all("div", class_=re.compile(r"block.*navigation|block.*tree|block.*university")):
-                _add_links(nav)
-            if not courses:
-                _add_links(soup)
-
-            courses.sort(key=lambda c: int(c["id"]), reverse=True)
+            courses = self._parsed("courses", resp.text, lambda: parse_courses(resp.text))
             return courses if courses else "No courses found."
         except requests.RequestException as e:
             return f"Network error: {e}"
@@ -202,153 +773,71 @@ class MydyClient:
                 return f"Attendance returned status {resp.status_code}"
         except requests.RequestException as e:
             return f"Network error: {e}"
-
-        soup = BeautifulSoup(resp.text, "html.parser")
-        batch, semester = None, None
-        for div in soup.find_all("div", style=re.compile(r"float")):
-            text = div.get_text(strip=True)
-            if re.match(r"^[A-Z]+-\d+-", text):
-                batch = text
-            elif "Semester" in text:
-                semester = text
-
-        table = soup.find("table", class_="generaltable")
-        subjects: list[dict] = []
-        if table:
-            for row in table.find_all("tr"):
-                cells = row.find_all("td")
-                if len(cells) < 5:
-                    continue
-                t = [c.get_text(strip=True) for c in cells]
-                subjects.append({
-                    "subject": t[0],
-                    "total_classes": int(t[1]) if t[1].isdigit() else t[1],
-                    "present": int(t[2]) if t[2].isdigit() else t[2],
-                    "absent": int(t[3]) if t[3].isdigit() else t[3],
-                    "percentage": float(t[4]) if t[4].replace(".", "", 1).isdigit() else t[4],
-                })
-        return {"batch": batch, "semester": semester, "subjects": subjects}
+        return self._parsed("attendance", resp.text, lambda: parse_attendance(resp.text))
 
     # -- course content ----------------------------------------------------
 
     def get_course_content(self, course_id: str) -> list[dict] | str:
         if not self.logged_in:
             return "Not logged in."
-        result = self._fetch_course_page(course_id)
-        if isinstance(result, str):
-            return result
-        soup, _ = result
-
-        sections: list[dict] = []
-        section_els = soup.find_all("li", class_=re.compile(r"\bsection\b"))
-        if not section_els:
-            section_els = soup.find_all("div", class_=re.compile(r"\bsection\b"))
-
-        for sec in section_els:
-            sid = sec.get("id", "")
-            m = re.search(r"section-(\d+)", sid)
-            num = int(m.group(1)) if m else None
-            name_el = sec.find(class_="sectionname") or sec.find(["h3", "h4"])
-            name = name_el.get_text(strip=True) if name_el else f"Section {num}"
-
-            activities: list[dict] = []
-            for act in sec.find_all("li", class_=re.compile(r"\bactivity\b")):
-                cls = " ".join(act.get("class", []))
-                tm = re.search(r"modtype_(\w+)", cls)
-                atype = tm.group(1) if tm else "unknown"
-                aname = self._get_activity_name(act)
-                a_tag = act.find("a", href=True)
-                if not a_tag:
-                    continue
-                href = a_tag["href"]
-                url = href if href.startswith("http") else BASE_URL + href
-                activities.append({"name": aname, "type": atype, "url": url})
-
-            sections.append({"section_number": num, "section_name": name, "activities": activities})
-
-        if not sections:
-            all_acts: list[dict] = []
-            for act in soup.find_all("li", class_=re.compile(r"\bactivity\b")):
-                cls = " ".join(act.get("class", []))
-                tm = re.search(r"modtype_(\w+)", cls)
-                atype = tm.group(1) if tm else "unknown"
-                aname = self._get_activity_name(act)
-                a_tag = act.find("a", href=True)
-                if not a_tag:
-                    continue
-                href = a_tag["href"]
-                url = href if href.startswith("http") else BASE_URL + href
-                all_acts.append({"name": aname, "type": atype, "url": url})
-            if all_acts:
-                sections = [{"section_number": 0, "section_name": "All Activities", "activities": all_acts}]
-        return sections
+        page = self._fetch_course_page(course_id)
+        if isinstance(page, str):
+            return page
+        return self._parsed("course_content", page, lambda: parse_course_content(page.soup), course_id)
 
     # -- assignments -------------------------------------------------------
 
-    def get_assignments(self, course_id: str) -> list[dict] | str:
+    def _fetch_assignment(self, asgn: dict) -> dict:
+        self._rate_limit("activity")
+        try:
+            resp = self.session.get(asgn["url"])
+            return parse_assignment(resp.text, asgn)
+        except requests.RequestException as e:
+            return assignment_error(asgn, e)
+
+    def iter_assignments(self, course_id: str) -> Iterator[tuple[int, dict]] | str:
+        """Fetch assignment pages concurrently, yielding (index, assignment) as each arrives.
+
+        Returns an error string instead if the course page cannot be loaded.
+        """
         if not self.logged_in:
             return "Not logged in."
-        result = self._fetch_course_page(course_id)
-        if isinstance(result, str):
-            return result
-        soup, _ = result
-
-        # Only search within the course content area to avoid nav sidebar links
-        content_area = soup.find("div", class_="course-content") or soup.find("div", id="region-main") or soup
-
-        links: list[dict] = []
-        for li in content_area.find_all("li", class_=re.compile(r"modtype_assign")):
-            a = li.find("a", href=True)
-            if a and "/mod/assign/view.php" in a["href"]:
-                name = self._get_activity_name(li)
-                href = a["href"]
-                url = href if href.startswith("http") else BASE_URL + href
-                links.append({"name": name, "url": url})
-
-        if not links:
-            seen: set[str] = set()
-            for a in content_area.find_all("a", href=re.compile(r"/mod/assign/view\.php\?id=\d+")):
-                href = a["href"]
-                if href not in seen:
-                    seen.add(href)
-                    url = href if href.startswith("http") else BASE_URL + href
-                    links.append({"name": a.get_text(strip=True), "url": url})
-
-        assignments: list[dict] = []
-        for asgn in links:
-            self._rate_limit("activity")
-            try:
-                resp = self.session.get(asgn["url"])
-                asoup = BeautifulSoup(resp.text, "html.parser")
-                # Get clean name from the page heading
-                h2 = asoup.find("h2")
-                clean_name = h2.get_text(strip=True) if h2 else asgn["name"]
-                info: dict = {"name": clean_name, "url": asgn["url"]}
-                table = asoup.find("table", class_="submissionstatustable") or asoup.find("table", class_="generaltable")
-                if table:
-                    for row in table.find_all("tr"):
-                        cells = row.find_all(["td", "th"])
-                        if len(cells) >= 2:
-                            label = cells[0].get_text(strip=True).lower()
-                            value = cells[1].get_text(strip=True)
-                            if "due date" in label:
-                                info["due_date"] = value
-                            elif "submission status" in label:
-                                info["submission_status"] = value
-                            elif "grading status" in label:
-                                info["grading_status"] = value
-                            elif "grade" in label and "grading" not in label:
-                                info["grade"] = value
-                            elif "time remaining" in label:
-                                info["time_remaining"] = value
-                for f in ("due_date", "submission_status", "grading_status", "grade", "time_remaining"):
-                    info.setdefault(f, None)
-                assignments.append(info)
-            except requests.RequestException as e:
-                assignments.append({"name": asgn["name"], "url": asgn["url"], "error": str(e),
-                                    "due_date": None, "submission_status": None,
-                                    "grading_status": None, "grade": None, "time_remaining": None})
-        return assignments
+        page = self._fetch_course_page(course_id)
+        if isinstance(page, str):
+            return page
+        links = self._parsed("assignment_links", page, lambda: parse_assignment_links(page.soup), course_id)
+        self._remember_urls(course_id, (a["url"] for a in links))
+        return self._fan_out(self._fetch_assignment, links)
+
+    def get_assignments(self, course_id: str) -> list[dict] | str:
+        results = self.iter_assignments(course_id)
+        if isinstance(results, str):
+            return results
+        return in_order(results)
+
+    def get_assignments_bulk(self, course_ids: list[str]) -> dict[str, list[dict] | str]:
+        """Assignments for several courses: course id -> list, or an error string.
+
+        Course pages are fetched concurrently, then every course's assignment
+        pages go through one shared pool, so a course with many assignments
+        doesn't hold up the rest.
+        """
+        if not self.logged_in:
+            return {cid: "Not logged in." for cid in course_ids}
+        pages = dict(zip(course_ids, in_order(self._fan_out(self._fetch_course_page, course_ids))))
+        results: dict[str, list[dict] | str] = {}
+        jobs: list[tuple[str, dict]] = []
+        for cid, page in pages.items():
+            if isinstance(page, str):
+                results[cid] = page
+                continue
+            links = self._parsed("assignment_links", page, lambda: parse_assignment_links(page.soup), cid)
+            self._remember_urls(cid, (a["url"] for a in links))
+            results[cid] = []
+            jobs.extend((cid, a) for a in links)
+        for (cid, _), info in zip(jobs, in_order(self._fan_out(lambda job: self._fetch_assignment(job[1]), jobs))):
+            results[cid].append(info)
+        return {cid: results[cid] for cid in course_ids}
 
     # -- grades ------------------------------------------------------------
 
@@ -362,281 +851,284 @@ class MydyClient:
                 return f"Grade page returned status {resp.status_code}"
         except requests.RequestException as e:
             return f"Network error: {e}"
+        return self._parsed("grades", resp.text, lambda: parse_grades(resp.text), course_id)
 
-        soup = BeautifulSoup(resp.text, "html.parser")
-        course_name = self._extract_course_name(soup)
-
-        err = soup.find("div", class_="errorbox") or soup.find("div", class_=re.compile(r"alert-danger"))
-        if err:
-            return f"Error: {err.get_text(strip=True)}"
-
-        table = (
-            soup.find("table", class_=re.compile(r"user-grade"))
-            or soup.find("table", id="user-grade")
-            or soup.find("table", class_="generaltable")
-        )
-        if not table:
-            return {"course_name": course_name, "grade_items": [], "course_total": None}
-
-        headers: list[str] = []
-        header_row = table.find("tr")
-        if header_row:
-            headers = [th.get_text(strip=True).lower() for th in header_row.find_all(["th", "td"])]
-
-        col: dict[str, int] = {}
-        for i, h in enumerate(headers):
-            if "grade item" in h or ("item" in h and "name" not in col):
-                col["name"] = i
-            elif h == "grade" or ("grade" in h and "item" not in h and "grade" not in col):
-                col["grade"] = i
-            elif "range" in h:
-                col["range"] = i
-            elif "percentage" in h:
-                col["percentage"] = i
-            elif "feedback" in h:
-                col["feedback"] = i
-
-        def _cell(cells, key):
-            idx = col.get(key)
-            return cells[idx].get_text(strip=True) if idx is not None and idx < len(cells) else None
-
-        items: list[dict] = []
-        course_total = None
-        for row in table.find_all("tr")[1:]:
-            cells = row.find_all(["td", "th"])
-            if not cells:
-                continue
-            item = {
-                "name": _cell(cells, "name") or cells[0].get_text(strip=True),
-                "grade": _cell(cells, "grade"),
-                "range": _cell(cells, "range"),
-                "percentage": _cell(cells, "percentage"),
-                "feedback": _cell(cells, "feedback"),
-            }
-            if "course total" in (item["name"] or "").lower():
-                course_total = {k: v for k, v in item.items() if k != "name"}
-            else:
-                rc = " ".join(row.get("class", []))
-                if "category" in rc and not item.get("grade"):
-                    continue
-                items.append(item)
-
-        return {"course_name": course_name, "grade_items": items, "course_total": course_total}
+    def get_grades_bulk(self, course_ids: list[str]) -> dict[str, dict | str]:
+        """Grade reports for several courses, fetched concurrently: course id -> report or error string."""
+        return dict(zip(course_ids, in_order(self._fan_out(self.get_grades, course_ids))))
 
     # -- announcements -----------------------------------------------------
 
-    def get_announcements(self, course_id: str, limit: int = 10) -> list[dict] | str:
+    def _fetch_discussion(self, disc: dict) -> dict:
+        self._rate_limit("activity")
+        try:
+            dr = self.session.get(disc["url"])
+            return parse_discussion(dr.text, disc)
+        except requests.RequestException:
+            return discussion_error(disc)
+
+    def iter_announcements(self, course_id: str, limit: int = 10,
+                           offset: int = 0) -> Iterator[tuple[int, dict]] | str:
+        """Fetch up to limit discussions (0 = all) after the newest offset ones
+        concurrently, yielding (index, announcement) as each arrives.
+
+        Returns an error string instead if the course page or forum cannot be loaded.
+        """
         if not self.logged_in:
             return "Not logged in."
-        result = self._fetch_course_page(course_id)
-        if isinstance(result, str):
-            return result
-        soup, _ = result
-
-        forum_url = None
-        for li in soup.find_all("li", class_=re.compile(r"modtype_forum")):
-            a = li.find("a", href=True)
-            if a and "announcement" in a.get_text(strip=True).lower():
-                href = a["href"]
-                forum_url = href if href.startswith("http") else BASE_URL + href
-                break
-        if not forum_url:
-            for a in soup.find_all("a", href=re.compile(r"/mod/forum/view\.php\?id=\d+")):
-                href = a["href"]
-                forum_url = href if href.startswith("http") else BASE_URL + href
-                break
+        page = self._fetch_course_page(course_id)
+        if isinstance(page, str):
+            return page
+
+        forum_url = self._parsed("forum_url", page, lambda: parse_forum_url(page.soup), course_id)
         if not forum_url:
             return "No announcements forum found."
 
         self._rate_limit("activity")
         try:
             freq = self.session.get(forum_url)
-            fsoup = BeautifulSoup(freq.text, "html.parser")
         except requests.RequestException as e:
             return f"Error loading forum: {e}"
 
-        discussions: list[dict] = []
-        ftable = fsoup.find("table", class_=re.compile(r"forumheaderlist|discussion-list"))
-        if ftable:
-            for row in ftable.find_all("tr")[1:][:limit]:
-                a = row.find("a", href=re.compile(r"/mod/forum/discuss\.php\?d=\d+"))
-                if a:
-                    cells = row.find_all(["td", "th"])
-                    href = a["href"]
-                    durl = href if href.startswith("http") else BASE_URL + href
-                    discussions.append({
-                        "title": a.get_text(strip=True),
-                        "url": durl,
-                        "author": cells[1].get_text(strip=True) if len(cells) > 1 else None,
-                        "date": cells[-1].get_text(strip=True) if len(cells) > 2 else None,
-                    })
-        if not discussions:
-            seen: set[str] = set()
-            for a in fsoup.find_all("a", href=re.compile(r"/mod/forum/discuss\.php\?d=\d+")):
-                href = a["href"]
-                if href not in seen:
-                    seen.add(href)
-                    durl = href if href.startswith("http") else BASE_URL + href
-                    discussions.append({"title": a.get_text(strip=True), "url": durl, "author": None, "date": None})
-                    if len(discussions) >= limit:
-                        break
-
-        results: list[dict] = []
-        for disc in discussions:
-            self._rate_limit("activity")
-            try:
-                dr = self.session.get(disc["url"])
-                ds = BeautifulSoup(dr.text, "html.parser")
-                post = ds.find("div", class_=re.compile(r"forumpost|forum-post"))
-                content = None
-                if post:
-                    cd = post.find(class_=re.compile(r"posting|post-content"))
-                    content = cd.get_text(strip=True) if cd else None
-                    if not disc["author"]:
-                        ae = post.find(class_="author") or post.find("a", href=re.compile(r"/user/"))
-                        disc["author"] = ae.get_text(strip=True) if ae else None
-                    if not disc["date"]:
-                        de = post.find("time") or post.find(class_=re.compile(r"modified|date"))
-                        disc["date"] = de.get_text(strip=True) if de else None
-                results.append({
-                    "title": disc["title"], "author": disc["author"],
-                    "date": disc["date"], "url": disc["url"], "content": content,
-                })
-            except requests.RequestException:
-                results.append({
-                    "title": disc["title"], "author": disc.get("author"),
-                    "date": disc.get("date"), "url": disc["url"],
-                    "content": "Error loading discussion.",
-                })
-        return results
+        count = offset + limit if limit > 0 else 0
+        discussions = self._parsed(f"discussions-{count}", freq.text,
+                                   lambda: parse_discussions(freq.text, count), course_id)
+        self._remember_urls(course_id, [forum_url] + [d["url"] for d in discussions])
+        return self._fan_out(self._fetch_discussion, discussions[offset:])
 
-    # -- download ----------------------------------------------------------
+    def get_announcements(self, course_id: str, limit: int = 10, offset: int = 0) -> list[dict] | str:
+        results = self.iter_announcements(course_id, limit, offset)
+        if isinstance(results, str):
+            return results
+        return in_order(results)
 
-    def download_course_materials(self, course: dict, base_dir: str = ".",
-                                  progress_callback=None) -> dict:
+    def get_discussion(self, url: str) -> dict | str:
+        """One forum discussion's first post, by its discuss.php URL."""
         if not self.logged_in:
-            return {"error": "Not logged in."}
-        self._rate_limit("course")
+            return "Not logged in."
+        self._rate_limit("activity")
         try:
-            resp = self.session.get(course["url"])
-            soup = BeautifulSoup(resp.text, "html.parser")
+            resp = self.session.get(url)
+            if resp.status_code != 200:
+                return f"Discussion returned status {resp.status_code}"
         except requests.RequestException as e:
-            return {"course_name": course["name"], "downloaded": 0, "failed": 0, "error": str(e)}
-
-        course_name = self._extract_course_name(soup)
-        folder = os.path.join(base_dir, self._sanitize_folder_name(course_name))
-        os.makedirs(folder, exist_ok=True)
+            return f"Network error: {e}"
+        return parse_discussion(resp.text, {"title": None, "url": url, "author": None, "date": None})
 
-        activity_types = [
-            "/mod/resource/view.php", "/mod/flexpaper/view.php",
-            "/mod/presentation/view.php", "/mod/casestudy/view.php",
-            "/mod/dyquestion/view.php",
-        ]
-        activity_links: list[str] = []
-        for li in soup.find_all("li", class_=re.compile(r"\bactivity\b")):
-            a = li.find("a", href=True)
-            if a:
-                href = a["href"]
-                if any(x in href for x in activity_types):
-                    activity_links.append(href if href.startswith("http") else BASE_URL + href)
+    # -- download ----------------------------------------------------------
 
-        downloaded: list[dict] = []
-        failed: list[str] = []
+    def download_course_materials(self, course: dict, base_dir: str = ".",
+                                  progress_callback=None, full: bool = False) -> dict:
+        """Sync a course's files into base_dir/<course name>.
 
-        for i, aurl in enumerate(activity_links):
-            if progress_callback:
-                progress_callback("activity", {"index": i + 1, "total": len(activity_links), "url": aurl})
-            result = self._try_download_methods(aurl, folder, progress_callback)
+        Activities whose file the folder's manifest says is already on disk
+        and unchanged are not revisited; full=True opens every activity page
+        again and re-checks each file with the server.
+        """
+        if not self.logged_in:
+            return {"error": "Not logged in."}
+        return self.download_courses([course], base_dir, progress_callback, full)[0]
+
+    def download_courses(self, courses: list[dict], base_dir: str = ".",
+                         progress_callback=None, full: bool = False,
+                         cancel: threading.Event | None = None) -> list[dict]:
+        """Sync several courses at once, returning a summary per course in order.
+
+        The work runs as a three-stage pipeline, each stage on its own bounded
+        pool: course pages (course_workers), activity pages (max_workers) and
+        file transfers (download_workers). Files from the first course stream
+        while later course pages are still being fetched, and the shared
+        limiter keeps the combined request rate polite.
+
+        Callbacks fire from this thread, tagged with "course_id":
+        "course" once a course's activities are known, then "activity" and
+        "file_done" per activity, and "course_done" with its summary. While
+        files stream, "bytes" events (see downloads.BatchProgress) report
+        each transfer (scope "file") and the whole batch (scope "batch")
+        every PROGRESS_INTERVAL seconds.
+
+        Setting cancel stops the sync: work not yet started is dropped and
+        files already streaming are finished. Each interrupted course's
+        summary counts the activities it never got to under "cancelled".
+        """
+        if not self.logged_in:
+            return [{"course_name": c["name"], "downloaded": 0, "failed": 0, "error": "Not logged in."}
+                    for c in courses]
+        notify = progress_callback or (lambda event, data: None)
+        syncs = [{"course": c, "links": [], "results": [], "done": 0, "unchanged": 0} for c in courses]
+        summaries: list[dict | None] = [None] * len(courses)
+        batch = BatchProgress(lambda data: notify("bytes", data))
+        cancelled = cancel.is_set if cancel is not None else lambda: False
+
+        def finish_activity(ci: int, ai: int, result: dict | None) -> None:
+            batch.finish((ci, ai))
+            sync = syncs[ci]
+            sync["results"][ai] = result
+            sync["done"] += 1
+            cid = sync["course"]["id"]
+            notify("activity", {"course_id": cid, "index": sync["done"],
+                                "total": len(sync["links"]), "url": sync["links"][ai]})
             if result:
-                downloaded.append(result)
+                notify("file_done", {**result, "course_id": cid})
+            if sync["done"] == len(sync["links"]):
+                finish_course(ci)
+
+        def finish_course(ci: int) -> None:
+            sync = syncs[ci]
+            results = sync["results"]
+            downloaded = [r for r in results if r]
+            summaries[ci] = {
+                "course_name": sync["name"],
+                "folder": sync["folder"],
+                "activities_found": len(results),
+                "activities_unchanged": sync["unchanged"],
+                "downloaded": len(downloaded),
+                "failed": sync["done"] - len(downloaded),
+                "files": downloaded,
+            }
+            if sync["done"] < len(results):
+                summaries[ci]["cancelled"] = len(results) - sync["done"]
+            notify("course_done", {**summaries[ci], "course_id": sync["course"]["id"]})
+
+        with ThreadPoolExecutor(min(self.course_workers, max(1, len(courses)))) as pages, \
+                ThreadPoolExecutor(self.max_workers) as activities, \
+                ThreadPoolExecutor(self.download_workers) as transfers:
+            # future -> (stage, course index, activity index)
+            pending = {pages.submit(self._resolve_course, c, base_dir): ("course", ci, None)
+                       for ci, c in enumerate(courses)}
+            while pending:
+                if cancelled():
+                    for fut in [f for f in pending if f.cancel()]:
+                        del pending[fut]
+                    if not pending:
+                        break
+                polled = progress_callback or cancel is not None
+                finished, _ = wait(pending, timeout=PROGRESS_INTERVAL if polled else None,
+                                   return_when=FIRST_COMPLETED)
                 if progress_callback:
-                    progress_callback("file_done", result)
-            else:
-                failed.append(aurl)
-
-        return {
-            "course_name": course_name,
-            "folder": folder,
-            "activities_found": len(activity_links),
-            "downloaded": len(downloaded),
-            "failed": len(failed),
-            "files": downloaded,
-        }
+                    batch.flush(queued=sum(len(sync["links"]) - sync["done"] for sync in syncs) - batch.active)
+                for fut in finished:
+                    stage, ci, ai = pending.pop(fut)
+                    sync = syncs[ci]
+                    if stage == "course":
+                        resolved = fut.result()
+                        if isinstance(resolved, str):
+                            c = sync["course"]
+                            summaries[ci] = {"course_name": c["name"], "downloaded": 0, "failed": 0,
+                                             "error": resolved}
+                            notify("course_done", {**summaries[ci], "course_id": c["id"]})
+                            continue
+                        sync["name"], sync["folder"], sync["links"], sync["fingerprints"] = resolved
+                        sync["results"] = [None] * len(sync["links"])
+                        manifest = manifest_for(sync["folder"])
+                        prints = sync["fingerprints"]
+                        synced = {} if full else {i: rec for i, aurl in enumerate(sync["links"])
+                                                  if (rec := manifest.synced_activity(aurl, prints.get(aurl)))}
+                        sync["unchanged"] = len(synced)
+                        notify("course", {"course_id": sync["course"]["id"], "course_name": sync["name"],
+                                          "folder": sync["folder"], "activities": len(sync["links"]),
+                                          "unchanged": len(synced)})
+                        if not sync["links"]:
+                            finish_course(ci)
+                        for i, rec in synced.items():
+                            finish_activity(ci, i, unchanged_result(rec, sync["folder"]))
+                        if cancelled():
+                            continue
+                        for i, aurl in enumerate(sync["links"]):
+                            if i not in synced:
+                                pending[activities.submit(self._download_candidates, aurl)] = ("activity", ci, i)
+                    elif stage == "activity":
+                        candidates = fut.result()
+                        if cancelled():
+                            continue
+                        if not candidates:
+                            finish_activity(ci, ai, None)
+                            continue
+                        track = batch.tracker((ci, ai), course_id=sync["course"]["id"]) if progress_callback else None
+                        aurl = sync["links"][ai]
+                        job = transfers.submit(self._download_first, aurl, candidates,
+                                               sync["folder"], track, sync["fingerprints"].get(aurl))
+                        pending[job] = ("file", ci, ai)
+                    else:
+                        finish_activity(ci, ai, fut.result())
+        if progress_callback:
+            batch.flush(force=True)
+        for ci, sync in enumerate(syncs):
+            if summaries[ci] is None:
+                if "name" in sync:
+                    finish_course(ci)
+                else:
+                    c = sync["course"]
+                    summaries[ci] = {"course_name": c["name"], "downloaded": 0, "failed": 0,
+                                     "error": "Cancelled."}
+                    notify("course_done", {**summaries[ci], "course_id": c["id"]})
+        return summaries
+
+    def _resolve_course(self, course: dict, base_dir: str) -> tuple[str, str, list[str], dict[str, str]] | str:
+        """Stage 1: (course name, download folder, activity URLs, their fingerprints), or an error string."""
+        page = self._fetch_course_page(course["id"])
+        if isinstance(page, str):
+            return page
+        activity_links = self._parsed("activity_links", page, lambda: parse_activity_links(page.soup), course["id"])
+        fingerprints = self._parsed("activity_fingerprints", page,
+                                    lambda: parse_activity_fingerprints(page.soup), course["id"])
+        course_name = self._parsed("course_name", page, page.name, course["id"])
+        folder = os.path.join(base_dir, sanitize_folder_name(course_name))
+        os.makedirs(folder, exist_ok=True)
+        return course_name, folder, activity_links, fingerprints
 
-    def _try_download_methods(self, activity_url: str, folder: str,
-                              progress_callback=None) -> dict | None:
+    def _download_candidates(self, activity_url: str) -> list[tuple[str, str]] | None:
+        """Stage 2: the (file URL, source) pairs an activity page offers, best first."""
         self._rate_limit("activity")
         try:
             resp = self.session.get(activity_url)
         except requests.RequestException:
             return None
-        soup = BeautifulSoup(resp.text, "html.parser")
-
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if "pluginfile.php" in href or href.endswith((".pdf", ".ppt", ".pptx", ".docx")):
-                furl = href if href.startswith("http") else BASE_URL + href
-                r = self._download_file(furl, folder, "direct", progress_callback)
-                if r:
-                    return r
-
-        for pdf_url in re.findall(r"PDFFile\s*:\s*'([^']+)'", resp.text):
-            r = self._download_file(pdf_url, folder, "flexpaper", progress_callback)
-            if r:
-                return r
-
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if href.endswith((".ppt", ".pptx")):
-                furl = href if href.startswith("http") else BASE_URL + href
-                r = self._download_file(furl, folder, "presentation", progress_callback)
-                if r:
-                    return r
-
-        iframe = soup.find("iframe", id="presentationobject")
-        if iframe and iframe.has_attr("src"):
-            r = self._download_file(iframe["src"], folder, "iframe", progress_callback)
-            if r:
-                return r
-
-        obj = soup.find("object", id="presentationobject")
-        if obj and obj.has_attr("data"):
-            r = self._download_file(obj["data"], folder, "object", progress_callback)
+        return parse_download_candidates(resp.text)
+
+    def _download_first(self, activity_url: str, candidates: list[tuple[str, str]], folder: str,
+                        progress_callback=None, fingerprint: str | None = None) -> dict | None:
+        """Stage 3: download the first candidate the server serves.
+
+        Candidates of the source type that last worked for this kind of
+        activity are tried first.
+        """
+        kind = module_type(activity_url)
+        manifest = manifest_for(folder)
+        for furl, source in prefer_source(candidates, self._strategies.get(kind)):
+            filename = manifest.claim_name(activity_url, download_filename(furl))
+            r = self._download_file(furl, folder, source, progress_callback, filename)
             if r:
+                if r["status"] != "error":
+                    self._strategies[kind] = source
+                    manifest.record_activity(activity_url, furl, source, os.path.join(folder, r["filename"]),
+                                             fingerprint)
                 return r
-
         return None
 
     def _download_file(self, url: str, folder: str, source_type: str,
-                       progress_callback=None) -> dict | None:
+                       progress_callback=None, filename: str | None = None) -> dict | None:
+        filename = filename or download_filename(url)
+
+        def report(data):
+            progress_callback("bytes", {**data, "filename": filename})
+
         try:
-            self._rate_limit("download")
-            start = time.time()
-            freq = self.session.get(url, stream=True)
-            if freq.status_code != 200:
-                return None
-
-            filename = unquote(url.split("/")[-1])
-            if "?" in filename:
-                filename = filename.split("?")[0]
-            filepath = os.path.join(folder, filename)
-            total = int(freq.headers.get("content-length", 0))
-
-            if os.path.exists(filepath) and total > 0 and os.path.getsize(filepath) == total:
-                return {"filename": filename, "size_bytes": total, "status": "skipped", "source": source_type}
-
-            dl = 0
-            with open(filepath, "wb") as f:
-                for chunk in freq.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        dl += len(chunk)
-
-            elapsed = time.time() - start
-            return {
-                "filename": filename, "size_bytes": dl,
-                "download_time": round(elapsed, 2),
-                "status": "downloaded", "source": source_type,
-            }
+            r = fetch_file(self.session, url, os.path.join(folder, filename),
+                           before_request=lambda: self._rate_limit("download"),
+                           before_head=lambda: self._rate_limit("metadata"),
+                           progress=report if progress_callback else None)
         except Exception as e:
-            return {"filename": url.split("/")[-1], "status": "error", "error": str(e)}
+            return {"filename": filename, "status": "error", "error": str(e)}
+        if r is None:
+            return None
+        if r["status"] in ("skipped", "linked"):
+            return {"filename": filename, "size_bytes": r["size_bytes"], "status": r["status"], "source": source_type}
+        result = {
+            "filename": filename, "size_bytes": r["size_bytes"],
+            "download_time": r["download_time"],
+            "status": "downloaded", "source": source_type,
+        }
+        if r["resumed_from"]:
+            result["resumed_from"] = r["resumed_from"]
+        return result
@@ -0,0 +1,578 @@
+"""
+MyDy LMS download helpers
+
+Resumable file transfers shared by MydyClient, AsyncMydyClient and the MCP
+server. Bytes are written to a "<name>.part" sidecar next to the target.
+An interrupted transfer is resumed with an HTTP Range request, guarded by
+If-Range with the validators saved when it started, and the finished file
+is atomically renamed into place. A half-written file therefore never looks
+complete, and a rerun picks up where the last one stopped.
+
+Bodies are read straight into one reused buffer with readinto, and the read
+size adapts to throughput: small reads keep slow links responsive, large
+ones keep fast links from spending their time in per-chunk Python overhead.
+
+Before any GET, a file already on disk is checked against the folder's
+manifest (see manifest.py) and, failing that, with a HEAD request. This way
+files that are already synced cost no download and no download-rate wait.
+A URL already fetched for another course is linked from the content store
+(see store.py) instead, and every finished file is added to it.
+
+Only one transfer at a time writes to a given path; others wait for it and
+then find the file already synced.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+import requests
+import urllib3
+
+from manifest import manifest_for
+from store import replace_file, store_for
+
+PART_SUFFIX = ".part"
+# Read sizes double or halve between these so each read takes about
+# CHUNK_TARGET seconds.
+MIN_CHUNK = 64 << 10
+MAX_CHUNK = 8 << 20
+CHUNK_TARGET = 0.25
+# Reserve each file's full size on disk before writing it
+PREALLOCATE = os.getenv("MYDY_PREALLOCATE", "0") == "1"
+# Reconnects per file after a dropped connection before giving up
+RESUME_ATTEMPTS = int(os.getenv("MYDY_RESUME_ATTEMPTS", "3"))
+# Seconds to wait before reconnect n, times n
+RESUME_BACKOFF = 1.0
+# Minimum seconds between "bytes" progress reports
+PROGRESS_INTERVAL = float(os.getenv("MYDY_PROGRESS_INTERVAL", "0.5"))
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
+
+
+class IncompleteDownload(IOError):
+    """The server closed the stream before sending Content-Length bytes."""
+
+
+def part_path(filepath: str) -> str:
+    return filepath + PART_SUFFIX
+
+
+def _meta_path(filepath: str) -> str:
+    return filepath + PART_SUFFIX + ".json"
+
+
+def partial_state(filepath: str) -> tuple[int, dict]:
+    """Bytes already in the .part file and the validators saved when it was started."""
+    try:
+        offset = os.path.getsize(part_path(filepath))
+    except OSError:
+        return 0, {}
+    try:
+        with open(_meta_path(filepath), encoding="utf-8") as f:
+            validators = json.load(f)
+    except (OSError, ValueError):
+        validators = {}
+    if validators.pop("preallocated", False):
+        # Still at its reserved size, so its length says nothing about progress
+        return 0, {}
+    return offset, validators
+
+
+def request_headers(offset: int, validators: dict) -> dict:
+    """Headers for a file GET: Range/If-Range to resume from offset, and no
+    compression, so sizes and offsets count the bytes written to disk."""
+    headers = {"Accept-Encoding": "identity"}
+    if not offset:
+        return headers
+    headers["Range"] = f"bytes={offset}-"
+    # Without a validator there's no way to know the file is unchanged, so
+    # only resume when the server can confirm it (otherwise it sends 200).
+    validator = validators.get("ETag") or validators.get("Last-Modified")
+    if validator:
+        headers["If-Range"] = validator
+    else:
+        headers.pop("Range")
+    return headers
+
+
+def resume_from(status: int, headers, offset: int) -> int | None:
+    """Where the response body starts in the file: offset for a matching 206,
+    0 for a full 200, None if the response can't be used."""
+    if status == 200:
+        return 0
+    if status == 206:
+        m = _CONTENT_RANGE.match(headers.get("Content-Range", ""))
+        if m and int(m.group(1)) == offset:
+            return offset
+    return None
+
+
+def encoded(headers) -> bool:
+    """Whether the body is compressed despite Accept-Encoding: identity."""
+    return headers.get("Content-Encoding", "identity").lower() not in ("", "identity")
+
+
+def expected_size(status: int, headers, start: int) -> int:
+    """Full size of the file once this response is written, or 0 if unknown."""
+    if encoded(headers):
+        return 0  # Content-Length counts compressed bytes
+    if status == 206:
+        m = _CONTENT_RANGE.match(headers.get("Content-Range", ""))
+        if m and m.group(2) != "*":
+            return int(m.group(2))
+    length = int(headers.get("Content-Length") or 0)
+    return start + length if length else 0
+
+
+def range_complete(status: int, headers, offset: int) -> bool:
+    """A 416 for a .part that already holds the whole file."""
+    if status != 416 or not offset:
+        return False
+    m = re.match(r"bytes \*/(\d+)", headers.get("Content-Range", ""))
+    return bool(m) and int(m.group(1)) == offset
+
+
+class ChunkSizer:
+    """Read size for a stream, adjusted after each read towards CHUNK_TARGET seconds per read."""
+
+    def __init__(self, size: int = MIN_CHUNK):
+        self.size = size
+        self._last = time.monotonic()
+
+    def update(self, n: int) -> None:
+        now = time.monotonic()
+        elapsed, self._last = now - self._last, now
+        if n < self.size:
+            return  # a short read says nothing about the link speed
+        if elapsed < CHUNK_TARGET / 2 and self.size < MAX_CHUNK:
+            self.size *= 2
+        elif elapsed > CHUNK_TARGET * 2 and self.size > MIN_CHUNK:
+            self.size //= 2
+
+
+class ByteMeter:
+    """Throughput and ETA for a byte stream, reported at most once per interval.
+
+    Fed the stream's position, it calls report with {"bytes" (position),
+    "total" (0 if unknown), "transferred" (bytes since start), "rate" (B/s
+    since the last report), "avg_rate" (B/s overall) and "eta" (seconds,
+    None if unknown)}.
+    """
+
+    def __init__(self, report: Callable[[dict], object], start: int = 0, total: int = 0,
+                 interval: float = PROGRESS_INTERVAL):
+        self.report = report
+        self.total = total
+        self.interval = interval
+        self._start = self._last_bytes = self.position = start
+        self._t0 = self._last_t = time.monotonic()
+
+    def update(self, position: int, force: bool = False) -> None:
+        self.position = position
+        now = time.monotonic()
+        if now - self._last_t < self.interval and not force:
+            return
+        rate = (position - self._last_bytes) / (now - self._last_t) if now > self._last_t else 0.0
+        avg_rate = (position - self._start) / (now - self._t0) if now > self._t0 else 0.0
+        eta = (self.total - position) / avg_rate if self.total and avg_rate else None
+        self._last_t, self._last_bytes = now, position
+        self.report({"bytes": position, "total": self.total, "transferred": position - self._start,
+                     "rate": rate, "avg_rate": avg_rate, "eta": eta})
+
+
+class BatchProgress:
+    """Byte progress across concurrent transfers, reported from one thread.
+
+    Transfer threads post their files' ByteMeter reports through tracker();
+    the owning thread calls flush() as often as it likes, and at most once
+    per interval it reports each file's latest numbers (scope "file") and a
+    combined one (scope "batch"). The batch ETA counts queued files at the
+    mean size of those finished so far.
+    """
+
+    def __init__(self, report: Callable[[dict], object], interval: float = PROGRESS_INTERVAL):
+        self.report = report
+        self.interval = interval
+        self._flushed = 0.0
+        self._active: dict[object, dict] = {}
+        self._sent: dict[object, dict] = {}
+        self._done_bytes = 0
+        self._done_files = 0
+        self._lock = threading.Lock()
+        self._meter = ByteMeter(lambda data: self.report({**data, "scope": "batch"}), interval=0)
+
+    def tracker(self, key, **extra) -> Callable[[str, dict], None]:
+        """A progress_callback for one transfer, tagging its reports with extra."""
+        def on_event(event: str, data: dict) -> None:
+            if event == "bytes":
+                with self._lock:
+                    self._active[key] = {**data, **extra, "scope": "file"}
+        return on_event
+
+    def finish(self, key) -> None:
+        with self._lock:
+            data = self._active.pop(key, None)
+            self._sent.pop(key, None)
+            if data:
+                self._done_bytes += data["transferred"]
+                self._done_files += 1
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def flush(self, queued: int = 0, force: bool = False) -> None:
+        """Report what changed since the last flush, at most once per interval
+        unless forced; queued is how many files have yet to start."""
+        now = time.monotonic()
+        if now - self._flushed < self.interval and not force:
+            return
+        self._flushed = now
+        with self._lock:
+            active = dict(self._active)
+            done_bytes, done_files = self._done_bytes, self._done_files
+        for key, data in active.items():
+            if self._sent.get(key) is not data:
+                self._sent[key] = data
+                self.report(data)
+        transferred = done_bytes + sum(d["transferred"] for d in active.values())
+        remaining = sum(d["total"] - d["bytes"] for d in active.values() if d["total"])
+        mean = done_bytes / done_files if done_files else 0
+        self._meter.total = transferred + remaining + int(queued * mean) if mean or not queued else 0
+        self._meter.update(transferred, force=True)
+
+
+def _reserve(f, size: int) -> None:
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except (AttributeError, OSError):
+        f.truncate(size)  # Windows allocates on extend; elsewhere this is just sparse
+
+
+class PartFile:
+    """The .part file one response is written into, from byte start onwards.
+
+    A fresh transfer (start 0) records the response's validators for a later
+    resume. With preallocate, total bytes are reserved up front; the file is
+    cut back to what was written on close, and until then the saved metadata
+    marks it so a crash mid-write restarts instead of trusting its length.
+    """
+
+    def __init__(self, filepath: str, headers, start: int, total: int = 0,
+                 preallocate: bool = PREALLOCATE, meter: ByteMeter | None = None):
+        self.filepath = filepath
+        self.written = start
+        self.meter = meter
+        if start == 0:
+            self._validators = {h: headers[h] for h in ("ETag", "Last-Modified") if headers.get(h)}
+            self._f = open(part_path(filepath), "wb")
+        else:
+            self._validators = partial_state(filepath)[1]
+            self._f = open(part_path(filepath), "r+b")
+            self._f.seek(start)
+            self._f.truncate()
+        self._preallocated = preallocate and total > start
+        if start == 0 or self._preallocated:
+            self._save_meta()
+        if self._preallocated:
+            _reserve(self._f, total)
+
+    def _save_meta(self) -> None:
+        meta = {**self._validators, "preallocated": True} if self._preallocated else self._validators
+        with open(_meta_path(self.filepath), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def write(self, data) -> None:
+        self._f.write(data)
+        self.written += len(data)
+        if self.meter:
+            self.meter.update(self.written)
+
+    def readfrom(self, raw, chunk_size: int | None = None) -> None:
+        """Copy a file-like body in via readinto, reusing one buffer.
+
+        Reads adapt to throughput unless chunk_size fixes their size.
+        """
+        sizer = ChunkSizer() if chunk_size is None else None
+        buf = memoryview(bytearray(chunk_size or MIN_CHUNK))
+        while True:
+            size = sizer.size if sizer else chunk_size
+            if size > len(buf):
+                buf = memoryview(bytearray(size))
+            n = raw.readinto(buf[:size])
+            if not n:
+                return
+            self.write(buf[:n])
+            if sizer:
+                sizer.update(n)
+
+    def close(self) -> None:
+        if self._preallocated:
+            self._f.truncate(self.written)
+            self._preallocated = False
+            self._save_meta()
+        self._f.close()
+
+    def __enter__(self) -> "PartFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def finish(filepath: str) -> None:
+    replace_file(part_path(filepath), filepath)
+    discard(filepath, keep_part=True)
+
+
+def discard(filepath: str, keep_part: bool = False) -> None:
+    paths = [_meta_path(filepath)] if keep_part else [part_path(filepath), _meta_path(filepath)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_path_locks: dict[str, list] = {}  # path -> [lock, transfers holding or waiting for it]
+_path_locks_lock = threading.Lock()
+
+
+@contextmanager
+def path_lock(filepath: str):
+    """Hold the process-wide lock for writing filepath (and its .part)."""
+    key = os.path.abspath(filepath)
+    with _path_locks_lock:
+        entry = _path_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _path_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _path_locks[key]
+
+
+def skipped(size: int) -> dict:
+    return {"status": "skipped", "size_bytes": size, "resumed_from": None, "download_time": 0.0}
+
+
+def linked(size: int) -> dict:
+    return {"status": "linked", "size_bytes": size, "resumed_from": None, "download_time": 0.0}
+
+
+def link_known(url: str, filepath: str) -> dict | None:
+    """Link url's blob from the content store to filepath if it was fetched before.
+
+    A file already at filepath is only replaced if the manifest shows it as downloaded.
+    """
+    folder = os.path.dirname(filepath)
+    store = store_for(folder)
+    rec = store.lookup(url) if store else None
+    if not rec:
+        return None
+    manifest = manifest_for(folder)
+    if os.path.exists(filepath) and not manifest.holds(filepath):
+        return None
+    if not store.link(rec, filepath):
+        return None
+    manifest.record_file(url, filepath, {"ETag": rec["etag"], "Last-Modified": rec["last_modified"]})
+    return linked(rec["size"])
+
+
+def record(url: str, filepath: str, headers=None) -> None:
+    """Note that filepath now holds url: in the content store, then the folder's manifest."""
+    folder = os.path.dirname(filepath)
+    store = store_for(folder)
+    if store:
+        store.add(url, filepath, headers)
+    manifest_for(folder).record_file(url, filepath, headers)
+
+
+def head_matches(status: int, headers, filepath: str) -> bool:
+    """Whether a HEAD response describes the file already at filepath."""
+    size = int(headers.get("Content-Length") or 0)
+    return status == 200 and size > 0 and os.path.getsize(filepath) == size
+
+
+# Errors after which a transfer reconnects and resumes (see Transfer.backoff)
+RETRYABLE = (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError, IncompleteDownload)
+
+
+class Transfer:
+    """The decisions of one file transfer, apart from the HTTP library carrying it.
+
+    fetch_file drives it over requests and AsyncMydyClient over httpx, so
+    both skip, resume and retry the same way:
+
+        t.preflight()                   a result if no request is needed
+        t.wants_head, t.head(...)       a result if the file on disk matches
+        loop:
+            GET with t.request_headers()
+            t.response(status, headers) False: the outcome is t.result
+            write the body into t.open_part(), then return t.complete(part)
+            on an error the transport counts as transient, sleep t.backoff(e)
+
+    Results are {"status": "downloaded"|"skipped"|"linked", "size_bytes",
+    "resumed_from", "download_time"}, or None if the server refuses the file.
+    The caller holds path_lock(filepath) throughout.
+    """
+
+    def __init__(self, url: str, filepath: str, progress: Callable[[dict], object] | None = None,
+                 preallocate: bool = PREALLOCATE):
+        self.url = url
+        self.filepath = filepath
+        self.progress = progress
+        self.preallocate = preallocate
+        self.result: dict | None = None
+        self.meter: ByteMeter | None = None
+        self.resumed_from: int | None = None
+        self._started: float | None = None
+        self._attempt = 0
+        self._offset, self._validators = 0, {}
+        self._start = self._total = 0
+        self._part_headers = self._record_headers = None
+
+    def preflight(self) -> dict | None:
+        if manifest_for(os.path.dirname(self.filepath)).is_current(self.url, self.filepath):
+            return skipped(os.path.getsize(self.filepath))
+        return link_known(self.url, self.filepath)
+
+    @property
+    def wants_head(self) -> bool:
+        """Whether a complete-looking file is on disk, worth a HEAD before any GET."""
+        return os.path.exists(self.filepath) and not partial_state(self.filepath)[0]
+
+    def head(self, status: int, headers) -> dict | None:
+        if not head_matches(status, headers, self.filepath):
+            return None
+        record(self.url, self.filepath, headers)
+        return skipped(os.path.getsize(self.filepath))
+
+    def request_headers(self) -> dict:
+        if self._started is None:
+            self._started = time.time()
+        self._offset, self._validators = partial_state(self.filepath)
+        return request_headers(self._offset, self._validators)
+
+    def response(self, status: int, headers) -> bool:
+        """Whether to write this response's body; if not, the outcome is in self.result."""
+        offset, validators = self._offset, self._validators
+        if range_complete(status, headers, offset):
+            finish(self.filepath)
+            record(self.url, self.filepath, validators)
+            self.result = self._downloaded(offset, offset)
+            return False
+        start = resume_from(status, headers, offset)
+        if start is None:
+            if status == 206:
+                discard(self.filepath)  # unusable range; start over, as one of the retries
+                raise IncompleteDownload(f"unusable Content-Range {headers.get('Content-Range')!r}")
+            self.result = None
+            return False
+        total = expected_size(status, headers, start)
+
+        if start == 0 and total > 0 and os.path.exists(self.filepath) and os.path.getsize(self.filepath) == total:
+            discard(self.filepath)
+            record(self.url, self.filepath, headers)
+            self.result = skipped(total)
+            return False
+
+        if self.resumed_from is None and start:
+            self.resumed_from = start
+        if self.progress:
+            # One meter across reconnects, so averages cover the whole file
+            if self.meter is None or start < self.meter.position:
+                self.meter = ByteMeter(self.progress, start)
+            self.meter.total = total
+        self._start, self._total = start, total
+        # Offsets into a compressed body can't be resumed, so save no validators for one
+        self._part_headers = {} if encoded(headers) else headers
+        self._record_headers = headers if start == 0 else validators
+        return True
+
+    def open_part(self) -> PartFile:
+        return PartFile(self.filepath, self._part_headers, self._start, self._total,
+                        self.preallocate, self.meter)
+
+    def complete(self, part: PartFile) -> dict:
+        """The result once the body is in the closed part, which must hold the whole file."""
+        written = part.written
+        if self.meter:
+            self.meter.update(written, force=True)
+        if self._total and written != self._total:
+            raise IncompleteDownload(f"got {written} of {self._total} bytes")
+        finish(self.filepath)
+        record(self.url, self.filepath, self._record_headers)
+        return self._downloaded(written, self.resumed_from)
+
+    def backoff(self, error: Exception) -> float:
+        """Seconds to wait before reconnecting after error; re-raises it once
+        RESUME_ATTEMPTS reconnects have been used."""
+        self._attempt += 1
+        if self._attempt > RESUME_ATTEMPTS:
+            raise error
+        return RESUME_BACKOFF * self._attempt
+
+    def _downloaded(self, size: int, resumed_from: int | None) -> dict:
+        return {"status": "downloaded", "size_bytes": size, "resumed_from": resumed_from,
+                "download_time": round(time.time() - self._started, 2)}
+
+
+def fetch_file(session: requests.Session, url: str, filepath: str,
+               before_request: Callable[[], object] | None = None,
+               before_head: Callable[[], object] | None = None,
+               chunk_size: int | None = None, preallocate: bool = PREALLOCATE,
+               progress: Callable[[dict], object] | None = None) -> dict | None:
+    """Stream url to filepath through a .part file, resuming after dropped connections.
+
+    Returns a Transfer result. before_request is called before every GET
+    and before_head before a HEAD pre-flight (e.g. to rate-limit).
+    chunk_size fixes the read size instead of adapting it, and preallocate
+    reserves the file's size on disk first. progress receives ByteMeter
+    reports while bytes are written.
+    """
+    with path_lock(filepath):
+        return _fetch_file(session, Transfer(url, filepath, progress, preallocate),
+                           before_request, before_head, chunk_size)
+
+
+def _fetch_file(session, transfer: Transfer, before_request, before_head, chunk_size) -> dict | None:
+    if done := transfer.preflight():
+        return done
+    if transfer.wants_head:
+        if before_head:
+            before_head()
+        try:
+            head = session.head(transfer.url, allow_redirects=True, timeout=30,
+                                headers={"Accept-Encoding": "identity"})
+            if done := transfer.head(head.status_code, head.headers):
+                return done
+        except requests.RequestException:
+            pass  # fall through to the GET, which does its own size check
+
+    while True:
+        if before_request:
+            before_request()
+        resp = None
+        try:
+            resp = session.get(transfer.url, stream=True, headers=transfer.request_headers())
+            if not transfer.response(resp.status_code, resp.headers):
+                return transfer.result
+            resp.raw.decode_content = True  # as iter_content would
+            with transfer.open_part() as part:
+                part.readfrom(resp.raw, chunk_size)
+            return transfer.complete(part)
+        except RETRYABLE as e:
+            time.sleep(transfer.backoff(e))
+        finally:
+            if resp is not None:
+                resp.close()
@@ -0,0 +1,177 @@
+"""
+MyDy LMS background download jobs
+
+A bulk download can outlast a single request from an assistant, so the MCP
+server runs each one as a job: start() hands the courses to a small pool
+and returns a job id at once, and the caller polls status() for per-course
+counts, the files currently streaming and the batch's speed and ETA, all
+kept current from MydyClient.download_courses' progress events. cancel()
+stops a job after the files already streaming; a cancelled sync picks up
+where it left off next time, through the folder manifests and .part files.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("MYDY_JOB_WORKERS", "1"))
+# Finished jobs kept for status() before the oldest are forgotten
+KEEP_JOBS = 20
+RECENT_FILES = 10
+# file_done status -> the per-course count it adds to
+FILE_COUNTS = {"downloaded": "downloaded", "linked": "linked", "skipped": "skipped", "error": "errors"}
+
+
+def _rate(data: dict | None) -> dict:
+    """The speed/ETA fields of a ByteMeter report, rounded for display."""
+    if not data:
+        return {"bytes_done": 0, "bytes_total": 0, "bytes_per_second": 0, "eta_seconds": None}
+    return {
+        "bytes_done": data["bytes"],
+        "bytes_total": data["total"],
+        "bytes_per_second": round(data["avg_rate"]),
+        "eta_seconds": round(data["eta"], 1) if data["eta"] is not None else None,
+    }
+
+
+class DownloadJob:
+    """One bulk download: its courses, progress so far and final summaries."""
+
+    def __init__(self, courses: list[dict], base_dir: str, full: bool = False):
+        self.id = secrets.token_hex(4)
+        self.courses = courses
+        self.base_dir = base_dir
+        self.full = full
+        self.state = "queued"
+        self.error: str | None = None
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.summaries: list[dict] | None = None
+        self.cancel_event = threading.Event()
+        self._progress = {c["id"]: {"course_id": c["id"], "course_name": c["name"], "activities": None,
+                                    "done": 0, "unchanged": 0, "failed": 0,
+                                    **dict.fromkeys(FILE_COUNTS.values(), 0)}
+                          for c in courses}
+        self._active: dict[tuple[str, str], dict] = {}
+        self._recent: deque[dict] = deque(maxlen=RECENT_FILES)
+        self._batch: dict | None = None
+        self._lock = threading.Lock()
+
+    def on_event(self, event: str, data: dict) -> None:
+        """progress_callback for download_courses."""
+        with self._lock:
+            course = self._progress.get(data.get("course_id"))
+            if event == "bytes":
+                if data.get("scope") == "batch":
+                    self._batch = data
+                else:
+                    self._active[(data["course_id"], data["filename"])] = data
+            elif event == "course" and course:
+                course.update(course_name=data["course_name"], activities=data["activities"],
+                              unchanged=data["unchanged"])
+            elif event == "activity" and course:
+                course["done"] = data["index"]
+            elif event == "file_done" and course:
+                self._active.pop((data["course_id"], data["filename"]), None)
+                if count := FILE_COUNTS.get(data.get("status")):
+                    course[count] += 1
+                self._recent.append({k: data[k] for k in ("course_id", "filename", "status", "size_bytes")
+                                     if k in data})
+            elif event == "course_done" and course:
+                course["failed"] = data["failed"]
+                if "error" in data:
+                    course["error"] = data["error"]
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "cancelled", "error")
+
+    def status(self) -> dict:
+        with self._lock:
+            courses = [dict(c) for c in self._progress.values()]
+            active = [{"course_id": d["course_id"], "filename": d["filename"], **_rate(d)}
+                      for d in self._active.values()]
+            recent = list(self._recent)
+            batch = self._batch
+        end = self.finished or time.time()
+        status = {
+            "job_id": self.id,
+            "state": self.state,
+            "elapsed_seconds": round(end - (self.started or end), 1),
+            "activities_total": sum(c["activities"] or 0 for c in courses),
+            "activities_done": sum(c["done"] for c in courses),
+            **_rate(batch),
+            "courses": courses,
+            "active_files": active,
+            "recent_files": recent,
+        }
+        if self.error:
+            status["error"] = self.error
+        if self.summaries is not None:
+            status["summaries"] = self.summaries
+        return status
+
+
+class JobManager:
+    """Runs DownloadJobs on a background pool, at most JOB_WORKERS at a time."""
+
+    def __init__(self, client, workers: int = JOB_WORKERS):
+        self.client = client
+        self._jobs: dict[str, DownloadJob] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="download-job")
+        self._lock = threading.Lock()
+
+    def start(self, courses: list[dict], base_dir: str = ".", full: bool = False) -> DownloadJob:
+        job = DownloadJob(courses, base_dir, full)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job: DownloadJob) -> None:
+        if job.cancel_event.is_set():
+            return
+        job.state, job.started = "running", time.time()
+        try:
+            job.summaries = self.client.download_courses(job.courses, job.base_dir, job.on_event,
+                                                         full=job.full, cancel=job.cancel_event)
+            job.state = "cancelled" if job.cancel_event.is_set() else "done"
+        except Exception as e:
+            job.state, job.error = "error", str(e)
+        job.finished = time.time()
+
+    def get(self, job_id: str) -> DownloadJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> DownloadJob | None:
+        job = self.get(job_id)
+        if job and not job.done:
+            job.cancel_event.set()
+            if job.state == "queued":
+                job.state, job.finished = "cancelled", time.time()
+        return job
+
+    def shutdown(self) -> None:
+        """Cancel every unfinished job and wait for the running ones to stop.
+
+        The pool's threads are not daemons, so without this the interpreter
+        waits at exit for every queued bulk download to run to the end.
+        """
+        for job in self.jobs():
+            self.cancel(job.id)
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def jobs(self) -> list[DownloadJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in finished[:max(0, len(finished) - KEEP_JOBS)]:
+            del self._jobs[job.id]
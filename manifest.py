@@ -0,0 +1,177 @@
+"""
+MyDy LMS sync manifest
+
+Each download folder keeps a small JSON-lines log (.mydy-manifest.jsonl)
+recording every file fetched into it: the URL, local name, size, server
+validators and the local mtime after writing. A file whose manifest entry
+still matches what is on disk is skipped without any request, so re-syncing
+an unchanged course costs no downloads.
+
+It also maps each course activity to the file it resolved to, along with a
+fingerprint of the activity's entry on the course page. An activity whose
+file is still current and whose entry is unchanged is not revisited at all
+on the next sync, so an incremental run only opens activity pages that are
+new, changed on the course page (e.g. a replaced file), or whose file has
+gone missing or changed locally.
+
+Two activities can offer files with the same name; claim_name() gives the
+later one a numbered name ("notes (2).pdf") so neither overwrites the other.
+
+The log is append-only; the last record for a key wins, and it is rewritten
+compactly when it grows well past the number of live entries.
+"""
+
+import json
+import os
+import threading
+
+MANIFEST_NAME = ".mydy-manifest.jsonl"
+
+
+class Manifest:
+    """url -> download record for one folder, persisted as JSON lines."""
+
+    def __init__(self, folder: str):
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self._files: dict[str, dict] = {}
+        self._activities: dict[str, dict] = {}
+        # local file name -> the activity it belongs to
+        self._names: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        lines = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # a torn final line from an interrupted write
+                    if rec.get("kind") == "file":
+                        self._files[rec["url"]] = rec
+                    elif rec.get("kind") == "activity":
+                        self._activities[rec["url"]] = rec
+                        self._names[rec["name"]] = rec["url"]
+        except OSError:
+            return
+        if lines > 2 * (len(self._files) + len(self._activities)) + 50:
+            self.compact()
+
+    def _append(self, rec: dict) -> None:
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+        except OSError:
+            pass
+
+    def compact(self) -> None:
+        with self._lock:
+            tmp = f"{self.path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for rec in (*self._files.values(), *self._activities.values()):
+                        f.write(json.dumps(rec) + "\n")
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+    # -- files -------------------------------------------------------------
+
+    def file(self, url: str) -> dict | None:
+        with self._lock:
+            return self._files.get(url)
+
+    def record_file(self, url: str, filepath: str, headers=None) -> None:
+        """Remember that url is now fully stored at filepath."""
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return
+        headers = headers or {}
+        rec = {
+            "kind": "file", "url": url, "name": os.path.basename(filepath),
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+        }
+        with self._lock:
+            self._files[url] = rec
+            self._append(rec)
+
+    def is_current(self, url: str, filepath: str) -> bool:
+        """True if filepath is still exactly the file recorded for url."""
+        rec = self.file(url)
+        if not rec or rec["name"] != os.path.basename(filepath):
+            return False
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return False
+        return st.st_size == rec["size"] and st.st_mtime_ns == rec["mtime_ns"]
+
+    def holds(self, filepath: str) -> bool:
+        """True if filepath is exactly as it was recorded for some URL, i.e. the
+        user hasn't put it there or edited it since it was downloaded."""
+        name = os.path.basename(filepath)
+        with self._lock:
+            recs = [rec for rec in self._files.values() if rec["name"] == name]
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return False
+        return any(st.st_size == rec["size"] and st.st_mtime_ns == rec["mtime_ns"] for rec in recs)
+
+    # -- activities --------------------------------------------------------
+
+    def activity(self, url: str) -> dict | None:
+        with self._lock:
+            return self._activities.get(url)
+
+    def record_activity(self, url: str, file_url: str, source: str, filepath: str,
+                        fingerprint: str | None = None) -> None:
+        """Remember that activity url resolved to file_url, stored at filepath,
+        while its course page entry had the given fingerprint."""
+        rec = {"kind": "activity", "url": url, "file_url": file_url,
+               "source": source, "name": os.path.basename(filepath), "fingerprint": fingerprint}
+        with self._lock:
+            self._names[rec["name"]] = url
+            if self._activities.get(url) == rec:
+                return
+            self._activities[url] = rec
+            self._append(rec)
+
+    def claim_name(self, url: str, name: str) -> str:
+        """The file name activity url should save name under: name itself unless
+        another activity already has it, else the first free "stem (n).ext"."""
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        with self._lock:
+            while self._names.setdefault(candidate, url) != url:
+                n += 1
+                candidate = f"{stem} ({n}){ext}"
+        return candidate
+
+    def synced_activity(self, url: str, fingerprint: str | None = None) -> dict | None:
+        """The activity's record if its file is still current on disk and, given
+        a fingerprint, the activity is unchanged on the course page; else None."""
+        rec = self.activity(url)
+        if fingerprint is not None and rec and rec.get("fingerprint") != fingerprint:
+            return None
+        if rec and self.is_current(rec["file_url"], os.path.join(os.path.dirname(self.path), rec["name"])):
+            return rec
+        return None
+
+
+_manifests: dict[str, Manifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def manifest_for(folder: str) -> Manifest:
+    """The process-wide Manifest for a folder, loaded on first use."""
+    key = os.path.abspath(folder)
+    with _manifests_lock:
+        if key not in _manifests:
+            _manifests[key] = Manifest(key)
+        return _manifests[key]
@@ -4,15 +4,35 @@ MyDy LMS Helper - MCP Server
 An MCP (Model Context Protocol) server that exposes tools for interacting with
 the MyDy (Moodle-based) Learning Management System at D.Y. Patil institutions.
 
+The tools are thin adapters over one shared client.MydyClient, so the MCP
+server and the TUI use the same session, page and parser caches, connection
+pool, rate limiter and download pipeline.
+
+List results can be trimmed before they reach the assistant: fields= keeps
+only the named keys of each item, offset/limit return one page with a
+next_offset cursor (get_announcements, whose limit predates paging, pages
+on offset or paged=True), and compact=True replaces URLs with short ids (e.g.
+"assign:50003"), drops empty fields and truncates announcement bodies,
+which get_announcement then fetches in full. The tools are async: each
+blocking client call runs on a small thread pool (MYDY_MCP_WORKERS), so a
+long download doesn't stop a quick get_attendance from being answered.
+
 Tools:
   - login: Authenticate with the LMS
   - list_courses: Get available courses from the dashboard
   - download_course_materials: Download all materials from specified courses
+  - start_download: Start a background download job and return its id
+  - get_download_status: Per-course and per-file progress, speed and ETA of a job
+  - cancel_download: Stop a download job
   - get_course_content: List all sections and activities in a course
   - get_assignments: View assignments with due dates and submission status
   - get_grades: Fetch grade report for a course
+  - get_assignments_bulk: Assignments across several (or all) courses in one call
+  - get_grades_bulk: Grade reports across several (or all) courses in one call
   - get_announcements: Read course announcements/forum posts
+  - get_announcement: Read one announcement in full
   - get_attendance: View attendance summary across all subjects
+  - get_rate_limit_stats: Show how much time was spent throttled
 
 Usage with Claude Code:
   claude mcp add mydy-lms -- python /path/to/mcp_server.py
@@ -32,204 +52,169 @@ Usage with claude_desktop_config.json:
   }
 """
 
+import asyncio
 import os
 import re
 import time
-import random
-from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-import requests
-from bs4 import BeautifulSoup
 from mcp.server.fastmcp import FastMCP
 
+from client import RAIT_URL, MydyClient
+from jobs import DownloadJob, JobManager
+
 # Create MCP server
 mcp = FastMCP(
     "mydy-lms",
     instructions="Tools for interacting with the MyDy (Moodle) LMS - login, list courses, download materials, view course content, assignments, grades, announcements, and attendance.",
 )
 
-# Global session state
-_session: requests.Session | None = None
-_logged_in: bool = False
-
-# Rate limiting settings
-MIN_DELAY = 0.5
-MAX_DELAY = 0.5
-DOWNLOAD_DELAY = 0.1
+NOT_LOGGED_IN = "Error: Not logged in. Call the login tool first."
+# Characters of an announcement kept with compact=True
+COMPACT_CONTENT = 300
+# Announcements fetched when get_announcements is not given a limit
+ANNOUNCEMENTS_LIMIT = 10
+_MOODLE_URL = re.compile(r"/mod/(\w+)/(?:view|discuss)\.php\?(id|d)=(\d+)")
+_DISCUSSION_URL = re.compile(re.escape(RAIT_URL) + r"/mod/forum/discuss\.php\?d=(\d+)(?:[&#].*)?")
+
+# Tool calls served at once; each is one blocking client call on its own thread
+MCP_WORKERS = int(os.getenv("MYDY_MCP_WORKERS", "4"))
+
+# One client for the whole server: its session, caches and pools outlive each tool call
+_client = MydyClient()
+_jobs = JobManager(_client)
+_pool = ThreadPoolExecutor(max_workers=max(1, MCP_WORKERS), thread_name_prefix="mcp-tool")
+
+
+async def _run(func, *args, **kwargs):
+    """Run a blocking client call on the tool pool without stalling the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_pool, partial(func, *args, **kwargs))
+
+
+def _error(message: str) -> str:
+    """Client error strings, in the "Error: ..." form the tools have always returned."""
+    return message if message.startswith(("Error", "Network error", "No ")) else f"Error: {message}"
+
+
+def _file_info(result: dict, folder: str) -> dict:
+    """A client per-file result in the MCP tool's shape."""
+    info = {"filename": result["filename"]}
+    if "size_bytes" in result:
+        info["size_bytes"] = result["size_bytes"]
+    if "download_time" in result:
+        info["download_time_seconds"] = result["download_time"]
+    status = result["status"]
+    info["status"] = "skipped_exists" if status == "skipped" else status
+    if "source" in result:
+        info["source"] = result["source"]
+    if status in ("downloaded", "linked"):
+        info["path"] = os.path.join(folder, result["filename"])
+    if result.get("resumed_from"):
+        info["resumed_from_bytes"] = result["resumed_from"]
+    if "error" in result:
+        info["error"] = result["error"]
+    return info
+
+
+async def _select_courses(course_ids: list[str] | None) -> list[dict] | str:
+    """The dashboard courses matching course_ids (all of them if empty), or an error string."""
+    if not _client.logged_in:
+        return "Not logged in. Call the login tool first."
+
+    all_courses = await _run(_client.list_courses)
+    if isinstance(all_courses, str):
+        return _error(all_courses)
 
-
-def _rate_limit(operation_type: str = "general") -> None:
-    """Apply rate limiting to avoid overwhelming the server."""
-    if operation_type == "download":
-        delay = random.uniform(MIN_DELAY + DOWNLOAD_DELAY, MAX_DELAY + DOWNLOAD_DELAY)
+    # Filter to requested courses
+    if course_ids:
+        id_set = set(course_ids)
+        selected = [c for c in all_courses if c['id'] in id_set]
+        missing = id_set - {c['id'] for c in selected}
+        if missing:
+            return f"Course IDs not found: {', '.join(missing)}. Use list_courses to see available IDs."
     else:
-        delay = random.uniform(MIN_DELAY, MAX_DELAY)
-    time.sleep(delay)
+        selected = all_courses
 
+    return selected or "No courses found."
 
-def _get_session() -> requests.Session:
-    """Get or create the requests session."""
-    global _session
-    if _session is None:
-        _session = requests.Session()
-    return _session
 
+def _course_results(courses: list[dict], summaries: list[dict]) -> list[dict]:
+    """Client course summaries in the MCP tools' shape, tagged with course_id."""
+    results = []
+    for course, summary in zip(courses, summaries):
+        folder = summary.get("folder", "")
+        results.append({
+            "course_id": course['id'],
+            **summary,
+            "files": [_file_info(f, folder) for f in summary.get("files", [])],
+        })
+    return results
 
-def _sanitize_folder_name(name: str) -> str:
-    """Sanitize course name for folder creation."""
-    return re.sub(r'[<>:"/\\|?*]', '_', name).strip()
 
+def _compact(item: dict) -> dict:
+    """item without its empty fields."""
+    return {k: v for k, v in item.items() if v not in (None, "", [])}
 
-def _extract_course_name(soup: BeautifulSoup) -> str:
-    """Extract course name from page title."""
-    title_tag = soup.find('title')
-    if title_tag:
-        title_text = title_tag.get_text()
-        if "Course:" in title_text:
-            return title_text.split("Course:", 1)[1].strip()
-        return title_text.strip()
-    return "Unknown Course"
 
+def short_id(url: str) -> str:
+    """"assign:50003" for a Moodle activity URL, "discussion:3001" for a forum
+    discussion; other URLs are returned unchanged."""
+    m = _MOODLE_URL.search(url)
+    if not m:
+        return url
+    module, key, num = m.groups()
+    return f"discussion:{num}" if key == "d" else f"{module}:{num}"
 
-def _fetch_course_page(session: requests.Session, course_id: str) -> tuple[BeautifulSoup, str] | str:
-    """Fetch and parse a course page. Returns (soup, course_name) or error string."""
-    _rate_limit("course")
-    url = f"https://mydy.dypatil.edu/rait/course/view.php?id={course_id}"
-    try:
-        resp = session.get(url)
-        if resp.status_code != 200:
-            return f"Error: Course page returned status {resp.status_code}"
-        if 'login' in resp.url and 'course' not in resp.url:
-            return "Error: Session expired. Please login again."
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        course_name = _extract_course_name(soup)
-        return (soup, course_name)
-    except requests.RequestException as e:
-        return f"Network error fetching course: {str(e)}"
-
-
-def _get_activity_name(element) -> str:
-    """Extract clean activity name from a Moodle activity element."""
-    name_span = element.find('span', class_='instancename')
-    if name_span:
-        # Remove accesshide spans (screen-reader-only text)
-        for hidden in name_span.find_all('span', class_='accesshide'):
-            hidden.decompose()
-        return name_span.get_text(strip=True)
-    a_tag = element.find('a', href=True)
-    if a_tag:
-        return a_tag.get_text(strip=True)
-    return ""
-
-
-def _download_file(
-    session: requests.Session,
-    url: str,
-    folder: str,
-    source_type: str,
-) -> dict | None:
-    """Download a single file. Returns file info dict or None on failure."""
-    try:
-        _rate_limit("download")
-        download_start = time.time()
-        file_resp = session.get(url, stream=True)
 
-        if file_resp.status_code != 200:
+def discussion_url(ident: str) -> str | None:
+    """The forum discussion URL behind a "discussion:<n>" id or a discussion
+    URL on the MyDy site; None for anything else."""
+    kind, _, num = ident.partition(":")
+    if kind != "discussion" or not num.isdigit():
+        match = _DISCUSSION_URL.fullmatch(ident)
+        if not match:
             return None
-
-        filename = unquote(url.split('/')[-1])
-        # Strip query params from filename
-        if '?' in filename:
-            filename = filename.split('?')[0]
-        filepath = os.path.join(folder, filename)
-
-        total_size = int(file_resp.headers.get('content-length', 0))
-
-        # Skip if file already exists with same size
-        if os.path.exists(filepath) and total_size > 0:
-            if os.path.getsize(filepath) == total_size:
-                return {
-                    "filename": filename,
-                    "size_bytes": total_size,
-                    "status": "skipped_exists",
-                    "source": source_type,
-                }
-
-        # Download file
-        downloaded = 0
-        with open(filepath, 'wb') as f:
-            for chunk in file_resp.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-
-        download_time = time.time() - download_start
-        return {
-            "filename": filename,
-            "size_bytes": downloaded,
-            "download_time_seconds": round(download_time, 2),
-            "status": "downloaded",
-            "source": source_type,
-            "path": filepath,
-        }
-    except Exception as e:
-        return {"filename": url.split('/')[-1], "status": "error", "error": str(e)}
-
-
-def _try_download_methods(
-    session: requests.Session,
-    activity_url: str,
-    folder: str,
-) -> dict | None:
-    """Try all download methods for an activity. Returns file info or None."""
-    _rate_limit("activity")
-    activity_resp = session.get(activity_url)
-    soup = BeautifulSoup(activity_resp.text, 'html.parser')
-
-    # Method 1: Direct file links
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if 'pluginfile.php' in href or href.endswith(('.pdf', '.ppt', '.pptx', '.docx')):
-            file_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-            result = _download_file(session, file_url, folder, "direct")
-            if result:
-                return result
-
-    # Method 2: FlexPaper PDFs
-    pdf_links = re.findall(r"PDFFile\s*:\s*'([^']+)'", activity_resp.text)
-    for pdf_url in pdf_links:
-        result = _download_file(session, pdf_url, folder, "flexpaper")
-        if result:
-            return result
-
-    # Method 3: Presentation files
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if href.endswith(('.ppt', '.pptx')):
-            file_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-            result = _download_file(session, file_url, folder, "presentation")
-            if result:
-                return result
-
-    # Method 4: Iframe sources
-    iframe = soup.find('iframe', id='presentationobject')
-    if iframe and iframe.has_attr('src'):
-        result = _download_file(session, iframe['src'], folder, "iframe")
-        if result:
-            return result
-
-    # Method 5: Object data
-    obj = soup.find('object', id='presentationobject')
-    if obj and obj.has_attr('data'):
-        result = _download_file(session, obj['data'], folder, "object")
-        if result:
-            return result
-
-    return None
+        num = match.group(1)
+    return f"{RAIT_URL}/mod/forum/discuss.php?d={num}"
+
+
+def _shape(item: dict, fields: list[str] | None = None, compact: bool = False) -> dict:
+    """Apply compact mode and the fields projection to one result item."""
+    if compact:
+        item = dict(item)
+        url = item.pop("url", None)
+        if url and "id" not in item:
+            item["id"] = short_id(url)
+        content = item.get("content")
+        if isinstance(content, str) and len(content) > COMPACT_CONTENT:
+            item["content"] = content[:COMPACT_CONTENT].rstrip() + "…"
+            item["truncated"] = True
+        item = _compact(item)
+    if fields:
+        item = {k: item[k] for k in fields if k in item}
+    return item
+
+
+def _window(items: list, offset: int = 0, limit: int = 0) -> dict:
+    """One page of items, with the offset to ask for next (None on the last page)."""
+    offset = max(0, offset)
+    page = items[offset:offset + limit] if limit > 0 else items[offset:]
+    end = offset + len(page)
+    return {"items": page, "total": len(items), "offset": offset,
+            "next_offset": end if end < len(items) else None}
+
+
+def _job_status(job: DownloadJob) -> dict:
+    status = job.status()
+    summaries = status.pop("summaries", None)
+    if summaries is not None:
+        status["results"] = _course_results(job.courses, summaries)
+    return status
 
 
 @mcp.tool()
-def login(username: str = "", password: str = "") -> str:
+async def login(username: str = "", password: str = "") -> str:
     """
     Authenticate with the MyDy LMS portal.
 
@@ -243,178 +228,54 @@ def login(username: str = "", password: str = "") -> str:
     Returns:
         Login status message.
     """
-    global _logged_in
-
-    session = _get_session()
     username = username or os.getenv('MYDY_USERNAME', '')
     password = password or os.getenv('MYDY_PASSWORD', '')
 
     if not username or not password:
         return "Error: No credentials provided. Pass username/password or set MYDY_USERNAME and MYDY_PASSWORD environment variables."
 
-    try:
-        # Step 1: Access the university portal
-        initial_url = 'https://mydy.dypatil.edu/rait/login/index.php'
-        initial_resp = session.get(initial_url)
-
-        if initial_resp.url == 'https://mydy.dypatil.edu/':
-            # Custom username entry page - submit username first
-            step1_payload = {
-                'username': username,
-                'wantsurl': '',
-                'next': 'Next'
-            }
-            step1_resp = session.post('https://mydy.dypatil.edu/index.php', data=step1_payload)
-
-            if 'rait/login/index.php' in step1_resp.url and 'uname=' in step1_resp.url:
-                moodle_login_resp = session.get(step1_resp.url)
-                login_soup = BeautifulSoup(moodle_login_resp.text, 'html.parser')
-            else:
-                # Try direct access
-                direct_url = f"https://mydy.dypatil.edu/rait/login/index.php?uname={username}&wantsurl="
-                moodle_login_resp = session.get(direct_url)
-                login_soup = BeautifulSoup(moodle_login_resp.text, 'html.parser')
-        else:
-            login_soup = BeautifulSoup(initial_resp.text, 'html.parser')
-
-        # Find password field and submit login
-        password_field = login_soup.find('input', {'name': 'password'})
-        if not password_field:
-            _logged_in = False
-            return "Error: Could not find password field on login page. The LMS portal may be down or has changed."
-
-        # Collect hidden fields
-        login_payload = {}
-        for inp in login_soup.find_all('input', {'type': 'hidden'}):
-            name = inp.get('name')
-            value = inp.get('value', '')
-            if name:
-                login_payload[name] = value
-
-        login_payload['password'] = password
-
-        # Find form action URL
-        form = login_soup.find('form')
-        if form and form.get('action'):
-            login_action_url = form['action']
-            if not login_action_url.startswith('http'):
-                login_action_url = 'https://mydy.dypatil.edu/rait/login/' + login_action_url.lstrip('/')
-        else:
-            login_action_url = 'https://mydy.dypatil.edu/rait/login/index.php'
-
-        login_resp = session.post(login_action_url, data=login_payload)
-
-        # Check login success
-        resp_text = login_resp.text.lower()
-        has_login_form = (
-            BeautifulSoup(login_resp.text, 'html.parser').find('input', {'name': 'password'}) is not None
-            or 'notloggedin' in resp_text
-        )
-        has_error = any(x in resp_text for x in ['invalid login', 'login failed', 'incorrect username', 'incorrect password'])
-        has_success = any(x in resp_text for x in ['dashboard', 'my home', 'logout', 'profile'])
-
-        if has_login_form or has_error:
-            _logged_in = False
-            return "Login failed. Please check your credentials."
-
-        if has_success:
-            _logged_in = True
-            masked_user = username[:2] + "****" + username[-2:] if len(username) > 4 else "****"
-            return f"Successfully logged in as {masked_user}."
-
-        # Ambiguous - check URL
-        if 'rait' in login_resp.url and 'login' not in login_resp.url:
-            _logged_in = True
-            return "Login appears successful (redirected to dashboard)."
-
-        _logged_in = False
-        return "Login result unclear. You may need to try again."
-
-    except requests.RequestException as e:
-        _logged_in = False
-        return f"Network error during login: {str(e)}"
+    result = await _run(_client.login, username, password)
+    if result["success"]:
+        return f"Successfully logged in as {result['masked_user']}."
+    return result["message"]
 
 
 @mcp.tool()
-def list_courses() -> list[dict] | str:
+async def list_courses(
+    fields: list[str] | None = None,
+    offset: int = 0,
+    limit: int = 0,
+    compact: bool = False,
+) -> list[dict] | dict | str:
     """
     List all available courses from the LMS dashboard.
 
     Must be logged in first (call login tool).
 
+    Args:
+        fields: Keys to keep for each course (e.g. ["id", "name"]). Default: all.
+        offset: Skip this many courses. With offset or limit set the result is
+            a page: {"items", "total", "offset", "next_offset"}.
+        limit: Return at most this many courses (0 = no limit).
+        compact: Leave out the url field.
+
     Returns:
         List of courses with id, name, and url fields, or an error message.
     """
-    if not _logged_in:
-        return "Error: Not logged in. Call the login tool first."
-
-    session = _get_session()
-
-    try:
-        _rate_limit("dashboard")
-        dashboard_resp = session.get("https://mydy.dypatil.edu/rait/my/")
-
-        if dashboard_resp.status_code != 200:
-            return f"Error: Dashboard returned status {dashboard_resp.status_code}"
-
-        soup = BeautifulSoup(dashboard_resp.text, 'html.parser')
-        courses = []
-        seen_ids: set[str] = set()
-
-        # Method 1: Previous semester classes block
-        prev_block = soup.find('div', {'id': re.compile(r'.*stu_previousclasses.*')})
-        if prev_block:
-            for link in prev_block.find_all('a', href=re.compile(r'/course/view\.php\?id=\d+')):
-                href = link.get('href', '')
-                match = re.search(r'id=(\d+)', href)
-                if match:
-                    cid = match.group(1)
-                    if cid not in seen_ids:
-                        seen_ids.add(cid)
-                        full_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                        courses.append({"id": cid, "name": link.get_text(strip=True), "url": full_url})
-
-        # Method 2: Navigation blocks
-        for block in soup.find_all('div', class_=re.compile(r'block.*navigation|block.*tree|block.*university')):
-            for link in block.find_all('a', href=re.compile(r'/course/view\.php\?id=\d+')):
-                href = link.get('href', '')
-                match = re.search(r'id=(\d+)', href)
-                if match:
-                    cid = match.group(1)
-                    if cid not in seen_ids:
-                        seen_ids.add(cid)
-                        full_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                        courses.append({"id": cid, "name": link.get_text(strip=True), "url": full_url})
-
-        # Method 3: Fallback - scan entire page
-        if not courses:
-            for link in soup.find_all('a', href=re.compile(r'/course/view\.php\?id=\d+')):
-                href = link.get('href', '')
-                match = re.search(r'id=(\d+)', href)
-                if match:
-                    cid = match.group(1)
-                    if cid not in seen_ids:
-                        name = link.get_text(strip=True)
-                        if name and len(name.strip()) > 2:
-                            seen_ids.add(cid)
-                            full_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                            courses.append({"id": cid, "name": name, "url": full_url})
-
-        courses.sort(key=lambda x: int(x['id']), reverse=True)
-
-        if not courses:
-            return "No courses found. This might be normal between semesters."
-
-        return courses
-
-    except requests.RequestException as e:
-        return f"Network error: {str(e)}"
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    courses = await _run(_client.list_courses)
+    if isinstance(courses, str):
+        return _error(courses)
+    courses = [_shape(c, fields, compact) for c in courses]
+    return _window(courses, offset, limit) if offset or limit else courses
 
 
 @mcp.tool()
-def download_course_materials(
+async def download_course_materials(
     course_ids: list[str] | None = None,
     download_dir: str = ".",
+    full: bool = False,
 ) -> dict:
     """
     Download all materials from specified courses.
@@ -426,213 +287,161 @@ def download_course_materials(
         course_ids: List of course IDs to download. If None/empty, downloads all courses.
         download_dir: Directory to save files into. Defaults to current directory.
             Each course gets its own subfolder.
+        full: Revisit every activity and re-check every file with the server.
+            By default activities whose file is already synced are skipped.
 
     Returns:
         Download summary with per-course results.
     """
-    if not _logged_in:
-        return {"error": "Not logged in. Call the login tool first."}
-
-    session = _get_session()
+    selected = await _select_courses(course_ids)
+    if isinstance(selected, str):
+        return {"error": selected}
 
-    # Get course list
-    courses_result = list_courses()
-    if isinstance(courses_result, str):
-        return {"error": courses_result}
-
-    all_courses: list[dict] = courses_result
-
-    # Filter to requested courses
-    if course_ids:
-        id_set = set(course_ids)
-        selected = [c for c in all_courses if c['id'] in id_set]
-        missing = id_set - {c['id'] for c in selected}
-        if missing:
-            return {"error": f"Course IDs not found: {', '.join(missing)}. Use list_courses to see available IDs."}
-    else:
-        selected = all_courses
-
-    if not selected:
-        return {"error": "No courses to download."}
-
-    results = []
     download_start = time.time()
-
-    for course in selected:
-        course_result = _download_single_course(session, course, download_dir)
-        results.append(course_result)
-
+    summaries = await _run(_client.download_courses, selected, download_dir, full=full)
     total_time = time.time() - download_start
-    total_files = sum(r['downloaded'] for r in results)
-    total_failed = sum(r['failed'] for r in results)
 
+    results = _course_results(selected, summaries)
     return {
         "summary": {
             "courses_processed": len(results),
-            "total_files_downloaded": total_files,
-            "total_failed_activities": total_failed,
+            "total_files_downloaded": sum(r['downloaded'] for r in results),
+            "total_failed_activities": sum(r['failed'] for r in results),
             "total_time_seconds": round(total_time, 2),
         },
         "courses": results,
     }
 
 
-def _download_single_course(
-    session: requests.Session,
-    course: dict,
-    base_dir: str,
+@mcp.tool()
+async def start_download(
+    course_ids: list[str] | None = None,
+    download_dir: str = ".",
+    full: bool = False,
 ) -> dict:
-    """Download all materials from a single course."""
-    _rate_limit("course")
+    """
+    Start downloading course materials in the background and return at once.
 
-    try:
-        resp = session.get(course['url'])
-        soup = BeautifulSoup(resp.text, 'html.parser')
-    except requests.RequestException as e:
-        return {
-            "course_id": course['id'],
-            "course_name": course['name'],
-            "downloaded": 0,
-            "failed": 0,
-            "error": str(e),
-            "files": [],
-        }
+    Must be logged in first (call login tool). Poll get_download_status with
+    the returned job_id until its state is done, cancelled or error.
+
+    Args:
+        course_ids: List of course IDs to download. If None/empty, downloads all courses.
+        download_dir: Directory to save files into. Defaults to current directory.
+            Each course gets its own subfolder.
+        full: Revisit every activity and re-check every file with the server.
 
-    course_name = _extract_course_name(soup)
-    folder_name = _sanitize_folder_name(course_name)
-    course_folder = os.path.join(base_dir, folder_name)
-
-    os.makedirs(course_folder, exist_ok=True)
-
-    # Find activity links
-    activity_types = [
-        '/mod/resource/view.php',
-        '/mod/flexpaper/view.php',
-        '/mod/presentation/view.php',
-        '/mod/casestudy/view.php',
-        '/mod/dyquestion/view.php',
-    ]
-    activity_links = []
-
-    for li in soup.find_all('li', class_=re.compile(r'\bactivity\b')):
-        a = li.find('a', href=True)
-        if a:
-            href = a['href']
-            if any(x in href for x in activity_types):
-                full_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                activity_links.append(full_url)
-
-    downloaded_files = []
-    failed_activities = []
-
-    for activity_url in activity_links:
-        result = _try_download_methods(session, activity_url, course_folder)
-        if result:
-            downloaded_files.append(result)
-        else:
-            failed_activities.append(activity_url)
+    Returns:
+        Dict with job_id, state and the courses queued.
+    """
+    selected = await _select_courses(course_ids)
+    if isinstance(selected, str):
+        return {"error": selected}
+    job = _jobs.start(selected, download_dir, full)
+    return {"job_id": job.id, "state": job.state,
+            "courses": [{"course_id": c["id"], "course_name": c["name"]} for c in selected]}
 
-    return {
-        "course_id": course['id'],
-        "course_name": course_name,
-        "folder": course_folder,
-        "activities_found": len(activity_links),
-        "downloaded": len(downloaded_files),
-        "failed": len(failed_activities),
-        "files": downloaded_files,
-    }
+
+@mcp.tool()
+def get_download_status(job_id: str = "") -> dict:
+    """
+    Report a download job's progress.
+
+    Args:
+        job_id: The id returned by start_download. If empty, lists all known jobs.
+
+    Returns:
+        Dict with state (queued/running/done/cancelled/error), activities done of
+        total, bytes done, bytes_per_second and eta_seconds for the batch,
+        per-course counts (files downloaded, linked from the store, skipped as
+        already synced, and transfer errors; failed activities once a course
+        ends), the files streaming now with their own speed and ETA,
+        and the last files finished. Once the job ends, "results" holds the
+        same per-course results download_course_materials returns.
+    """
+    if not job_id:
+        return {"jobs": [{"job_id": j.id, "state": j.state, "courses": [c["id"] for c in j.courses]}
+                         for j in _jobs.jobs()]}
+    job = _jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job id: {job_id}. Call get_download_status with no job_id to list jobs."}
+    return _job_status(job)
 
 
 @mcp.tool()
-def get_course_content(course_id: str) -> list[dict] | str:
+def cancel_download(job_id: str) -> dict:
     """
-    List all sections and activities in a course.
+    Stop a download job.
 
-    Must be logged in first (call login tool).
+    Files already streaming are finished; nothing new is started. Start the
+    same download again later to pick up where it stopped.
 
     Args:
-        course_id: The course ID (from list_courses).
+        job_id: The id returned by start_download.
 
     Returns:
-        List of sections, each with section_number, section_name, and activities list.
+        The job's status, as get_download_status reports it.
     """
-    if not _logged_in:
-        return "Error: Not logged in. Call the login tool first."
-
-    session = _get_session()
-    result = _fetch_course_page(session, course_id)
-    if isinstance(result, str):
-        return result
-    soup, course_name = result
-
-    sections = []
-
-    # Find section elements
-    section_elements = soup.find_all('li', class_=re.compile(r'\bsection\b'))
-    if not section_elements:
-        section_elements = soup.find_all('div', class_=re.compile(r'\bsection\b'))
-
-    for section_el in section_elements:
-        # Extract section number from id="section-N"
-        section_id = section_el.get('id', '')
-        match = re.search(r'section-(\d+)', section_id)
-        section_num = int(match.group(1)) if match else None
-
-        # Extract section name
-        name_el = section_el.find(class_='sectionname') or section_el.find(['h3', 'h4'])
-        section_name = name_el.get_text(strip=True) if name_el else f"Section {section_num}"
-
-        # Find activities within this section
-        activities = []
-        for activity_li in section_el.find_all('li', class_=re.compile(r'\bactivity\b')):
-            classes = ' '.join(activity_li.get('class', []))
-            type_match = re.search(r'modtype_(\w+)', classes)
-            activity_type = type_match.group(1) if type_match else "unknown"
-
-            activity_name = _get_activity_name(activity_li)
-            a_tag = activity_li.find('a', href=True)
-            if not a_tag:
-                continue
-            href = a_tag['href']
-            full_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-
-            activities.append({
-                "name": activity_name,
-                "type": activity_type,
-                "url": full_url,
-            })
-
-        sections.append({
-            "section_number": section_num,
-            "section_name": section_name,
-            "activities": activities,
-        })
+    job = _jobs.cancel(job_id)
+    if job is None:
+        return {"error": f"Unknown job id: {job_id}."}
+    return _job_status(job)
 
-    # Fallback: if no sections found, list all activities flat
-    if not sections:
-        all_activities = []
-        for activity_li in soup.find_all('li', class_=re.compile(r'\bactivity\b')):
-            classes = ' '.join(activity_li.get('class', []))
-            type_match = re.search(r'modtype_(\w+)', classes)
-            activity_type = type_match.group(1) if type_match else "unknown"
-
-            activity_name = _get_activity_name(activity_li)
-            a_tag = activity_li.find('a', href=True)
-            if not a_tag:
-                continue
-            href = a_tag['href']
-            full_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
 
-            all_activities.append({"name": activity_name, "type": activity_type, "url": full_url})
+@mcp.tool()
+async def get_course_content(
+    course_id: str,
+    fields: list[str] | None = None,
+    offset: int = 0,
+    limit: int = 0,
+    compact: bool = False,
+) -> list[dict] | dict | str:
+    """
+    List all sections and activities in a course.
+
+    Must be logged in first (call login tool).
 
-        if all_activities:
-            sections = [{"section_number": 0, "section_name": "All Activities", "activities": all_activities}]
+    Args:
+        course_id: The course ID (from list_courses).
+        fields: Keys to keep for each activity (name, type, url; id with compact).
+        offset: Skip this many activities, counted across sections. With offset
+            or limit set the result is a page: {"items" (sections holding that
+            page's activities), "total", "offset", "next_offset"}.
+        limit: Return at most this many activities (0 = no limit).
+        compact: Give each activity a short id (e.g. "resource:50002") instead of its url.
 
-    return sections
+    Returns:
+        List of sections, each with section_number, section_name, and activities list.
+    """
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    sections = await _run(_client.get_course_content, course_id)
+    if isinstance(sections, str):
+        return _error(sections)
+    if not (fields or compact or offset or limit):
+        return sections
+
+    flat = [(i, _shape(a, fields, compact)) for i, sec in enumerate(sections) for a in sec["activities"]]
+    page = _window(flat, offset, limit) if offset or limit else {"items": flat}
+    grouped: dict[int, dict] = {}
+    for i, activity in page["items"]:
+        sec = sections[i]
+        grouped.setdefault(i, {"section_number": sec["section_number"], "section_name": sec["section_name"],
+                               "activities": []})["activities"].append(activity)
+    if not (offset or limit):
+        # keep sections without activities, as the unshaped result does
+        return [grouped.get(i, {**sec, "activities": []}) for i, sec in enumerate(sections)]
+    return {**page, "items": list(grouped.values())}
 
 
 @mcp.tool()
-def get_assignments(course_id: str) -> list[dict] | str:
+async def get_assignments(
+    course_id: str,
+    fields: list[str] | None = None,
+    offset: int = 0,
+    limit: int = 0,
+    compact: bool = False,
+) -> list[dict] | dict | str:
     """
     View assignments with due dates and submission status for a course.
 
@@ -640,89 +449,26 @@ def get_assignments(course_id: str) -> list[dict] | str:
 
     Args:
         course_id: The course ID (from list_courses).
+        fields: Keys to keep for each assignment (e.g. ["name", "due_date"]). Default: all.
+        offset: Skip this many assignments. With offset or limit set the result
+            is a page: {"items", "total", "offset", "next_offset"}.
+        limit: Return at most this many assignments (0 = no limit).
+        compact: Short id (e.g. "assign:50003") instead of url, empty fields left out.
 
     Returns:
         List of assignments with name, url, due_date, submission_status, grading_status, grade, and time_remaining.
     """
-    if not _logged_in:
-        return "Error: Not logged in. Call the login tool first."
-
-    session = _get_session()
-    result = _fetch_course_page(session, course_id)
-    if isinstance(result, str):
-        return result
-    soup, course_name = result
-
-    # Find assignment links
-    assignment_links = []
-
-    # Method 1: activity elements with modtype_assign
-    for li in soup.find_all('li', class_=re.compile(r'modtype_assign')):
-        a = li.find('a', href=True)
-        if a and '/mod/assign/view.php' in a['href']:
-            name = _get_activity_name(li)
-            href = a['href']
-            url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-            assignment_links.append({"name": name, "url": url})
-
-    # Method 2: fallback scan all links
-    if not assignment_links:
-        seen: set[str] = set()
-        for a in soup.find_all('a', href=re.compile(r'/mod/assign/view\.php\?id=\d+')):
-            href = a['href']
-            if href not in seen:
-                seen.add(href)
-                url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                assignment_links.append({"name": a.get_text(strip=True), "url": url})
-
-    if not assignment_links:
-        return []
-
-    assignments = []
-    for asgn in assignment_links:
-        _rate_limit("activity")
-        try:
-            resp = session.get(asgn["url"])
-            asoup = BeautifulSoup(resp.text, 'html.parser')
-
-            info: dict = {"name": asgn["name"], "url": asgn["url"]}
-
-            # Parse submission status table
-            table = asoup.find('table', class_='submissionstatustable') or asoup.find('table', class_='generaltable')
-            if table:
-                for row in table.find_all('tr'):
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) >= 2:
-                        label = cells[0].get_text(strip=True).lower()
-                        value = cells[1].get_text(strip=True)
-                        if 'due date' in label:
-                            info['due_date'] = value
-                        elif 'submission status' in label:
-                            info['submission_status'] = value
-                        elif 'grading status' in label:
-                            info['grading_status'] = value
-                        elif 'grade' in label and 'grading' not in label:
-                            info['grade'] = value
-                        elif 'time remaining' in label:
-                            info['time_remaining'] = value
-
-            for field in ['due_date', 'submission_status', 'grading_status', 'grade', 'time_remaining']:
-                info.setdefault(field, None)
-
-            assignments.append(info)
-        except requests.RequestException as e:
-            assignments.append({
-                "name": asgn["name"], "url": asgn["url"],
-                "error": str(e),
-                "due_date": None, "submission_status": None,
-                "grading_status": None, "grade": None, "time_remaining": None,
-            })
-
-    return assignments
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    assignments = await _run(_client.get_assignments, course_id)
+    if isinstance(assignments, str):
+        return _error(assignments)
+    assignments = [_shape(a, fields, compact) for a in assignments]
+    return _window(assignments, offset, limit) if offset or limit else assignments
 
 
 @mcp.tool()
-def get_grades(course_id: str) -> dict | str:
+async def get_grades(course_id: str) -> dict | str:
     """
     Fetch the grade report for a course.
 
@@ -734,100 +480,118 @@ def get_grades(course_id: str) -> dict | str:
     Returns:
         Dict with course_name, grade_items list, and course_total.
     """
-    if not _logged_in:
-        return "Error: Not logged in. Call the login tool first."
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    grades = await _run(_client.get_grades, course_id)
+    if isinstance(grades, str):
+        return _error(grades)
+    return grades
 
-    session = _get_session()
-    _rate_limit("course")
-    url = f"https://mydy.dypatil.edu/rait/grade/report/user/index.php?id={course_id}"
 
-    try:
-        resp = session.get(url)
-        if resp.status_code != 200:
-            return f"Error: Grade page returned status {resp.status_code}"
-    except requests.RequestException as e:
-        return f"Network error: {str(e)}"
-
-    soup = BeautifulSoup(resp.text, 'html.parser')
-    course_name = _extract_course_name(soup)
-
-    # Check for access errors
-    error_div = soup.find('div', class_='errorbox') or soup.find('div', class_=re.compile(r'alert-danger'))
-    if error_div:
-        return f"Error accessing grades: {error_div.get_text(strip=True)}"
-
-    # Find grade table
-    table = (
-        soup.find('table', class_=re.compile(r'user-grade'))
-        or soup.find('table', id='user-grade')
-        or soup.find('table', class_='generaltable')
-    )
-
-    if not table:
-        return {"course_name": course_name, "grade_items": [], "course_total": None}
-
-    # Detect column indices from header
-    headers: list[str] = []
-    header_row = table.find('tr')
-    if header_row:
-        for th in header_row.find_all(['th', 'td']):
-            headers.append(th.get_text(strip=True).lower())
-
-    col_map: dict[str, int] = {}
-    for i, h in enumerate(headers):
-        if 'grade item' in h or ('item' in h and 'grade' not in col_map):
-            col_map['name'] = i
-        elif h == 'grade' or ('grade' in h and 'item' not in h and 'grade' not in col_map):
-            col_map['grade'] = i
-        elif 'range' in h:
-            col_map['range'] = i
-        elif 'percentage' in h:
-            col_map['percentage'] = i
-        elif 'feedback' in h:
-            col_map['feedback'] = i
-
-    # Parse data rows
-    grade_items = []
-    course_total = None
-    rows = table.find_all('tr')[1:]  # skip header
-
-    for row in rows:
-        cells = row.find_all(['td', 'th'])
-        if not cells:
-            continue
+@mcp.tool()
+async def get_assignments_bulk(
+    course_ids: list[str] | None = None,
+    pending_only: bool = False,
+    fields: list[str] | None = None,
+    offset: int = 0,
+    limit: int = 0,
+    compact: bool = False,
+) -> dict:
+    """
+    View assignments across several courses in one call.
 
-        def _cell_text(col_key: str) -> str | None:
-            idx = col_map.get(col_key)
-            if idx is not None and idx < len(cells):
-                return cells[idx].get_text(strip=True)
-            return None
+    Must be logged in first (call login tool). Course and assignment pages are
+    fetched concurrently through the shared cache, so this is much faster than
+    calling get_assignments once per course.
 
-        item = {
-            "name": _cell_text('name') or cells[0].get_text(strip=True),
-            "grade": _cell_text('grade'),
-            "range": _cell_text('range'),
-            "percentage": _cell_text('percentage'),
-            "feedback": _cell_text('feedback'),
-        }
+    Args:
+        course_ids: Course IDs to check. If None/empty, checks all courses.
+        pending_only: Leave out assignments already submitted.
+        fields: Keys to keep for each assignment (e.g. ["course_name", "name", "due_date"]).
+        offset: Skip this many assignments of the merged list; with offset or
+            limit set, total and next_offset are included.
+        limit: Return at most this many assignments (0 = no limit).
+        compact: Short id (e.g. "assign:50003") instead of each url.
+
+    Returns:
+        Dict with courses_checked and one merged assignments list (each tagged
+        with course_id and course_name; empty fields omitted), plus errors by
+        course id for courses that could not be loaded.
+    """
+    selected = await _select_courses(course_ids)
+    if isinstance(selected, str):
+        return {"error": selected}
+    by_course = await _run(_client.get_assignments_bulk, [c["id"] for c in selected])
 
-        if 'course total' in (item['name'] or '').lower():
-            course_total = {k: v for k, v in item.items() if k != 'name'}
-        else:
-            # Skip empty category rows
-            row_classes = ' '.join(row.get('class', []))
-            if 'category' in row_classes and not item.get('grade'):
+    assignments, errors = [], {}
+    for course in selected:
+        result = by_course[course["id"]]
+        if isinstance(result, str):
+            errors[course["id"]] = _error(result)
+            continue
+        for asgn in result:
+            if pending_only and (asgn.get("submission_status") or "").lower().startswith("submitted"):
                 continue
-            grade_items.append(item)
+            item = _compact({"course_id": course["id"], "course_name": course["name"], **asgn})
+            assignments.append(_shape(item, fields, compact))
 
-    return {
-        "course_name": course_name,
-        "grade_items": grade_items,
-        "course_total": course_total,
-    }
+    response = {"courses_checked": len(selected), "assignments": assignments}
+    if offset or limit:
+        page = _window(assignments, offset, limit)
+        response.update(assignments=page.pop("items"), **page)
+    if errors:
+        response["errors"] = errors
+    return response
 
 
 @mcp.tool()
-def get_announcements(course_id: str, limit: int = 10) -> list[dict] | str:
+async def get_grades_bulk(course_ids: list[str] | None = None) -> dict:
+    """
+    Fetch grade reports for several courses in one call.
+
+    Must be logged in first (call login tool). Reports are fetched concurrently.
+
+    Args:
+        course_ids: Course IDs to fetch. If None/empty, fetches all courses.
+
+    Returns:
+        Dict with a courses list (course_id, course_name, course_total and
+        grade_items, empty fields omitted), plus errors by course id for
+        courses whose report could not be loaded.
+    """
+    selected = await _select_courses(course_ids)
+    if isinstance(selected, str):
+        return {"error": selected}
+    by_course = await _run(_client.get_grades_bulk, [c["id"] for c in selected])
+
+    courses, errors = [], {}
+    for course in selected:
+        report = by_course[course["id"]]
+        if isinstance(report, str):
+            errors[course["id"]] = _error(report)
+            continue
+        courses.append(_compact({
+            "course_id": course["id"],
+            "course_name": course["name"],
+            "course_total": _compact(report["course_total"]) if report["course_total"] else None,
+            "grade_items": [_compact(item) for item in report["grade_items"]],
+        }))
+
+    response = {"courses": courses}
+    if errors:
+        response["errors"] = errors
+    return response
+
+
+@mcp.tool()
+async def get_announcements(
+    course_id: str,
+    limit: int = ANNOUNCEMENTS_LIMIT,
+    offset: int = 0,
+    paged: bool = False,
+    fields: list[str] | None = None,
+    compact: bool = False,
+) -> list[dict] | dict | str:
     """
     Read announcements/forum posts for a course.
 
@@ -835,123 +599,62 @@ def get_announcements(course_id: str, limit: int = 10) -> list[dict] | str:
 
     Args:
         course_id: The course ID (from list_courses).
-        limit: Maximum number of announcements to fetch (default 10).
+        limit: Maximum number of announcements to fetch (default 10, 0 = all).
+        offset: Skip this many of the newest announcements. Implies paged.
+        paged: Return a page, {"items", "offset", "next_offset"}, instead of a
+            plain list; next_offset is None once the forum has no more.
+        fields: Keys to keep for each announcement (e.g. ["title", "date"]). Default: all.
+        compact: Short id (e.g. "discussion:3001") instead of url, and content
+            cut to its first few hundred characters (marked "truncated"); pass
+            the id to get_announcement for the full text.
 
     Returns:
-        List of announcements with title, author, date, url, and content.
+        Announcements with title, author, date, url, and content: a list, or
+        a page dict when offset or paged is given.
     """
-    if not _logged_in:
-        return "Error: Not logged in. Call the login tool first."
-
-    session = _get_session()
-    result = _fetch_course_page(session, course_id)
-    if isinstance(result, str):
-        return result
-    soup, course_name = result
-
-    # Phase 1: Find announcements forum
-    forum_url = None
-
-    # Method 1: Forum activity with "announcement" in name
-    for li in soup.find_all('li', class_=re.compile(r'modtype_forum')):
-        a = li.find('a', href=True)
-        if a and 'announcement' in a.get_text(strip=True).lower():
-            href = a['href']
-            forum_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-            break
-
-    # Method 2: First forum link on page
-    if not forum_url:
-        for a in soup.find_all('a', href=re.compile(r'/mod/forum/view\.php\?id=\d+')):
-            href = a['href']
-            forum_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-            break
-
-    if not forum_url:
-        return "No announcements forum found for this course."
-
-    # Phase 2: List discussions
-    _rate_limit("activity")
-    try:
-        forum_resp = session.get(forum_url)
-        forum_soup = BeautifulSoup(forum_resp.text, 'html.parser')
-    except requests.RequestException as e:
-        return f"Error loading forum: {str(e)}"
-
-    discussions: list[dict] = []
-
-    # Method 1: Table-based forum listing
-    forum_table = forum_soup.find('table', class_=re.compile(r'forumheaderlist|discussion-list'))
-    if forum_table:
-        for row in forum_table.find_all('tr')[1:][:limit]:
-            a = row.find('a', href=re.compile(r'/mod/forum/discuss\.php\?d=\d+'))
-            if a:
-                cells = row.find_all(['td', 'th'])
-                href = a['href']
-                disc_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                title = a.get_text(strip=True)
-                author = cells[1].get_text(strip=True) if len(cells) > 1 else None
-                date = cells[-1].get_text(strip=True) if len(cells) > 2 else None
-                discussions.append({"title": title, "url": disc_url, "author": author, "date": date})
-
-    # Method 2: Fallback - scan all discussion links
-    if not discussions:
-        seen: set[str] = set()
-        for a in forum_soup.find_all('a', href=re.compile(r'/mod/forum/discuss\.php\?d=\d+')):
-            href = a['href']
-            if href not in seen:
-                seen.add(href)
-                disc_url = href if href.startswith('http') else 'https://mydy.dypatil.edu' + href
-                discussions.append({"title": a.get_text(strip=True), "url": disc_url, "author": None, "date": None})
-                if len(discussions) >= limit:
-                    break
-
-    if not discussions:
-        return []
-
-    # Phase 3: Fetch content for each discussion
-    results = []
-    for disc in discussions:
-        _rate_limit("activity")
-        try:
-            disc_resp = session.get(disc["url"])
-            disc_soup = BeautifulSoup(disc_resp.text, 'html.parser')
-
-            post = disc_soup.find('div', class_=re.compile(r'forumpost|forum-post'))
-            content = None
-            if post:
-                content_div = post.find(class_=re.compile(r'posting|post-content'))
-                content = content_div.get_text(strip=True) if content_div else None
-
-                if not disc["author"]:
-                    author_el = post.find(class_='author') or post.find('a', href=re.compile(r'/user/'))
-                    disc["author"] = author_el.get_text(strip=True) if author_el else None
-
-                if not disc["date"]:
-                    date_el = post.find('time') or post.find(class_=re.compile(r'modified|date'))
-                    disc["date"] = date_el.get_text(strip=True) if date_el else None
-
-            results.append({
-                "title": disc["title"],
-                "author": disc["author"],
-                "date": disc["date"],
-                "url": disc["url"],
-                "content": content,
-            })
-        except requests.RequestException:
-            results.append({
-                "title": disc["title"],
-                "author": disc.get("author"),
-                "date": disc.get("date"),
-                "url": disc["url"],
-                "content": "Error: could not load discussion",
-            })
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    paged = paged or bool(offset)
+    offset, limit = max(0, offset), max(0, limit)
+    announcements = await _run(_client.get_announcements, course_id, limit, offset)
+    if isinstance(announcements, str):
+        return _error(announcements)
+    items = [_shape(a, fields, compact) for a in announcements]
+    if not paged:
+        return items
+    # the forum may hold more than were fetched, so a full page means there may be a next one
+    return {"items": items, "offset": offset,
+            "next_offset": offset + len(items) if limit and len(items) == limit else None}
 
-    return results
+
+@mcp.tool()
+async def get_announcement(announcement_id: str, fields: list[str] | None = None) -> dict | str:
+    """
+    Read one announcement in full.
+
+    Must be logged in first (call login tool).
+
+    Args:
+        announcement_id: The announcement's id from get_announcements(compact=True)
+            (e.g. "discussion:3001"), or its url (a forum discussion on MyDy).
+        fields: Keys to keep (author, date, url, content). Default: all.
+
+    Returns:
+        Dict with author, date, url and the full content.
+    """
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    url = discussion_url(announcement_id)
+    if url is None:
+        return _error(f"Not an announcement id or discussion URL: {announcement_id}")
+    announcement = await _run(_client.get_discussion, url)
+    if isinstance(announcement, str):
+        return _error(announcement)
+    return _shape(_compact(announcement), fields)
 
 
 @mcp.tool()
-def get_attendance() -> dict | str:
+async def get_attendance() -> dict | str:
     """
     View attendance summary across all subjects for the current semester.
 
@@ -961,64 +664,29 @@ def get_attendance() -> dict | str:
     Returns:
         Dict with semester info, batch, and per-subject attendance (total_classes, present, absent, percentage).
     """
-    if not _logged_in:
-        return "Error: Not logged in. Call the login tool first."
-
-    session = _get_session()
-    _rate_limit("dashboard")
+    if not _client.logged_in:
+        return NOT_LOGGED_IN
+    attendance = await _run(_client.get_attendance)
+    if isinstance(attendance, str):
+        return _error(attendance)
+    return attendance
 
-    url = "https://mydy.dypatil.edu/rait/blocks/academic_status/ajax.php?action=attendance"
-    try:
-        resp = session.get(url)
-        if resp.status_code != 200:
-            return f"Error: Attendance page returned status {resp.status_code}"
-    except requests.RequestException as e:
-        return f"Network error: {str(e)}"
-
-    soup = BeautifulSoup(resp.text, 'html.parser')
-
-    # Extract semester info
-    batch = None
-    semester = None
-    header_divs = soup.find_all('div', style=re.compile(r'float'))
-    for div in header_divs:
-        text = div.get_text(strip=True)
-        if re.match(r'^[A-Z]+-\d+-', text):
-            batch = text
-        elif 'Semester' in text:
-            semester = text
-
-    # Parse attendance table
-    table = soup.find('table', class_='generaltable')
-    if not table:
-        return {"batch": batch, "semester": semester, "subjects": [], "message": "No attendance data found."}
-
-    subjects = []
-    for row in table.find_all('tr'):
-        cells = row.find_all('td')
-        if len(cells) < 5:
-            continue
 
-        subject = cells[0].get_text(strip=True)
-        total = cells[1].get_text(strip=True)
-        present = cells[2].get_text(strip=True)
-        absent = cells[3].get_text(strip=True)
-        percentage = cells[4].get_text(strip=True)
-
-        subjects.append({
-            "subject": subject,
-            "total_classes": int(total) if total.isdigit() else total,
-            "present": int(present) if present.isdigit() else present,
-            "absent": int(absent) if absent.isdigit() else absent,
-            "percentage": float(percentage) if percentage.replace('.', '', 1).isdigit() else percentage,
-        })
+@mcp.tool()
+def get_rate_limit_stats() -> dict:
+    """
+    Show request and throttling counters from the shared rate limiter.
 
-    return {
-        "batch": batch,
-        "semester": semester,
-        "subjects": subjects,
-    }
+    Returns:
+        Dict with total requests, how many were throttled, seconds spent waiting,
+        and the same counters broken down by operation type.
+    """
+    return _client.rate_limit_stats()
 
 
 if __name__ == "__main__":
-    mcp.run()
+    try:
+        mcp.run()
+    finally:
+        # Before interpreter exit, which would otherwise wait on the job threads
+        _jobs.shutdown()
@@ -0,0 +1,287 @@
+"""
+MyDy LMS Helper - local LMS stand-in
+
+A small threaded HTTP server that answers the Moodle endpoints MydyClient
+uses with the saved pages in fixtures/, so concurrency, rate limiting and
+the download pipeline can be load-tested without touching the real LMS.
+
+Any password logs in (or only --password, if given). Pages behind the login
+redirect to the login form without a session cookie, like Moodle does when a
+session expires. Each course id gets its own course title (and so its own
+download folder), and every activity page links its own file, served from
+pluginfile.php with --file-size bytes; Range requests are honoured and
+--drop-rate cuts some transfers off half-way to exercise resuming.
+
+Usage:
+  python mock_server.py --port 8765 --latency 0.05 --jitter 0.05 --file-size 20M
+  MYDY_BASE_URL=http://127.0.0.1:8765 python __main__.py
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_BASE_URL = "https://mydy.dypatil.edu"
+
+# URL fragment -> fixture served for it, first match wins
+ROUTES = [
+    ("/my/", "dashboard.html"),
+    ("/blocks/academic_status/ajax.php", "attendance.html"),
+    ("/course/view.php", "course.html"),
+    ("/grade/report/user/index.php", "grades.html"),
+    ("/mod/assign/view.php", "assign.html"),
+    ("/mod/forum/view.php", "forum.html"),
+    ("/mod/forum/discuss.php", "discuss.html"),
+    ("/mod/flexpaper/view.php", "flexpaper.html"),
+    ("/mod/presentation/view.php", "presentation.html"),
+    ("/mod/resource/view.php", "resource.html"),
+    ("/mod/casestudy/view.php", "resource.html"),
+    ("/mod/dyquestion/view.php", "resource.html"),
+    ("/login/index.php", "login.html"),
+]
+ACTIVITY_PAGES = ("flexpaper.html", "presentation.html", "resource.html")
+_PLUGINFILE = re.compile(r"(/pluginfile\.php/)\d+(/[^'\"]*/)([^/'\"]+)\.(\w+)")
+_CONTENT_TYPES = {"pdf": "application/pdf", "pptx": "application/vnd.ms-powerpoint",
+                  "ppt": "application/vnd.ms-powerpoint", "docx": "application/msword"}
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def route(path: str) -> str | None:
+    return next((name for frag, name in ROUTES if frag in path), None)
+
+
+def activity_page(html: str, activity_id: str) -> str:
+    """Point an activity page's file links at a file named after the activity,
+    so every activity downloads its own file instead of colliding on one name."""
+    return _PLUGINFILE.sub(lambda m: f"{m[1]}{activity_id}{m[2]}{m[3]}-{activity_id}.{m[4]}", html)
+
+
+def course_page(html: str, course_id: str) -> str:
+    """Give each course id its own title, so courses sync into separate folders."""
+    return re.sub(r"<title>Course: ([^<]*)</title>", lambda m: f"<title>Course: {m[1]} ({course_id})</title>",
+                  html, count=1)
+
+
+def parse_size(text: str) -> int:
+    """'512', '64K', '20M', '1G' -> bytes."""
+    text = text.strip().upper()
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(text[-1:], 1)
+    return int(float(text.rstrip("KMG")) * mult)
+
+
+class MockLMSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, jitter: float = 0.0,
+                 file_size: int = 1 << 20, bandwidth: int = 0, drop_rate: float = 0.0,
+                 password: str | None = None, verbose: bool = False):
+        super().__init__(address, MockLMSHandler)
+        host, port = self.server_address[:2]
+        self.base_url = f"http://{host}:{port}"
+        self.latency = latency
+        self.jitter = jitter
+        self.file_size = file_size
+        self.bandwidth = bandwidth
+        self.drop_rate = drop_rate
+        self.password = password
+        self.verbose = verbose
+        self.pages = {name: load_fixture(name).replace(FIXTURE_BASE_URL, self.base_url)
+                      for name in {name for _, name in ROUTES}}
+        self.sessions: set[str] = set()
+        self.hits: Counter[str] = Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def count(self, key: str, sent: int = 0) -> None:
+        with self._lock:
+            self.hits[key] += 1
+            self.bytes_sent += sent
+
+
+class MockLMSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+    server: MockLMSServer
+
+    # -- plumbing ----------------------------------------------------------
+
+    def log_message(self, format, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _delay(self) -> None:
+        wait = self.server.latency + random.uniform(0, self.server.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _send(self, status: int, body: bytes = b"", headers: dict | None = None,
+              content_type: str = "text/html; charset=utf-8") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _redirect(self, location: str, headers: dict | None = None) -> None:
+        self._send(303, headers={"Location": self.server.base_url + location, **(headers or {})})
+
+    def _session(self) -> str | None:
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "MoodleSession" and value in self.server.sessions:
+                return value
+        return None
+
+    # -- verbs -------------------------------------------------------------
+
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_GET(self) -> None:
+        self._delay()
+        url = urlsplit(self.path)
+        if url.path in ("", "/"):
+            return self._redirect("/rait/my/")
+        if url.path == "/rait/login/logout.php":
+            self.server.sessions.discard(self._session())
+            return self._redirect("/rait/login/index.php")
+        if "/pluginfile.php/" in url.path:
+            return self._file(url.path)
+
+        page = route(url.path)
+        if page is None:
+            self.server.count("404")
+            return self._send(404, b"<html><body>Not found</body></html>")
+        if page != "login.html" and not self._session():
+            self.server.count("login redirect")
+            return self._redirect("/rait/login/index.php")
+
+        body = self.server.pages[page]
+        page_id = parse_qs(url.query).get("id", ["0"])[0]
+        if page in ACTIVITY_PAGES:
+            body = activity_page(body, page_id)
+        elif page == "course.html":
+            body = course_page(body, page_id)
+        self._page(page, body.encode("utf-8"))
+
+    def do_POST(self) -> None:
+        self._delay()
+        length = int(self.headers.get("Content-Length", 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        if urlsplit(self.path).path != "/rait/login/index.php":
+            return self._send(404)
+        self.server.count("login")
+        password = form.get("password", "")
+        # MyDy's login form carries the username from the first step, so only the password is checked
+        if not password or (self.server.password and password != self.server.password):
+            body = self.server.pages["login.html"].replace(
+                "<h2>Log in</h2>", '<h2>Log in</h2><p class="error">Invalid login, please try again</p>')
+            return self._send(200, body.encode("utf-8"))
+        token = secrets.token_hex(16)
+        self.server.sessions.add(token)
+        self._redirect("/rait/my/", {"Set-Cookie": f"MoodleSession={token}; Path=/; HttpOnly"})
+
+    # -- responses ---------------------------------------------------------
+
+    def _page(self, name: str, body: bytes) -> None:
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count(f"{name} (304)")
+            return self._send(304, headers={"ETag": etag})
+        self.server.count(name, len(body))
+        self._send(200, body, {"ETag": etag})
+
+    def _file(self, path: str) -> None:
+        size = self.server.file_size
+        ext = path.rsplit(".", 1)[-1].lower()
+        etag = '"' + hashlib.sha1(f"{path}:{size}".encode()).hexdigest() + '"'
+        last_modified = "Mon, 01 Jun 2026 10:00:00 GMT"
+
+        offset = 0
+        m = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if m and self.headers.get("If-Range", etag) in (etag, last_modified):
+            offset = int(m.group(1))
+            if offset >= size:
+                self.server.count("file (416)")
+                return self._send(416, headers={"Content-Range": f"bytes */{size}"})
+
+        self.send_response(206 if offset else 200)
+        self.send_header("Content-Type", _CONTENT_TYPES.get(ext, "application/octet-stream"))
+        self.send_header("Content-Length", str(size - offset))
+        if offset:
+            self.send_header("Content-Range", f"bytes {offset}-{size - 1}/{size}")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        if self.command == "HEAD":
+            return self.server.count("file (HEAD)")
+
+        # Byte i of a file is always pattern[i % len], so resumed copies can be verified
+        pattern = (path.encode() * (65536 // len(path) + 1))[:65536]
+        stop = size
+        if random.random() < self.server.drop_rate:
+            stop = offset + (size - offset) // 2
+            self.close_connection = True
+        start, sent = time.monotonic(), 0
+        pos = offset
+        while pos < stop:
+            i = pos % len(pattern)
+            piece = pattern[i:i + min(len(pattern) - i, stop - pos)]
+            self.wfile.write(piece)
+            pos += len(piece)
+            sent += len(piece)
+            if self.server.bandwidth:
+                ahead = sent / self.server.bandwidth - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        key = "file" if not offset else "file (resumed)"
+        self.server.count(key if stop == size else "file (dropped)", sent)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    ap.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random seconds")
+    ap.add_argument("--file-size", type=parse_size, default="1M", help="bytes per pluginfile.php download (K/M/G)")
+    ap.add_argument("--bandwidth", type=parse_size, default="0", help="per-download bytes/second, 0 = unlimited (K/M/G)")
+    ap.add_argument("--drop-rate", type=float, default=0.0,
+                    help="fraction of downloads cut off half-way, to exercise resuming")
+    ap.add_argument("--password", help="only accept this password (default: any)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = ap.parse_args()
+
+    server = MockLMSServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                           file_size=args.file_size, bandwidth=args.bandwidth,
+                           drop_rate=args.drop_rate, password=args.password, verbose=args.verbose)
+    print(f"Mock LMS on {server.base_url} - run clients with MYDY_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n{sum(server.hits.values())} requests, {server.bytes_sent / (1 << 20):.1f} MiB sent")
+        for key, n in server.hits.most_common():
+            print(f"  {n:6}  {key}")
+
+
+if __name__ == "__main__":
+    main()
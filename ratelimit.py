@@ -0,0 +1,118 @@
+"""
+MyDy LMS Rate Limiter
+
+Token-bucket politeness limiter shared by the HTTP client, the MCP server and
+the TUI workers. Each operation class (dashboard/course/activity/download) has
+its own bucket with a burst allowance, and a global bucket caps the combined
+request rate. Callers only wait when a bucket is actually empty.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+# operation class -> (tokens per second, burst size)
+DEFAULT_LIMITS: dict[str, tuple[float, int]] = {
+    "dashboard": (1.0, 2),
+    "course": (2.0, 4),
+    "activity": (3.0, 6),
+    "download": (2.0, 4),
+    "metadata": (4.0, 8),  # HEAD pre-flight checks before downloads
+    "general": (2.0, 2),
+}
+
+GLOBAL_RATE = float(os.getenv("MYDY_REQUESTS_PER_SECOND", "4"))
+GLOBAL_BURST = int(os.getenv("MYDY_REQUEST_BURST", "8"))
+
+
+class TokenBucket:
+    """Thread-safe token bucket. A rate of 0 or less means unlimited."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it.
+
+        Tokens may go negative: each caller reserves its place in line under
+        the lock and then sleeps outside it, so the bucket works the same for
+        threads and for coroutines.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """Per-operation token buckets plus a global budget, with wait counters."""
+
+    def __init__(self, limits: dict[str, tuple[float, int]] | None = None,
+                 global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST):
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._buckets = {op: TokenBucket(rate, burst) for op, (rate, burst) in limits.items()}
+        self._global = TokenBucket(global_rate, global_burst)
+        self._stats: dict[str, dict] = {}
+        self._stats_lock = threading.Lock()
+
+    def _reserve(self, operation_type: str) -> float:
+        bucket = self._buckets.get(operation_type) or self._buckets["general"]
+        wait = max(bucket.reserve(), self._global.reserve())
+        with self._stats_lock:
+            s = self._stats.setdefault(operation_type, {"requests": 0, "throttled": 0, "wait_seconds": 0.0})
+            s["requests"] += 1
+            if wait > 0:
+                s["throttled"] += 1
+                s["wait_seconds"] += wait
+        return wait
+
+    def acquire(self, operation_type: str = "general") -> float:
+        """Block until a request of this class may be sent. Returns seconds waited."""
+        wait = self._reserve(operation_type)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, operation_type: str = "general") -> float:
+        """Async variant of acquire() that yields to the event loop while waiting."""
+        wait = self._reserve(operation_type)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        """Snapshot of request/throttle counters, per operation and in total."""
+        with self._stats_lock:
+            by_op = {op: dict(s, wait_seconds=round(s["wait_seconds"], 3)) for op, s in self._stats.items()}
+        return {
+            "requests": sum(s["requests"] for s in by_op.values()),
+            "throttled": sum(s["throttled"] for s in by_op.values()),
+            "wait_seconds": round(sum(s["wait_seconds"] for s in by_op.values()), 3),
+            "by_operation": by_op,
+        }
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats.clear()
+
+
+_shared: RateLimiter | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> RateLimiter:
+    """Process-wide limiter, so every front-end draws from the same budget."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimiter()
+        return _shared
@@ -0,0 +1,236 @@
+"""
+MyDy LMS content store
+
+Courses in one programme often link the same syllabus PDFs and slide decks.
+Every downloaded file is hashed (SHA-256) and kept once in a content-addressed
+store next to the course folders (<download dir>/.mydy-store), and each
+course folder gets a hardlink to the stored blob instead of its own copy.
+Where hardlinks aren't possible (another filesystem, FAT), the store is
+turned off for that download directory and each folder keeps its own file:
+copying into the store would only double the space used.
+
+The store also remembers URL -> hash. A file URL seen before, from any
+course, is linked from the store without being downloaded again. Moodle's
+pluginfile.php URLs carry the file's revision, so a changed file arrives
+under a new URL.
+
+Linked copies share one inode, so a blob is made read-only once a second
+course links it: annotating one course's file in place would otherwise
+change every course's copy. A file only one course has stays writable. A
+blob is re-hashed before it is linked or reused, so one edited in place is
+never handed to another course, and it is replaced by the next fresh
+download. Linking never replaces a file the user put or edited in a course
+folder; only a missing file, or one the folder's manifest shows is as
+downloaded, is swapped for a link. Blobs no longer linked from
+any course folder are deleted when the store is next opened, so removing a
+course folder frees its space on the following sync.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import stat
+import threading
+
+STORE_NAME = ".mydy-store"
+STORE_ENABLED = os.getenv("MYDY_STORE", "1") != "0"
+# One store for every download folder, instead of one per download directory.
+# Keep it on the same filesystem as the downloads so files can be hardlinked.
+STORE_DIR = os.getenv("MYDY_STORE_DIR", "")
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+# os.link errors meaning the filesystem (or the pair of them) can't hardlink
+_NO_HARDLINKS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def replace_file(src: str, dest: str) -> None:
+    """os.replace, also over a read-only dest (which Windows refuses to replace)."""
+    try:
+        os.replace(src, dest)
+    except PermissionError:
+        if not os.path.exists(dest):
+            raise
+        os.chmod(dest, stat.S_IREAD | stat.S_IWRITE)
+        os.replace(src, dest)
+
+
+def _seal_if_shared(path: str) -> None:
+    """Make a blob read-only once more than one course folder links it."""
+    try:
+        if os.stat(path).st_nlink > 2:
+            os.chmod(path, READ_ONLY)
+    except OSError:
+        pass
+
+
+def _replace_with(src: str, dest: str) -> None:
+    """Atomically make dest a hardlink to src."""
+    tmp = f"{dest}.{threading.get_ident()}.link"
+    os.link(src, tmp)
+    replace_file(tmp, dest)
+
+
+class BlobStore:
+    """sha256 -> blob files, plus a url -> sha256 index persisted as JSON lines."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, "index.jsonl")
+        self._urls: dict[str, dict] = {}
+        # sha256 -> (size, mtime_ns) of the blob when its hash was last checked
+        self._verified: dict[str, tuple[int, int]] = {}
+        # Cleared when a file can't be hardlinked into the store
+        self.linkable = True
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._load()
+        self.prune()
+
+    def _load(self) -> None:
+        lines = 0
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._urls[rec["url"]] = rec
+        except OSError:
+            return
+        if lines > 2 * len(self._urls) + 50:
+            self.compact()
+
+    def compact(self) -> None:
+        with self._lock:
+            tmp = f"{self.index_path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for rec in self._urls.values():
+                        f.write(json.dumps(rec) + "\n")
+                os.replace(tmp, self.index_path)
+            except OSError:
+                pass
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def prune(self) -> None:
+        """Delete blobs no course folder links any more, and forget their URLs."""
+        objects = os.path.join(self.root, "objects")
+        removed = set()
+        for dirpath, _, names in os.walk(objects):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.stat(path).st_nlink == 1:
+                        os.remove(path)
+                        removed.add(os.path.basename(dirpath) + name)
+                except OSError:
+                    pass
+        if removed:
+            with self._lock:
+                self._urls = {url: rec for url, rec in self._urls.items() if rec["sha256"] not in removed}
+            self.compact()
+
+    def intact(self, digest: str, size: int) -> bool:
+        """Whether the blob for digest is present and still hashes to it."""
+        try:
+            st = os.stat(self.blob_path(digest))
+            if st.st_size != size:
+                return False
+            key = (st.st_size, st.st_mtime_ns)
+            if self._verified.get(digest) == key:
+                return True
+            if file_digest(self.blob_path(digest)) != digest:
+                return False
+        except OSError:
+            return False
+        self._verified[digest] = key
+        return True
+
+    def lookup(self, url: str) -> dict | None:
+        """The index record for url if its blob is still in the store, unmodified."""
+        with self._lock:
+            rec = self._urls.get(url)
+        if rec and self.intact(rec["sha256"], rec["size"]):
+            return rec
+        return None
+
+    def link(self, rec: dict, filepath: str) -> bool:
+        """Put the blob for rec at filepath. False if that isn't possible.
+
+        Whatever is at filepath is replaced; the caller checks it may be.
+        """
+        blob = self.blob_path(rec["sha256"])
+        try:
+            if not (os.path.exists(filepath) and os.path.samefile(blob, filepath)):
+                if not self.intact(rec["sha256"], rec["size"]):
+                    return False
+                _replace_with(blob, filepath)
+                _seal_if_shared(blob)
+            return True
+        except OSError:
+            return False
+
+    def add(self, url: str, filepath: str, headers=None) -> None:
+        """Store the file just fetched from url, leaving filepath linked to its blob."""
+        try:
+            digest = file_digest(filepath)
+            blob = self.blob_path(digest)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            size = os.path.getsize(filepath)
+            try:
+                os.link(filepath, blob)
+            except FileExistsError:
+                if os.path.samefile(blob, filepath):
+                    pass
+                elif self.intact(digest, size):
+                    _replace_with(blob, filepath)  # already stored: drop the duplicate
+                else:
+                    _replace_with(filepath, blob)  # the stored copy was modified: replace it
+            _seal_if_shared(blob)
+            st = os.stat(blob)
+            self._verified[digest] = (st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            if e.errno in _NO_HARDLINKS:
+                self.linkable = False
+            return  # the store is an optimisation; never fail a download over it
+        headers = headers or {}
+        rec = {"url": url, "sha256": digest, "size": size,
+               "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        with self._lock:
+            self._urls[url] = rec
+            try:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec) + "\n")
+            except OSError:
+                pass
+
+
+_stores: dict[str, BlobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def store_for(folder: str) -> BlobStore | None:
+    """The store shared by a course folder and its siblings, or None if disabled."""
+    if not STORE_ENABLED:
+        return None
+    root = os.path.abspath(STORE_DIR or os.path.join(os.path.dirname(os.path.abspath(folder)), STORE_NAME))
+    with _stores_lock:
+        if root not in _stores:
+            try:
+                _stores[root] = BlobStore(root)
+            except OSError:
+                return None
+        store = _stores[root]
+    return store if store.linkable else None